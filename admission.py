@@ -0,0 +1,124 @@
+"""Control de admisión de los análisis pesados (/analyze y /analyze/batch).
+
+Sin límite, cuando varias personas suben audio a la vez todos los hilos del worker
+acaban en librosa o esperando a Wit.ai, y hasta `/`, `/reports` o `/start` dejan
+de responder. `AdmissionController` limita, por proceso, cuántos análisis se
+ejecutan a la vez y cuántos segundos de audio hay en curso entre todos ellos. Una
+petición que no cabe espera en una cola corta; si la cola está llena o la espera
+supera el plazo, se rechaza con `AdmissionRejected`, que trae un `retry_after`
+estimado a partir de lo que duran los análisis recientes.
+
+Un análisis que por sí solo supera `max_audio_seconds` se admite cuando no hay
+ningún otro en curso, para que no espere para siempre.
+"""
+import math
+import threading
+import time
+
+
+class AdmissionRejected(Exception):
+    """No hay hueco para el análisis. `reason`: 'queue_full' o 'timeout'."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Análisis rechazado ({reason}); reintentar en {retry_after} s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Plaza concedida por `AdmissionController.acquire`; se devuelve con `release`."""
+
+    __slots__ = ('seconds', 'waited', 'started')
+
+    def __init__(self, seconds, waited):
+        self.seconds = seconds
+        self.waited = waited
+        self.started = time.monotonic()
+
+
+class AdmissionController:
+    """Plazas de análisis de un proceso.
+
+    `max_concurrent` análisis a la vez y `max_audio_seconds` segundos de audio en
+    curso (0: sin límite); como mucho `max_queue` peticiones esperando, cada una
+    `queue_timeout` segundos salvo que pida esperar sin límite (`timeout=None`).
+    """
+
+    def __init__(self, max_concurrent=2, max_audio_seconds=1200.0, max_queue=2, queue_timeout=2.0):
+        self.max_concurrent = max_concurrent
+        self.max_audio_seconds = max_audio_seconds
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.audio_seconds = 0.0
+        self.waiting = 0
+        self._avg_seconds = None  # media móvil de lo que dura un análisis admitido
+        self._cond = threading.Condition()
+
+    def _fits(self, seconds):
+        if self.active == 0:
+            return True
+        if self.max_concurrent and self.active >= self.max_concurrent:
+            return False
+        return not self.max_audio_seconds or self.audio_seconds + seconds <= self.max_audio_seconds
+
+    def saturated(self):
+        """True si una petición nueva se rechazaría sin esperar (sin plaza y con la cola llena).
+
+        Sirve para rechazar antes de leer el cuerpo de la subida.
+        """
+        with self._cond:
+            return not self._fits(0) and self.waiting >= self.max_queue
+
+    def retry_after(self):
+        """Segundos estimados hasta que haya plaza (al menos 1)."""
+        with self._cond:
+            return self._retry_after()
+
+    def _retry_after(self):
+        if self._avg_seconds is None:
+            return 5
+        slots = self.max_concurrent or 1
+        return max(1, math.ceil(self._avg_seconds * (1 + self.waiting / slots)))
+
+    def acquire(self, seconds, timeout=-1):
+        """Espera una plaza para `seconds` de audio y devuelve su `Ticket`.
+
+        `timeout` es la espera máxima (por defecto `queue_timeout`; None: sin límite,
+        para los trabajos asíncronos, que no tienen a nadie esperando la respuesta).
+        Lanza AdmissionRejected si no la consigue.
+        """
+        if timeout == -1:
+            timeout = self.queue_timeout
+        t0 = time.monotonic()
+        with self._cond:
+            if not self._fits(seconds):
+                if timeout is not None and self.waiting >= self.max_queue:
+                    raise AdmissionRejected('queue_full', self._retry_after())
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self._fits(seconds), timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    raise AdmissionRejected('timeout', self._retry_after())
+            self.active += 1
+            self.audio_seconds += seconds
+        return Ticket(seconds, time.monotonic() - t0)
+
+    def release(self, ticket):
+        elapsed = time.monotonic() - ticket.started
+        with self._cond:
+            self.active -= 1
+            self.audio_seconds -= ticket.seconds
+            self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self.active,
+                "audioSeconds": round(self.audio_seconds, 3),
+                "waiting": self.waiting,
+                "retryAfter": self._retry_after(),
+            }
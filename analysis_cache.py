@@ -0,0 +1,92 @@
+"""Caché direccionada por contenido para transcripciones y métricas acústicas.
+
+La clave es un hash del PCM del segmento más el subnivel y los parámetros del
+análisis, así que volver a subir la misma grabación no repite las llamadas a
+Wit.ai ni el cálculo de F0/RMS. Hay un nivel en memoria (LRU acotado por número
+de entradas y por TTL) y, opcionalmente, un nivel en disco (un JSON por clave).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from report_store import save_json
+
+
+def segment_key(kind, y, sr, **params):
+    """Clave estable para el segmento `y` (PCM) y los parámetros que afectan al resultado."""
+    h = hashlib.sha256()
+    h.update(kind.encode('utf-8'))
+    h.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    h.update(str(int(sr)).encode('ascii'))
+    h.update(np.ascontiguousarray(y, dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, max_entries=4096, ttl_seconds=7 * 24 * 3600, disk_folder=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_folder = disk_folder
+        if disk_folder:
+            os.makedirs(disk_folder, exist_ok=True)
+        self._entries = OrderedDict()  # clave -> (instante de expiración, valor)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_folder, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Valor guardado para `key` o None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return value
+                del self._entries[key]
+
+        if self.disk_folder:
+            path = self._disk_path(key)
+            try:
+                if os.path.getmtime(path) + self.ttl_seconds > now:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        value = json.load(f)
+                    self._put_memory(key, value, now)
+                    with self._lock:
+                        self.counters["disk_hits"] += 1
+                    return value
+            except (OSError, ValueError):
+                pass
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        now = time.time()
+        self._put_memory(key, value, now)
+        if self.disk_folder:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            save_json(path, value)
+
+    def _put_memory(self, key, value, now):
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "entries": len(self._entries)}
@@ -1,60 +1,209 @@
-from flask import Flask, request, jsonify, render_template, Response
+from flask import Flask, request, jsonify, render_template, Response, send_file
+import click
 import librosa
 import numpy as np
-import os, time, datetime, json, requests
-from scipy.stats import pearsonr
+import os, time, datetime, json, uuid, shutil, tempfile, threading, zipfile, functools, hmac, gzip, zlib
 import soundfile as sf
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import features
+from features import FeatureFrames, voice_metrics, segment_quality, noise_floor
+from report_store import ReportStore
+from report_cache import ReportRenderCache
+from catalog import ReportCatalog
+from jobs import JobManager
+from wit_client import WitClient, TranscriptionError
+from analysis_cache import AnalysisCache, segment_key
+from streaming import stream_segments, LiveSegmenter, is_canonical, decode_file, audio_duration
+from recognizers import WitRecognizer, TemplateRecognizer
+import batch
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+from metrics import REGISTRY, Trace
+from profiling import ProfileRing
+from quality import QualityGate, rejection
+from admission import AdmissionController, AdmissionRejected
+from rescore import rescore_reports
+from report_export import EXPORT_FORMATS, export_rows, export_chunks, gzip_chunks
 
 app = Flask(__name__, static_folder='static', template_folder='.')
+sock = Sock(app)
 
 # Directorios para subir y guardar resultados
 UPLOAD_FOLDER = 'uploads'
 RESULTS_FOLDER = 'results'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
+reports_store = ReportStore(RESULTS_FOLDER)
+reports_catalog = ReportCatalog(os.path.join(RESULTS_FOLDER, 'catalog.sqlite3'))
+if reports_catalog.is_new:
+    reports_catalog.rebuild(RESULTS_FOLDER)
+
+# GET /report/<id>: reportes ya serializados (y comprimidos con gzip a partir de
+# REPORT_GZIP_MIN_BYTES), válidos mientras sus ficheros no cambien
+report_renders = ReportRenderCache(
+    max_bytes=int(os.environ.get('REPORT_CACHE_BYTES', 64 * 1024 * 1024)),
+    gzip_min_bytes=int(os.environ.get('REPORT_GZIP_MIN_BYTES', 1024)),
+)
+
+# Comentarios y recomendaciones por defecto al finalizar un reporte sin ellos
+DEFAULT_COMMENTS = "The patient has shown significant improvement in attention and focus."
+DEFAULT_RECOMMENDATIONS = "The patient should continue using the app for at least 30 minutes a day."
+
+# Trabajos de /analyze en modo asíncrono (estado en results/jobs/)
+ANALYZE_JOB_WORKERS = int(os.environ.get('ANALYZE_JOB_WORKERS', 2))
+analysis_jobs = JobManager(os.path.join(RESULTS_FOLDER, 'jobs'), max_workers=ANALYZE_JOB_WORKERS)
+# /jobs/<id>/events: duración máxima de cada conexión (el navegador se reconecta
+# solo al cabo de JOB_EVENTS_RETRY_MS) para no tener un hilo ocupado sin límite
+JOB_EVENTS_MAX_SECONDS = float(os.environ.get('JOB_EVENTS_MAX_SECONDS', 30))
+JOB_EVENTS_RETRY_MS = int(os.environ.get('JOB_EVENTS_RETRY_MS', 1000))
+
+# /analyze/batch: pool de procesos para la parte CPU (uno por núcleo si BATCH_WORKERS
+# es 0; se crea al primer lote) y límites por petición
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 0))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 200))
+BATCH_MAX_ARCHIVE_BYTES = int(os.environ.get('BATCH_MAX_ARCHIVE_BYTES', 500 * 1024 * 1024))
+batch_pool = None
+batch_pool_lock = threading.Lock()
+
+# Perfilado bajo demanda de /analyze y /report (ver profiling.py): con
+# PROFILING_ENABLED, se perfila la petición que traiga la cabecera X-Profile (con
+# ADMIN_TOKEN como valor) y una de cada PROFILE_SAMPLE_EVERY
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+# Rutas /admin, /reports/export y cabecera X-Profile: piden ADMIN_TOKEN. Sin token se
+# deniegan, salvo que ADMIN_ALLOW_LOCALHOST permita las peticiones desde localhost
+# (no usarlo detrás de un proxy: ahí todas parecen venir de localhost)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+ADMIN_ALLOW_LOCALHOST = os.environ.get('ADMIN_ALLOW_LOCALHOST', '').lower() in ('1', 'true', 'yes')
+profiles = ProfileRing(
+    os.environ.get('PROFILE_DIR', os.path.join(RESULTS_FOLDER, 'profiles')),
+    max_files=int(os.environ.get('PROFILE_MAX_FILES', 50)),
+    sample_every=int(os.environ.get('PROFILE_SAMPLE_EVERY', 0)),
+)
+
+# Frecuencia de muestreo a la que se decodifica cada subida (una sola vez)
+ANALYSIS_SR = 16000
+
+# Subidas: el navegador envía WAV mono a 16 kHz, normalmente comprimido con gzip
+# (ver prepareUpload en static/script.js); límite del audio ya descomprimido
+UPLOAD_MAX_INFLATED_BYTES = int(os.environ.get('UPLOAD_MAX_INFLATED_BYTES', 500 * 1024 * 1024))
+GZIP_MAGIC = b'\x1f\x8b'
+upload_bytes_total = REGISTRY.counter(
+    'upload_bytes_total', 'Bytes de audio recibidos en /analyze y /analyze/batch', ('encoding',))
+uploads_total = REGISTRY.counter(
+    'uploads_total', 'Subidas de /analyze por formato (canonical: ya en WAV mono a 16 kHz)', ('format',))
+
+# Control de admisión de /analyze y /analyze/batch (ver admission.py), por proceso:
+# análisis a la vez y segundos de audio en curso (0: sin límite), peticiones en
+# espera y cuánto esperan antes de responder 503. Con gunicorn conviene que
+# ADMISSION_MAX_CONCURRENT + ADMISSION_MAX_QUEUE < GUNICORN_THREADS, para que
+# siempre quede un hilo para las rutas ligeras.
+admission = AdmissionController(
+    max_concurrent=int(os.environ.get('ADMISSION_MAX_CONCURRENT', 2)),
+    max_audio_seconds=float(os.environ.get('ADMISSION_MAX_AUDIO_SECONDS', 1200)),
+    max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', 1)),
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 2)),
+)
+# Límites de cada subida, comprobados antes de decodificar
+ANALYZE_MAX_UPLOAD_BYTES = int(os.environ.get('ANALYZE_MAX_UPLOAD_BYTES', 100 * 1024 * 1024))
+ANALYZE_MAX_SECONDS = float(os.environ.get('ANALYZE_MAX_SECONDS', 900))
+admission_rejected_total = REGISTRY.counter(
+    'admission_rejected_total', 'Peticiones de análisis rechazadas por el control de admisión',
+    ('endpoint', 'reason'))
+admission_wait_seconds = REGISTRY.histogram(
+    'admission_wait_seconds', 'Espera en la cola de admisión de los análisis admitidos', ('endpoint',))
+analyses_in_flight = REGISTRY.gauge('admission_analyses_in_flight', 'Análisis en curso en el proceso')
+audio_seconds_in_flight = REGISTRY.gauge(
+    'admission_audio_seconds_in_flight', 'Segundos de audio de los análisis en curso')
+admission_queue_depth = REGISTRY.gauge('admission_queue_depth', 'Peticiones de análisis esperando plaza')
+
+# Análisis en vivo por WebSocket (/analyze/live): duración máxima de una sesión y
+# silencio que cierra una repetición
+LIVE_MAX_SECONDS = float(os.environ.get('LIVE_MAX_SECONDS', 600))
+LIVE_MIN_SILENCE = float(os.environ.get('LIVE_MIN_SILENCE', 0.3))
+# Segundos sin recibir audio tras los que se cierra la sesión (cliente parado o
+# desaparecido sin cerrar la conexión). La sesión tampoco dura, en tiempo real,
+# más de LIVE_MAX_SECONDS + LIVE_IDLE_SECONDS aunque el audio llegue a cuentagotas
+LIVE_IDLE_SECONDS = float(os.environ.get('LIVE_IDLE_SECONDS', 30))
+
+# Filtro de calidad antes del reconocedor (ver quality.py), con umbrales por subnivel
+QUALITY_GATE_ENABLED = os.environ.get('QUALITY_GATE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+quality_gate_vocales = QualityGate.parse(os.environ.get('QUALITY_GATE_VOCALES', ''))
+quality_gate_abecedario = QualityGate.parse(os.environ.get('QUALITY_GATE_ABECEDARIO', ''))
+quality_gate_silabas = QualityGate.parse(os.environ.get('QUALITY_GATE_SILABAS', ''))
+gate_rejected_total = REGISTRY.counter(
+    'analysis_gate_rejected_total', 'Segmentos descartados por el filtro de calidad', ('sublevel', 'reason'))
+report_requests_total = REGISTRY.counter(
+    'report_requests_total', 'Descargas de /report por resultado de la caché (hit, miss, not_modified)', ('result',))
+asr_calls_saved_total = REGISTRY.counter(
+    'asr_calls_saved_total', 'Llamadas al reconocedor remoto evitadas por el filtro de calidad', ('recognizer',))
+
+# Ejecutar warm_up() al arrancar (python app.py o gunicorn con gunicorn.conf.py)
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', '1').lower() in ('1', 'true', 'yes')
+
+# Decodificación por bloques de subidas largas: 'auto' (a partir de
+# STREAMING_MIN_SECONDS), 'always' o 'never'
+ANALYZE_STREAMING = os.environ.get('ANALYZE_STREAMING', 'auto').lower()
+STREAMING_MIN_SECONDS = float(os.environ.get('STREAMING_MIN_SECONDS', 120))
 
 wit_api_vocales = os.environ.get('WIT_API_VOCALES', 'VGO3EDVN5RAAAVIXVGV57YBPHYYYYNZM')
 wit_api_abecedario = os.environ.get('WIT_API_ABECEDARIO', "YUFNV5VSE6S5DNVBSSYDY7UKQMHWQNOC")
 wit_api_silabas = os.environ.get('WIT_API_SILABAS', "TGOBGNEL3NSLKLAJKWIG4ML46YJJILOV")
+WIT_API_URL = os.environ.get('WIT_API_URL', 'https://api.wit.ai/speech?v=20201126')
+
+# Concurrencia de las llamadas a Wit.ai: límite global (compartido por todas las
+# peticiones del proceso) y límite por petición de /analyze
+WIT_MAX_CONCURRENCY = int(os.environ.get('WIT_MAX_CONCURRENCY', 8))
+WIT_MAX_CONCURRENCY_PER_REQUEST = int(os.environ.get('WIT_MAX_CONCURRENCY_PER_REQUEST', 4))
+transcription_pool = ThreadPoolExecutor(max_workers=WIT_MAX_CONCURRENCY, thread_name_prefix='wit')
+
+# Cliente compartido: conexiones keep-alive por API key, reintentos y circuit breaker
+wit_client = WitClient(
+    WIT_API_URL,
+    max_retries=int(os.environ.get('WIT_MAX_RETRIES', 3)),
+    rate_per_minute=int(os.environ.get('WIT_RATE_LIMIT_PER_MINUTE', 240)),
+    breaker_threshold=int(os.environ.get('WIT_BREAKER_THRESHOLD', 5)),
+    breaker_reset=float(os.environ.get('WIT_BREAKER_RESET_SECONDS', 30)),
+    pool_size=WIT_MAX_CONCURRENCY,
+)
+
+# Caché por contenido de transcripciones y métricas acústicas (memoria + disco opcional)
+analysis_cache = AnalysisCache(
+    max_entries=int(os.environ.get('ANALYSIS_CACHE_ENTRIES', 4096)),
+    ttl_seconds=float(os.environ.get('ANALYSIS_CACHE_TTL_SECONDS', 7 * 24 * 3600)),
+    disk_folder=os.environ.get('ANALYSIS_CACHE_DIR') or None,
+)
 
-def analyze_audio(fp):
-    """Carga audio y calcula métricas acústicas más precisas."""
+# Extractor de F0 por subnivel ('piptrack' o 'autocorr', ver features.F0_EXTRACTORS)
+# Un nombre desconocido falla al arrancar, no en cada análisis
+f0_method_vocales = features.parse_f0_method(os.environ.get('F0_METHOD_VOCALES', 'piptrack'))
+f0_method_abecedario = features.parse_f0_method(os.environ.get('F0_METHOD_ABECEDARIO', 'piptrack'))
+f0_method_silabas = features.parse_f0_method(os.environ.get('F0_METHOD_SILABAS', 'piptrack'))
+
+# Reconocedor de voz por subnivel: 'wit' (Wit.ai) o 'templates' (local, MFCC + DTW
+# contra las grabaciones de referencia en SPEECH_TEMPLATES_DIR/<etiqueta>/*.wav)
+recognizer_vocales = os.environ.get('RECOGNIZER_VOCALES', 'wit')
+recognizer_abecedario = os.environ.get('RECOGNIZER_ABECEDARIO', 'wit')
+recognizer_silabas = os.environ.get('RECOGNIZER_SILABAS', 'wit')
+template_recognizer = TemplateRecognizer(
+    os.environ.get('SPEECH_TEMPLATES_DIR', 'speech_templates'),
+    sr=ANALYSIS_SR,
+    temperature=float(os.environ.get('TEMPLATE_TEMPERATURE', 0.02)),
+    max_distance=float(os.environ.get('TEMPLATE_MAX_DISTANCE', 0.6)),
+)
+
+def analyze_audio(y, sr=ANALYSIS_SR, f0_method='piptrack', frames=None):
+    """Calcula métricas acústicas sobre una señal ya decodificada (p. ej. una vista de un segmento).
+
+    Si se pasa `frames` (FeatureFrames del segmento) se reutilizan su STFT y su RMS.
+    """
     try:
-        y, sr = librosa.load(fp, sr=16000)
-        
-        # Extraer pitch/F0
-        pitches, magnitudes = librosa.piptrack(y=y, sr=sr, threshold=0.1)
-        
-        # Filtrar valores válidos de pitch
-        pitch_values = []
-        for t in range(pitches.shape[1]):
-            index = magnitudes[:, t].argmax()
-            pitch = pitches[index, t]
-            if pitch > 0:
-                pitch_values.append(pitch)
-        
-        if len(pitch_values) < 3:
-            return None, None, None
-            
-        pitch_values = np.array(pitch_values)
-        meanF0 = float(np.mean(pitch_values))
-        
-        # Cálculo de jitter (variabilidad de período)
-        periods = 1.0 / pitch_values
-        period_diff = np.diff(periods)
-        jitter = float(np.std(period_diff) / np.mean(periods)) if len(period_diff) > 0 else 0.0
-        
-        # Cálculo de shimmer (variabilidad de amplitud)
-        rms = librosa.feature.rms(y=y, frame_length=2048, hop_length=512)[0]
-        if len(rms) > 1:
-            rms_diff = np.diff(rms)
-            shimmer = float(np.std(rms_diff) / np.mean(rms)) if np.mean(rms) > 0 else 0.0
-        else:
-            shimmer = 0.0
-            
-        return meanF0, jitter, shimmer
-        
+        if frames is None:
+            frames = FeatureFrames(y, sr)
+
+        return voice_metrics(frames, f0_method)
+
     except Exception as e:
         print(f"Error analyzing audio: {e}")
         return None, None, None
@@ -72,44 +221,119 @@ def get_api_key_for_subnivel(subnivel):
     else:
         return wit_api_vocales  # por defecto
 
-def transcribe_speech(fp, subnivel):
-    """Envía a Wit.ai y devuelve texto y confianza."""
-    api_key = get_api_key_for_subnivel(subnivel)
+def get_f0_method_for_subnivel(subnivel):
+    """Obtiene el extractor de F0 configurado para el subnivel."""
+    subnivel_clean = subnivel.lower().strip()
+
+    if subnivel_clean == "vocales":
+        return f0_method_vocales
+    elif subnivel_clean in ["abecedario", "consonantes", "letras"]:
+        return f0_method_abecedario
+    elif subnivel_clean in ["sílabas", "silabas", "syllables"]:
+        return f0_method_silabas
+    else:
+        return f0_method_vocales  # por defecto
+
+def get_quality_gate_for_subnivel(subnivel):
+    """Obtiene los umbrales del filtro de calidad configurados para el subnivel."""
+    subnivel_clean = subnivel.lower().strip()
 
+    if subnivel_clean == "vocales":
+        return quality_gate_vocales
+    elif subnivel_clean in ["abecedario", "consonantes", "letras"]:
+        return quality_gate_abecedario
+    elif subnivel_clean in ["sílabas", "silabas", "syllables"]:
+        return quality_gate_silabas
+    else:
+        return quality_gate_vocales  # por defecto
+
+def get_recognizer_for_subnivel(subnivel):
+    """Obtiene el reconocedor de voz configurado para el subnivel."""
+    subnivel_clean = subnivel.lower().strip()
+
+    if subnivel_clean == "vocales":
+        backend = recognizer_vocales
+    elif subnivel_clean in ["abecedario", "consonantes", "letras"]:
+        backend = recognizer_abecedario
+    elif subnivel_clean in ["sílabas", "silabas", "syllables"]:
+        backend = recognizer_silabas
+    else:
+        backend = recognizer_vocales  # por defecto
+
+    if backend == 'templates':
+        return template_recognizer
+    return WitRecognizer(wit_client, get_api_key_for_subnivel(subnivel))
+
+def transcribe_speech(y, sr, subnivel, recognizer=None, trace=None):
+    """Reconoce un segmento con el reconocedor del subnivel y devuelve texto y confianza.
+
+    Lanza TranscriptionError si el reconocedor no responde correctamente (tras los
+    reintentos, en el caso de Wit.ai), para que el segmento no se puntúe como una
+    pronunciación incorrecta.
+    """
+    recognizer = recognizer or get_recognizer_for_subnivel(subnivel)
+
+    start = time.perf_counter()
     try:
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'audio/wav'
-        }
-        
-        with open(fp, 'rb') as f:
-            response = requests.post(
-                'https://api.wit.ai/speech?v=20201126',
-                headers=headers,
-                data=f,
-                timeout=30
-            )
-        
-        if response.status_code != 200:
-            print(f"Wit.ai error: {response.status_code}")
-            return "", 0.0
-            
-        data = response.json()
-        text = data.get('text', '').strip()
-        
-        # Extraer confianza del speech
-        confidence = 0.0
-        if 'speech' in data and 'confidence' in data['speech']:
-            confidence = data['speech']['confidence']
-        elif 'intents' in data and len(data['intents']) > 0:
-            confidence = data['intents'][0].get('confidence', 0.0)
-        
-        print(f"Usando API key para '{subnivel}': texto='{text}', confianza={confidence}")
-        return text, confidence
-        
-    except Exception as e:
+        text, confidence = recognizer.recognize(y, sr)
+    except TranscriptionError as e:
         print(f"Error transcribing speech: {e}")
-        return "", 0.0
+        raise
+    finally:
+        if trace is not None:
+            trace.observe('asr', time.perf_counter() - start)
+
+    print(f"Usando reconocedor '{recognizer.name}' para '{subnivel}': texto='{text}', confianza={confidence}")
+    return text, confidence
+
+def transcribe_segments(segments, subnivel, sr=ANALYSIS_SR, on_result=None, trace=None):
+    """Transcribe varios segmentos en paralelo y devuelve los resultados en el mismo orden.
+
+    `segments` puede ser un generador: sólo se pide el siguiente segmento cuando hay
+    hueco para otra llamada. Cada resultado es `(texto, confianza)` o, si ese segmento
+    falló, la TranscriptionError. Si se pasa `on_result`, se llama con el número de
+    segmentos ya transcritos cada vez que termina uno. Con `trace`, cada llamada al
+    reconocedor se mide como 'asr' y cada acierto de caché cuenta como 'asr_cached'.
+    """
+    results = {}
+    pending = {}
+    queue = enumerate(segments)
+    recognizer = get_recognizer_for_subnivel(subnivel)
+    cache_params = recognizer.cache_params()
+
+    def submit_next():
+        for idx, y_seg in queue:
+            key = segment_key('asr', y_seg, sr, **cache_params)
+            cached = analysis_cache.get(key)
+            if cached is not None:
+                results[idx] = tuple(cached)
+                if trace is not None:
+                    trace.count('asr_cached')
+                continue
+            pending[transcription_pool.submit(transcribe_speech, y_seg, sr, subnivel, recognizer, trace)] = (idx, key)
+            return
+
+    # Nunca más de WIT_MAX_CONCURRENCY_PER_REQUEST llamadas en vuelo por petición
+    for _ in range(max(1, WIT_MAX_CONCURRENCY_PER_REQUEST)):
+        submit_next()
+
+    if on_result and not pending:
+        on_result(len(results))
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            idx, key = pending.pop(future)
+            try:
+                results[idx] = future.result()
+                analysis_cache.put(key, list(results[idx]))
+            except TranscriptionError as e:
+                results[idx] = e
+            submit_next()
+            if on_result:
+                on_result(len(results))
+
+    return [results[idx] for idx in range(len(results))]
 
 # Opciones válidas actualizadas según tus subniveles
 valid_options = {
@@ -171,17 +395,12 @@ valid_options = {
     'su': ['su', 'SU', 'Su']
 }
 
-def calculate_pronunciation_accuracy(text, target_word, speech_confidence, jitter, shimmer, subnivel):
-    """
-    Calcula la precisión de pronunciación basada en múltiples factores y opciones válidas.
-    """
+def pronunciation_bonuses(text, target_word, subnivel):
+    """Bonos que sólo dependen del texto: `(coincidencia exacta, similitud fonética)`."""
     # Normalizar textos para comparación
     text_clean = text.lower().strip()
     target_clean = target_word.lower().strip()
     
-    # Factor base: confianza del speech recognition
-    base_score = speech_confidence * 100
-    
     # Verificar si está en las opciones válidas
     exact_match_bonus = 0
     if target_clean in valid_options:
@@ -191,10 +410,6 @@ def calculate_pronunciation_accuracy(text, target_word, speech_confidence, jitte
         elif text_clean == target_clean:
             exact_match_bonus = 20  # coincidencia exacta directa
     
-    # Factor de calidad acústica (menos jitter y shimmer = mejor)
-    acoustic_quality = max(0, 100 - (jitter * 1000 + shimmer * 100))
-    acoustic_factor = min(15, acoustic_quality * 0.15)
-    
     # Factor de similitud fonética por subnivel
     similarity_bonus = 0
     if not exact_match_bonus and text_clean and target_clean:
@@ -239,6 +454,20 @@ def calculate_pronunciation_accuracy(text, target_word, speech_confidence, jitte
             if target_clean in text_clean or text_clean in target_clean:
                 similarity_bonus = 5
     
+    return exact_match_bonus, similarity_bonus
+
+def calculate_pronunciation_accuracy(text, target_word, speech_confidence, jitter, shimmer, subnivel):
+    """
+    Calcula la precisión de pronunciación basada en múltiples factores y opciones válidas.
+    """
+    exact_match_bonus, similarity_bonus = pronunciation_bonuses(text, target_word, subnivel)
+
+    # Factor base: confianza del speech recognition
+    base_score = speech_confidence * 100
+    
+    # Factor de calidad acústica (menos jitter y shimmer = mejor)
+    acoustic_quality = max(0, 100 - (jitter * 1000 + shimmer * 100))
+    acoustic_factor = min(15, acoustic_quality * 0.15)
     
     # Cálculo final
     final_score = base_score + exact_match_bonus + acoustic_factor + similarity_bonus
@@ -248,18 +477,333 @@ def calculate_pronunciation_accuracy(text, target_word, speech_confidence, jitte
     
     return round(final_score, 1)
 
-def load_json(path, default):
-    if os.path.exists(path):
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return default
-    return default
+def word_matches(text, word):
+    """Si el texto reconocido coincide con la palabra, usando valid_options."""
+    if word.lower() in valid_options:
+        valid_variants = [v.lower() for v in valid_options[word.lower()]]
+        return text.lower().strip() in valid_variants
+    return text.lower().strip() == word.lower().strip()
+
+def score_measurements(texts, words, sublevels, confidence, jitter, shimmer):
+    """Versión vectorizada de calculate_pronunciation_accuracy + word_matches.
+
+    Recibe columnas (listas o arrays de igual longitud) y devuelve
+    `(precisiones, coincidencias)` como listas, idénticas a las de la versión
+    escalar. Los bonos de texto se calculan una vez por combinación distinta de
+    (texto, palabra, subnivel), que en un vocabulario cerrado son pocas.
+    """
+    bonuses = {}
+    matches = []
+    exact = np.empty(len(texts))
+    similarity = np.empty(len(texts))
+    for i, key in enumerate(zip(texts, words, sublevels)):
+        if key not in bonuses:
+            bonuses[key] = pronunciation_bonuses(*key) + (word_matches(key[0], key[1]),)
+        exact[i], similarity[i], match = bonuses[key]
+        matches.append(match)
+
+    # Mismas operaciones y en el mismo orden que la versión escalar
+    base_score = np.asarray(confidence, dtype=float) * 100
+    acoustic_quality = np.maximum(0, 100 - (np.asarray(jitter, dtype=float) * 1000 + np.asarray(shimmer, dtype=float) * 100))
+    acoustic_factor = np.minimum(15, acoustic_quality * 0.15)
+    final_score = base_score + exact + acoustic_factor + similarity
+
+    # Como max(0, min(100, x)) y round() de Python (no np.round), para que los valores
+    # (y su tipo al serializar: 100 y no 100.0) coincidan con la versión escalar
+    return [100 if x >= 100 else 0 if x <= 0 else round(x, 1) for x in final_score.tolist()], matches
+
+def use_streaming(fp):
+    """Decide si la subida se decodifica por bloques (ver ANALYZE_STREAMING)."""
+    if ANALYZE_STREAMING == 'never':
+        return False
+    try:
+        info = sf.info(fp)
+    except Exception:
+        return False  # formato que soundfile no lee: se carga entero con librosa
+    return ANALYZE_STREAMING == 'always' or info.duration >= STREAMING_MIN_SECONDS
+
+def save_upload(storage, path):
+    """Guarda el archivo subido en `path`, descomprimiéndolo si llega con gzip.
+
+    Devuelve los bytes recibidos. Lanza ValueError si el gzip no es válido o si el
+    audio descomprimido supera UPLOAD_MAX_INFLATED_BYTES.
+    """
+    stream = storage.stream
+    head = stream.read(len(GZIP_MAGIC))
+    stream.seek(0, os.SEEK_END)
+    received = stream.tell()
+    stream.seek(0)
+    if head != GZIP_MAGIC:
+        storage.save(path)
+        upload_bytes_total.inc(received, encoding='identity')
+        return received
+
+    written = 0
+    try:
+        with gzip.GzipFile(fileobj=stream) as src, open(path, 'wb') as dst:
+            for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                written += len(chunk)
+                if written > UPLOAD_MAX_INFLATED_BYTES:
+                    break
+                dst.write(chunk)
+    except (gzip.BadGzipFile, EOFError, zlib.error) as e:
+        if os.path.exists(path):
+            os.remove(path)
+        raise ValueError(f"Audio comprimido no válido: {e}")
+    if written > UPLOAD_MAX_INFLATED_BYTES:
+        os.remove(path)
+        raise ValueError(f"Audio demasiado grande (máximo {UPLOAD_MAX_INFLATED_BYTES} bytes descomprimido)")
+    upload_bytes_total.inc(received, encoding='gzip')
+    return received
+
+def upload_filename(name):
+    """Nombre con el que se guarda una subida (sin el `.gz` del audio comprimido)."""
+    name = os.path.basename(name or '')
+    return name[:-3] if name.lower().endswith('.gz') else name
+
+def check_upload_limits(fp):
+    """Duración (s) de la subida guardada en `fp` según su cabecera, sin decodificarla.
+
+    Lanza ValueError si supera ANALYZE_MAX_SECONDS. Devuelve None si no se puede
+    medir (formato que no se sabe leer): quien llama la rechaza con 415.
+    """
+    duration = audio_duration(fp)
+    if duration is None:
+        return None
+    if ANALYZE_MAX_SECONDS and duration > ANALYZE_MAX_SECONDS:
+        raise ValueError(f"Audio demasiado largo ({duration:.0f} s; máximo {ANALYZE_MAX_SECONDS:.0f} s)")
+    return duration
+
+def busy_response(endpoint, reason, retry_after, discard=False):
+    """503 con Retry-After para una petición que el control de admisión no deja pasar.
+
+    Con `discard` se lee y descarta el cuerpo sin parsearlo ni guardarlo: si se
+    respondiera sin leerlo, la conexión keep-alive quedaría con la subida a medias
+    y ocuparía un hilo de gunicorn hasta el siguiente intento del cliente.
+    """
+    admission_rejected_total.inc(endpoint=endpoint, reason=reason)
+    if discard:
+        for _ in iter(lambda: request.stream.read(256 * 1024), b''):
+            pass
+    response = jsonify({"error": "Servidor ocupado, inténtalo de nuevo en unos segundos",
+                        "retryAfter": retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
 
-def save_json(path, obj):
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(obj, f, indent=2, ensure_ascii=False, sort_keys=False)
+def run_admitted(seconds, fp, rid, level, sub, sesn, word, progress=None, trace=None, queued=False):
+    """`run_analysis` con plaza del control de admisión para `seconds` de audio.
+
+    Una petición síncrona espera como mucho ADMISSION_QUEUE_TIMEOUT y, sin plaza,
+    devuelve 503 con `retryAfter` (y borra `fp`); un trabajo asíncrono espera lo
+    que haga falta.
+    """
+    trace = trace or Trace('analyze', reportId=rid, sublevel=sub, word=word)
+    if queued:
+        trace.gap('queued')  # espera en la cola de trabajos asíncronos
+    try:
+        with trace.span('admission'):
+            ticket = admission.acquire(seconds, timeout=None if queued else -1)
+    except AdmissionRejected as e:
+        admission_rejected_total.inc(endpoint=trace.endpoint, reason=e.reason)
+        if os.path.exists(fp):
+            os.remove(fp)
+        trace.finish(503)
+        return {"error": "Servidor ocupado, inténtalo de nuevo en unos segundos", "retryAfter": e.retry_after}, 503
+    admission_wait_seconds.observe(ticket.waited, endpoint=trace.endpoint)
+    try:
+        return run_analysis(fp, rid, level, sub, sesn, word, progress, trace)
+    finally:
+        admission.release(ticket)
+
+def measure_segment(seg, f0_method):
+    """(meanF0, jitter, shimmer) de un segmento, usando la caché por contenido.
+
+    La clave es sólo el PCM del segmento porque sus tramas no dependen de lo que
+    haya alrededor (`FeatureFrames.segment` rellena los bordes con ceros); `framing`
+    la distingue de las entradas de antes, calculadas con las muestras vecinas. Los
+    fallos (sin F0 suficiente o un error) no se guardan.
+    """
+    key = segment_key('features', seg.y, seg.sr, f0_method=f0_method, framing='zero-padded',
+                      frame_length=seg.frame_length, hop_length=seg.hop_length)
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+    result = analyze_audio(seg.y, seg.sr, f0_method, frames=seg)
+    if result[0] is not None:
+        analysis_cache.put(key, list(result))
+    return result
+
+def passes_quality_gate(idx, quality, acoustic, sub, recognizer, rejected, trace=None):
+    """Aplica el filtro de calidad del subnivel a un segmento ya medido.
+
+    Si se descarta, añade su motivo y sus medidas a `rejected`, cuenta la llamada
+    evitada si el reconocedor es remoto y devuelve False.
+    """
+    reason = get_quality_gate_for_subnivel(sub).reject_reason(quality, acoustic[0])
+    if reason is None:
+        return True
+    print(f"Segmento {idx + 1} descartado antes del reconocimiento ({reason})")
+    rejected.append(rejection(idx, reason, quality))
+    gate_rejected_total.inc(sublevel=sub, reason=reason)
+    if recognizer.remote:
+        asr_calls_saved_total.inc(recognizer=recognizer.name)
+    if trace is not None:
+        trace.count('gated')
+    return False
+
+def warm_up():
+    """Recorre una vez el camino DSP completo con un clip sintético de 1 s.
+
+    La primera llamada a librosa importa sus submódulos (numba, scipy.signal...) y
+    compila con numba la segmentación, piptrack y el DTW: más de un segundo que, sin
+    esto, paga la primera subida de cada worker. No usa la caché de análisis, la red
+    ni los pools de hilos o procesos, así que se puede llamar en el proceso maestro de
+    gunicorn antes del fork (`preload_app`, ver gunicorn.conf.py) y los workers
+    heredan ya cargado y compilado todo. Devuelve los segundos empleados.
+    """
+    t0 = time.perf_counter()
+    sr = 44100  # distinta de ANALYSIS_SR para pasar también por el remuestreo
+    t = np.arange(sr) / sr
+    tone = np.sin(2 * np.pi * 220 * t) * np.hanning(sr) * 0.5
+    y = np.concatenate([np.zeros(sr // 4), tone, np.zeros(sr // 4)]).astype(np.float32)
+
+    fd, path = tempfile.mkstemp(suffix='.wav', dir=UPLOAD_FOLDER)
+    os.close(fd)
+    try:
+        sf.write(path, y, sr, subtype='PCM_16')
+        y, sr = librosa.load(path, sr=ANALYSIS_SR)
+        frames = FeatureFrames(y, sr)
+        for start, end in frames.split(top_db=20):
+            for method in {f0_method_vocales, f0_method_abecedario, f0_method_silabas}:
+                voice_metrics(frames.segment(start, end), method)
+        for _ in stream_segments(path, ANALYSIS_SR, top_db=20, spool_dir=UPLOAD_FOLDER):
+            pass
+        segment_quality(frames, noise_floor(frames.rms, frames.speech(top_db=20)))
+        query = template_recognizer.mfcc(y, sr)
+        template_recognizer.distance(query, query)
+    finally:
+        os.remove(path)
+    elapsed = time.perf_counter() - t0
+    print(f"Calentamiento completado en {elapsed:.2f} s")
+    return elapsed
+
+def score_segments(segments, transcriptions, word, sub, trace=None):
+    """Puntúa cada segmento medido con su transcripción.
+
+    `segments` son `(idx, (meanF0, jitter, shimmer), duración)` y `transcriptions` los
+    resultados de `transcribe_segments` en el mismo orden. Devuelve
+    `(repeticiones, medidas, errores_asr)`, con una fila de medidas en bruto (ver
+    report_store.MEASUREMENT_FIELDS) por repetición. Con `trace` se cuentan los
+    segmentos puntuados y los fallos de ASR y de análisis acústico.
+    """
+    count = trace.count if trace is not None else (lambda outcome: None)
+    repetitions_data = []
+    measurements = []
+    asr_errors = []
+    for (idx, (meanF0, jitter, shimmer), duration), transcription in zip(segments, transcriptions):
+        if isinstance(transcription, TranscriptionError):
+            print(f"Segmento {idx + 1}: transcripción falló ({transcription})")
+            count('asr_failed')
+            asr_errors.append(transcription)
+            continue
+
+        text, speech_confidence = transcription
+        print(f"Segmento {idx + 1}: texto='{text}', confianza={speech_confidence}")
+
+        if meanF0 is None:
+            print(f"Segmento {idx + 1}: análisis acústico falló")
+            count('acoustic_failed')
+            continue
+
+        pronunciation_accuracy = calculate_pronunciation_accuracy(
+            text, word, speech_confidence, jitter, shimmer, sub
+        )
+        
+        # Verificar si coincide usando valid_options
+        matches = word_matches(text, word)
+
+        repetition_data = OrderedDict([
+            ("pronunciationAccuracy", pronunciation_accuracy),
+            ("containsPronunciationSound", True),
+            ("pronunciationMatchesWord", matches)
+        ])
+        
+        repetitions_data.append(repetition_data)
+        measurements.append([idx, text, speech_confidence, meanF0, jitter, shimmer, round(duration, 3)])
+        count('scored')
+
+    return repetitions_data, measurements, asr_errors
+
+def measurement_entry(level, sub, sesn, word, rows):
+    """Entrada del archivo de medidas para un evento de repeticiones."""
+    return OrderedDict([
+        ("level", level),
+        ("sublevel", sub),
+        ("sessionNumber", sesn),
+        ("word", word),
+        ("recordedAt", datetime.datetime.now().isoformat(timespec='seconds')),
+        ("rows", rows)
+    ])
+
+def record_repetitions(rid, level, sub, sesn, word, repetitions_data, measurements):
+    """Anota las repeticiones (y sus medidas) en el diario del reporte; los promedios
+    se recalculan al materializar el reporte."""
+    reports_store.append(rid, OrderedDict([
+        ("level", level),
+        ("sublevel", sub),
+        ("sessionNumber", sesn),
+        ("word", word),
+        ("repetitions", repetitions_data)
+    ]), measurements=measurement_entry(level, sub, sesn, word, measurements))
+    reports_catalog.touch(rid)
+
+def no_repetitions_error(asr_errors):
+    """Respuesta `(cuerpo, código)` cuando ningún segmento produjo una repetición."""
+    if asr_errors:
+        # No es un problema del audio: el reconocedor no respondió
+        retry_after = max((getattr(e, 'retry_after', 0) for e in asr_errors), default=0)
+        return {
+            "error": f"Servicio de reconocimiento no disponible: {asr_errors[-1]}",
+            "retryAfter": max(1, int(retry_after))
+        }, 503
+    return {"error": "No se pudieron procesar segmentos válidos"}, 400
+
+def profile_requested():
+    """Si la petición actual debe perfilarse (cabecera X-Profile o muestreo)."""
+    if not PROFILING_ENABLED:
+        return False
+    header = request.headers.get('X-Profile', '')
+    if header:
+        if ADMIN_TOKEN:
+            return hmac.compare_digest(header, ADMIN_TOKEN)
+        return localhost_allowed() and header.lower() in ('1', 'true', 'yes')
+    return profiles.sampled()
+
+def profiled(endpoint):
+    """Decorador de vistas: perfila la petición si se pide y añade X-Profile-Id a la respuesta."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not profile_requested():
+                return view(*args, **kwargs)
+            key = kwargs.get('rid') or request.form.get('reportId', '')
+            response, name = profiles.run(lambda: app.make_response(view(*args, **kwargs)), endpoint, key)
+            if name:
+                print(f"Perfil guardado: {name}")
+                response.headers['X-Profile-Id'] = name
+            return response
+        return wrapper
+    return decorator
+
+def localhost_allowed():
+    """Sin ADMIN_TOKEN: si ADMIN_ALLOW_LOCALHOST está activo y la petición viene de localhost."""
+    return ADMIN_ALLOW_LOCALHOST and request.remote_addr in ('127.0.0.1', '::1')
+
+def admin_authorized():
+    """Rutas /admin: con ADMIN_TOKEN, la cabecera X-Admin-Token; sin él, ver localhost_allowed."""
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+    return localhost_allowed()
 
 # --- Rutas ---
 
@@ -272,8 +816,8 @@ def start_report():
     """Inicia un nuevo reporte con la estructura JSON correcta."""
     data = request.get_json()
     
-    # Generar ID único para el reporte
-    rid = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    # Generar ID único para el reporte (fecha legible + sufijo aleatorio)
+    rid = f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
     
     # Estructura base exacta como tu ejemplo
     base = OrderedDict([
@@ -313,14 +857,32 @@ def start_report():
     ])
     
     # Guardar el reporte inicial
-    path = os.path.join(RESULTS_FOLDER, f"report_{rid}.json")
-    save_json(path, base)
+    reports_store.create(rid, base)
+    reports_catalog.upsert(base)
     
     return jsonify({"reportId": rid, "status": "success"})
 
 @app.route('/analyze', methods=['POST'])
+@profiled('analyze')
 def analyze():
-    """Analiza el audio y actualiza el reporte JSON."""
+    """Analiza el audio y actualiza el reporte JSON.
+
+    Con `async=1` (campo del formulario o query string) sólo guarda el audio y
+    responde 202 con un jobId; el progreso y el resultado se consultan en /jobs/<id>.
+    Responde 413 si la subida supera ANALYZE_MAX_UPLOAD_BYTES o ANALYZE_MAX_SECONDS,
+    415 si no se puede leer su duración y 503 con Retry-After si el control de
+    admisión no le da plaza a tiempo.
+    """
+    # 0) Rechazar cuanto antes, sin leer la subida, si no hay plaza ni sitio en la cola
+    if request.content_length and request.content_length > ANALYZE_MAX_UPLOAD_BYTES:
+        # Sin leer el cuerpo: la conexión se cierra después de responder
+        response = jsonify({"error": f"Archivo demasiado grande (máximo {ANALYZE_MAX_UPLOAD_BYTES} bytes)"})
+        response.headers['Connection'] = 'close'
+        return response, 413
+    # Sólo si está saturado se mira `async` en el formulario, que obliga a leer la subida
+    if admission.saturated() and request.values.get('async', '').lower() not in ('1', 'true', 'yes'):
+        return busy_response('analyze', 'queue_full', admission.retry_after(), discard=True)
+
     # 1) Leer parámetros
     audio = request.files.get('audio')
     rid   = request.form.get('reportId')
@@ -332,225 +894,955 @@ def analyze():
     if not all([audio, rid, level, sub, word]):
         return jsonify({"error": "Faltan parámetros requeridos"}), 400
 
+    if not reports_store.exists(rid):
+        return jsonify({"error": "Reporte no encontrado"}), 404
+
     # 2) Guardar temporalmente el audio
+    is_async = request.values.get('async', '').lower() in ('1', 'true', 'yes')
+    trace = Trace('analyze_async' if is_async else 'analyze', reportId=rid, sublevel=sub, word=word)
     timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-    fp = os.path.join(UPLOAD_FOLDER, f"{rid}_{timestamp}_{audio.filename}")
-    audio.save(fp)
-
+    fp = os.path.join(UPLOAD_FOLDER, f"{rid}_{timestamp}_{upload_filename(audio.filename)}")
     try:
-        # 3) Cargar y segmentar el audio
-        y, sr = librosa.load(fp, sr=None)
-        # Mejorar la detección de segmentos con parámetros más sensibles
-        intervals = librosa.effects.split(y, top_db=20, frame_length=2048, hop_length=512)
-        
-        print(f"Detectados {len(intervals)} segmentos de audio")
-        
-        if len(intervals) == 0:
-            return jsonify({"error": "No se detectó ninguna pronunciación"}), 400
-
-        # 4) Preparar JSON maestro
-        master_path = os.path.join(RESULTS_FOLDER, f"report_{rid}.json")
-        report = load_json(master_path, {})
-        levels = report["reports"]["games"]["expresatea"]["levels"]
-        levels.setdefault(level, {"sublevels": {}})
-        subs = levels[level]["sublevels"]
-        #Mapear el subnivel al numero
-        sublevel_numbers = {
-            "Vocales": 1,
-            "Abecedario": 2,
-            "Sílabas": 3
-        }
+        with trace.span('upload'):
+            trace.fields['uploadBytes'] = save_upload(audio, fp)
+    except ValueError as e:
+        trace.finish(400)
+        return jsonify({"error": str(e)}), 400
+    try:
+        if trace.fields['uploadBytes'] > ANALYZE_MAX_UPLOAD_BYTES:
+            raise ValueError(f"Archivo demasiado grande (máximo {ANALYZE_MAX_UPLOAD_BYTES} bytes)")
+        seconds = check_upload_limits(fp)
+    except ValueError as e:
+        os.remove(fp)
+        trace.finish(413)
+        return jsonify({"error": str(e)}), 413
+    if seconds is None:
+        os.remove(fp)
+        trace.finish(415)
+        return jsonify({"error": "Formato de audio no soportado"}), 415
 
-        sublevel_num = sublevel_numbers.get(sub, 1)  # default a 1 si no encuentra
-        
-        subs.setdefault(sub, OrderedDict([
-            ("sublevelName", f"Subnivel {sublevel_num}: {sub}"),
-            ("sessions", [])
-        ]))
+    if is_async:
+        job_id = analysis_jobs.submit(run_admitted, seconds, fp, rid, level, sub, sesn, word, trace=trace, queued=True)
+        return jsonify({"jobId": job_id, "status": "queued", "statusUrl": f"/jobs/{job_id}"}), 202
 
-        sessions = subs[sub]["sessions"]
-        while len(sessions) < sesn:
-            sessions.append(OrderedDict([
-                ("sessionNumber", len(sessions) + 1),
-                ("words", []),
-                ("sessionAverage", OrderedDict([
-                    ("pronunciationAccuracy", 0.0),
-                    ("totalCorrectWords", 0)
-                ]))
-            ]))
-        session_obj = sessions[sesn - 1]
-        words = session_obj["words"]
-        word_obj = next((w for w in words if w["word"] == word), None)
-        if not word_obj:
-            word_obj = OrderedDict([
-                ("word", word),
-                ("repetitions", []),
-                ("individualAverage", OrderedDict([
-                    ("pronunciationAccuracy", 0.0),
-                    ("wordRepeatedCorrectly", False)
-                ]))
-            ])
-            words.append(word_obj)
+    body, status = run_admitted(seconds, fp, rid, level, sub, sesn, word, trace=trace)
+    response = jsonify(body)
+    if "retryAfter" in body:
+        response.headers['Retry-After'] = str(body["retryAfter"])
+    return response, status
 
-        # 5) Analizar cada segmento como una repetición
-        repetitions_data = []
-        for idx, (start, end) in enumerate(intervals):
-            print(f"Procesando segmento {idx + 1}: {start}-{end}")
-            
-            y_seg = y[start:end]
-            # Filtrar segmentos muy cortos (menos de 0.3 segundos)
-            if len(y_seg) < sr * 0.3:
-                print(f"Segmento {idx + 1} muy corto, saltando...")
-                continue
-                
-            segment_fp = f"{fp}_seg{idx}.wav"
-            sf.write(segment_fp, y_seg, sr)
+def run_analysis(fp, rid, level, sub, sesn, word, progress=None, trace=None):
+    """Procesa el audio guardado en `fp` y anota sus repeticiones en el reporte.
+
+    Devuelve `(cuerpo, código HTTP)`. `progress(**campos)` recibe el avance por etapa
+    y por segmento; `trace` (metrics.Trace) el tiempo de cada etapa, que se registra
+    al terminar. Borra `fp` al terminar.
+    """
+    trace = trace or Trace('analyze', reportId=rid, sublevel=sub, word=word)
+    body, status = _run_analysis(fp, rid, level, sub, sesn, word, progress or (lambda **fields: None), trace)
+    trace.finish(status)
+    return body, status
+
+def _run_analysis(fp, rid, level, sub, sesn, word, progress, trace):
+    try:
+        # 3) Decodificar (y remuestrear a 16 kHz) una única vez y segmentar
+        progress(stage="decoding")
+        sr = ANALYSIS_SR
+        frames = None
+        # Subida ya en WAV mono a 16 kHz (la prepara el navegador): sin remuestreo
+        canonical = is_canonical(fp, ANALYSIS_SR)
+        trace.fields['uploadFormat'] = 'canonical' if canonical else 'resampled'
+        uploads_total.inc(format=trace.fields['uploadFormat'])
+        if use_streaming(fp):
+            # Subida larga: por bloques, la memoria depende del segmento más largo
+            print("Decodificando por bloques (streaming)")
+            source = trace.iterate((
+                (start, end, FeatureFrames(y_seg, sr, frame_length=2048, hop_length=512), floor)
+                for start, end, y_seg, floor in stream_segments(fp, sr, top_db=20, spool_dir=UPLOAD_FOLDER)
+            ), 'decode')
+        else:
+            with trace.span('decode'):
+                y, sr = decode_file(fp, ANALYSIS_SR, canonical)
+            # Energía y STFT de toda la subida, compartidas por segmentación y análisis
+            frames = FeatureFrames(y, sr, frame_length=2048, hop_length=512)
+            # Mejorar la detección de segmentos con parámetros más sensibles
+            with trace.span('split'):
+                intervals = frames.split(top_db=20)
+            print(f"Detectados {len(intervals)} segmentos de audio")
+            floor = noise_floor(frames.rms, frames.speech(top_db=20))
+            source = ((start, end, frames.segment(start, end), floor) for start, end in intervals)
 
-            text, speech_confidence = transcribe_speech(segment_fp, sub)
-            meanF0, jitter, shimmer = analyze_audio(segment_fp)
+        # 4) Medir cada segmento válido según se detecta y transcribirlos en paralelo
+        f0_method = get_f0_method_for_subnivel(sub)
+        recognizer = get_recognizer_for_subnivel(sub)
+        segments = []  # (idx, (meanF0, jitter, shimmer))
+        rejected = []  # segmentos descartados por el filtro de calidad
+        detected = 0
+        stft_count = 0
 
-            print(f"Segmento {idx + 1}: texto='{text}', confianza={speech_confidence}")
+        def valid_segments():
+            nonlocal detected, stft_count
+            for idx, (start, end, seg, floor) in enumerate(source):
+                detected += 1
+                trace.count('detected')
+                print(f"Procesando segmento {idx + 1}: {start}-{end}")
 
-            if meanF0 is None:
-                print(f"Segmento {idx + 1}: análisis acústico falló")
-                os.remove(segment_fp)
-                continue
+                # Filtrar segmentos muy cortos (menos de 0.3 segundos)
+                if end - start < sr * 0.3:
+                    print(f"Segmento {idx + 1} muy corto, saltando...")
+                    trace.count('too_short')
+                    continue
 
-            pronunciation_accuracy = calculate_pronunciation_accuracy(
-                text, word, speech_confidence, jitter, shimmer, sub
+                with trace.span('features', per_segment=True):
+                    acoustic = measure_segment(seg, f0_method)
+                # Descartar ruidos, respiraciones o audio saturado antes de pagar el ASR
+                if QUALITY_GATE_ENABLED:
+                    with trace.span('gate', per_segment=True):
+                        quality = segment_quality(seg, floor)
+                    if not passes_quality_gate(idx, quality, acoustic, sub, recognizer, rejected, trace):
+                        stft_count += seg.stft_count
+                        continue
+                segments.append((idx, acoustic, (end - start) / sr))
+                stft_count += seg.stft_count
+                progress(segmentsDetected=detected, segmentsTotal=len(segments), segmentsAnalyzed=len(segments))
+                yield seg.y
+
+        progress(stage="analyzing", segmentsTranscribed=0, segmentsAnalyzed=0)
+        # Tiempo propio de 'transcribe': la espera al ASR (decode/features van aparte)
+        with trace.span('transcribe'):
+            transcriptions = transcribe_segments(
+                valid_segments(), sub, sr,
+                on_result=lambda n: progress(segmentsTranscribed=n), trace=trace
             )
-            
-            # Verificar si coincide usando valid_options
-            matches = False
-            if word.lower() in valid_options:
-                valid_variants = [v.lower() for v in valid_options[word.lower()]]
-                matches = text.lower().strip() in valid_variants
-            else:
-                matches = text.lower().strip() == word.lower().strip()
+        if frames is not None:
+            stft_count += frames.stft_count
 
-            repetition_data = OrderedDict([
-                ("pronunciationAccuracy", pronunciation_accuracy),
-                ("containsPronunciationSound", True),
-                ("pronunciationMatchesWord", matches)
-            ])
-            
-            word_obj["repetitions"].append(repetition_data)
-            repetitions_data.append(repetition_data)
-            
-            os.remove(segment_fp)
+        if detected == 0:
+            return {"error": "No se detectó ninguna pronunciación"}, 400
+
+        # 5) Puntuar cada segmento como una repetición
+        with trace.span('score'):
+            repetitions_data, measurements, asr_errors = score_segments(segments, transcriptions, word, sub, trace)
+
+        print(f"STFT calculadas en esta petición: {stft_count} (total del proceso: {features.stft_total})")
 
         if not repetitions_data:
-            return jsonify({"error": "No se pudieron procesar segmentos válidos"}), 400
-
-        # 6) Recalcular promedios
-        reps = word_obj["repetitions"]
-        if reps:
-            avg_accuracy = sum(r["pronunciationAccuracy"] for r in reps) / len(reps)
-            any_correct = any(r["pronunciationMatchesWord"] for r in reps)
-            word_obj["individualAverage"] = OrderedDict([
-                ("pronunciationAccuracy", round(avg_accuracy, 1)),
-                ("wordRepeatedCorrectly", any_correct)
-            ])
-            
-        if words:
-            session_accuracies = [w["individualAverage"]["pronunciationAccuracy"] for w in words]
-            correct_words = sum(1 for w in words if w["individualAverage"]["wordRepeatedCorrectly"])
-            session_obj["sessionAverage"] = OrderedDict([
-                ("pronunciationAccuracy", round(sum(session_accuracies) / len(session_accuracies), 1)),
-                ("totalCorrectWords", correct_words)
-            ])
+            body, status = no_repetitions_error(asr_errors)
+            if rejected:
+                body["rejectedSegments"] = rejected
+            return body, status
 
-        save_json(master_path, report)
+        progress(stage="saving")
+        # 6) Anotar las repeticiones en el diario del reporte
+        with trace.span('journal'):
+            record_repetitions(rid, level, sub, sesn, word, repetitions_data, measurements)
         
-        return jsonify({
+        return {
             "result": {
                 "reportId": rid,
                 "sessionNumber": sesn,
                 "word": word,
                 "repetitions": repetitions_data,
-                "segmentsDetected": len(intervals),
-                "validSegmentsProcessed": len(repetitions_data)
+                "segmentsDetected": detected,
+                "validSegmentsProcessed": len(repetitions_data),
+                "asrFailures": len(asr_errors),
+                "rejectedSegments": rejected,
+                "asrCallsSaved": len(rejected) if recognizer.remote else 0
             }
-        })
+        }, 200
 
     except Exception as e:
         print(f"Error en analyze: {e}")
         import traceback
         traceback.print_exc()
-        return jsonify({"error": f"Error procesando audio: {str(e)}"}), 500
+        return {"error": f"Error procesando audio: {str(e)}"}, 500
 
     finally:
         # Limpiar archivo temporal
         if os.path.exists(fp):
             os.remove(fp)
 
+@sock.route('/analyze/live')
+def analyze_live(ws):
+    """Análisis en vivo desde el micrófono del navegador.
+
+    Protocolo: el cliente envía primero un mensaje de texto JSON con `reportId`,
+    `level`, `sublevel`, `sessionNumber`, `word` y `sampleRate`; después, mensajes
+    binarios con PCM mono de 16 bits little-endian a esa frecuencia; y al terminar,
+    `{"type": "stop"}`. El servidor responde `{"type": "ready"}`, un mensaje
+    `repetition` (o `segment` si no se pudo puntuar) por cada repetición en cuanto
+    termina, y al final `{"type": "done", "status": ..., ...}` con el mismo cuerpo
+    que /analyze. Las repeticiones se anotan en el reporte como en /analyze.
+    """
+    try:
+        params = json.loads(ws.receive(timeout=30) or '{}')
+        rid, level, sub, word = (params.get(k) for k in ('reportId', 'level', 'sublevel', 'word'))
+        sesn = int(params.get('sessionNumber', 1))
+        rate = int(params.get('sampleRate', ANALYSIS_SR))
+    except (ValueError, TypeError, AttributeError):
+        ws.send(json.dumps({"type": "done", "status": 400, "error": "Mensaje inicial inválido"}))
+        return
+    except ConnectionClosed:
+        return
+
+    if not all([rid, level, sub, word]) or not 8000 <= rate <= 192000:
+        ws.send(json.dumps({"type": "done", "status": 400, "error": "Faltan parámetros requeridos"}))
+        return
+    if not reports_store.exists(rid):
+        ws.send(json.dumps({"type": "done", "status": 404, "error": "Reporte no encontrado"}))
+        return
+
+    trace = Trace('analyze_live', reportId=rid, sublevel=sub, word=word)
+    connected = True
+
+    def send(message):
+        nonlocal connected
+        if connected:
+            try:
+                ws.send(json.dumps(message))
+            except ConnectionClosed:
+                connected = False
+
+    try:
+        body, status = run_live_analysis(ws, send, rid, level, sub, sesn, word, rate, trace)
+    except Exception as e:
+        print(f"Error en analyze_live: {e}")
+        import traceback
+        traceback.print_exc()
+        body, status = {"error": f"Error procesando audio: {str(e)}"}, 500
+    trace.finish(status)
+    send(OrderedDict([("type", "done"), ("status", status), *body.items()]))
+
+def run_live_analysis(ws, send, rid, level, sub, sesn, word, rate, trace):
+    """Recibe el audio de `ws`, segmenta en línea y puntúa cada repetición al cerrarse.
+
+    Cada segmento se mide en este hilo y se transcribe en `transcription_pool`;
+    mientras tanto se siguen recibiendo bloques. Si el cliente se desconecta sin
+    enviar `stop`, deja de enviar audio LIVE_IDLE_SECONDS o la sesión supera su
+    duración máxima, se procesa lo recibido igualmente. Devuelve `(cuerpo, código)`.
+    """
+    sr = ANALYSIS_SR
+    segmenter = LiveSegmenter(sr, top_db=20, frame_length=2048, hop_length=512,
+                              min_silence=LIVE_MIN_SILENCE, input_sr=rate)
+    f0_method = get_f0_method_for_subnivel(sub)
+    recognizer = get_recognizer_for_subnivel(sub)
+    cache_params = recognizer.cache_params()
+    segments = {}        # idx -> (idx, (meanF0, jitter, shimmer), duración)
+    transcriptions = {}  # idx -> (texto, confianza) o TranscriptionError
+    pending = {}         # future -> (idx, clave de caché)
+    rejected = []        # segmentos descartados por el filtro de calidad
+    detected = 0
+    received = 0
+
+    def measure(closed):
+        nonlocal detected
+        for start, end, y_seg, floor in closed:
+            idx = detected
+            detected += 1
+            trace.count('detected')
+            if end - start < sr * 0.3:
+                trace.count('too_short')
+                send({"type": "segment", "index": idx, "status": "too_short"})
+                continue
+            with trace.span('features', per_segment=True):
+                seg = FeatureFrames(y_seg, sr, frame_length=2048, hop_length=512)
+                acoustic = measure_segment(seg, f0_method)
+            if QUALITY_GATE_ENABLED:
+                with trace.span('gate', per_segment=True):
+                    quality = segment_quality(seg, floor)
+                if not passes_quality_gate(idx, quality, acoustic, sub, recognizer, rejected, trace):
+                    send(OrderedDict([("type", "segment"), ("index", idx), ("status", "rejected"),
+                                      ("rejection", rejected[-1])]))
+                    continue
+            segments[idx] = (idx, acoustic, (end - start) / sr)
+            key = segment_key('asr', y_seg, sr, **cache_params)
+            cached = analysis_cache.get(key)
+            if cached is not None:
+                trace.count('asr_cached')
+                deliver(idx, tuple(cached))
+            else:
+                pending[transcription_pool.submit(transcribe_speech, y_seg, sr, sub, recognizer, trace)] = (idx, key)
+
+    def deliver(idx, transcription):
+        transcriptions[idx] = transcription
+        repetitions, rows, errors = score_segments([segments[idx]], [transcription], word, sub)
+        if repetitions:
+            send({"type": "repetition", "index": idx, "duration": rows[0][-1], "repetition": repetitions[0]})
+        else:
+            send({"type": "segment", "index": idx,
+                  "status": "asr_failed" if errors else "acoustic_failed"})
+
+    def collect(timeout):
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED) if pending else ((), ())
+        for future in done:
+            idx, key = pending.pop(future)
+            try:
+                transcription = future.result()
+                analysis_cache.put(key, list(transcription))
+            except TranscriptionError as e:
+                transcription = e
+            deliver(idx, transcription)
+
+    send({"type": "ready", "sampleRate": sr})
+    deadline = time.monotonic() + LIVE_MAX_SECONDS + LIVE_IDLE_SECONDS
+    last_audio = time.monotonic()
+    while True:
+        now = time.monotonic()
+        if now - last_audio >= LIVE_IDLE_SECONDS:
+            print(f"analyze_live {rid}: {LIVE_IDLE_SECONDS:.0f} s sin recibir audio")
+            send({"type": "limit", "reason": "idle", "idleSeconds": LIVE_IDLE_SECONDS})
+            break
+        if now >= deadline:
+            send({"type": "limit", "reason": "deadline", "maxSeconds": LIVE_MAX_SECONDS})
+            break
+        try:
+            with trace.span('receive'):
+                message = ws.receive(timeout=0.05)
+        except ConnectionClosed:
+            print(f"analyze_live {rid}: el cliente se desconectó")
+            break
+        if isinstance(message, (bytes, bytearray)):
+            block = np.frombuffer(message[:len(message) // 2 * 2], dtype='<i2').astype(np.float32) / 32768.0
+            received += len(block)
+            last_audio = time.monotonic()
+            with trace.span('segment'):
+                closed = segmenter.push(block)
+            measure(closed)
+            if received >= LIVE_MAX_SECONDS * rate:
+                send({"type": "limit", "reason": "maxSeconds", "maxSeconds": LIVE_MAX_SECONDS})
+                break
+        elif message:
+            try:
+                if json.loads(message).get('type') == 'stop':
+                    break
+            except (ValueError, AttributeError):
+                pass
+        collect(0)
+
+    with trace.span('segment'):
+        closed = segmenter.finish()
+    measure(closed)
+    with trace.span('transcribe'):
+        while pending:
+            collect(None)
+
+    if detected == 0:
+        return {"error": "No se detectó ninguna pronunciación"}, 400
+
+    # Puntuación final en orden de segmento, la misma que guardaría /analyze
+    order = sorted(segments)
+    with trace.span('score'):
+        repetitions_data, measurements, asr_errors = score_segments(
+            [segments[idx] for idx in order], [transcriptions[idx] for idx in order], word, sub, trace)
+    if not repetitions_data:
+        body, status = no_repetitions_error(asr_errors)
+        if rejected:
+            body["rejectedSegments"] = rejected
+        return body, status
+
+    with trace.span('journal'):
+        record_repetitions(rid, level, sub, sesn, word, repetitions_data, measurements)
+
+    return {
+        "result": {
+            "reportId": rid,
+            "sessionNumber": sesn,
+            "word": word,
+            "repetitions": repetitions_data,
+            "segmentsDetected": detected,
+            "validSegmentsProcessed": len(repetitions_data),
+            "asrFailures": len(asr_errors),
+            "rejectedSegments": rejected,
+            "asrCallsSaved": len(rejected) if recognizer.remote else 0,
+            "seconds": round(received / rate, 2)
+        }
+    }, 200
+
+def get_batch_pool():
+    """Pool de procesos de los lotes, creado al primer uso."""
+    global batch_pool
+    with batch_pool_lock:
+        if batch_pool is None:
+            batch_pool = batch.make_pool(BATCH_WORKERS or None)
+        return batch_pool
+
+def reset_batch_pool(broken):
+    """Descarta el pool si un proceso murió (p. ej. sin memoria); el próximo lote crea otro."""
+    global batch_pool
+    with batch_pool_lock:
+        if batch_pool is broken:
+            batch_pool = None
+    broken.shutdown(wait=False)
+
+def extract_batch_archive(archive, folder):
+    """Extrae los audios de un zip en `folder` y devuelve `(archivos, manifest)`.
+
+    `archivos` relaciona la ruta de cada audio dentro del zip (`sesion1/a.wav`) con
+    su ruta en disco; si el nombre sin carpetas (`a.wav`) no se repite en otra
+    carpeta, también vale ese. El manifest es el contenido de `manifest.json` o None
+    si el zip no lo trae. Se deja de extraer en cuanto los bytes descomprimidos
+    superan BATCH_MAX_ARCHIVE_BYTES, digan lo que digan las cabeceras del zip.
+    """
+    files = {}
+    basenames = {}
+    manifest = None
+    remaining = BATCH_MAX_ARCHIVE_BYTES
+    too_big = ValueError("El archivo comprimido es demasiado grande")
+    with zipfile.ZipFile(archive) as zf:
+        members = [m for m in zf.infolist() if not m.is_dir()]
+        if sum(m.file_size for m in members) > BATCH_MAX_ARCHIVE_BYTES:
+            raise too_big
+        for i, member in enumerate(members):
+            name = os.path.basename(member.filename)
+            if not name or name.startswith('.'):
+                continue
+            with zf.open(member) as src:
+                if name == 'manifest.json':
+                    data = src.read(remaining + 1)
+                    remaining -= len(data)
+                    if remaining < 0:
+                        raise too_big
+                    manifest = json.loads(data.decode('utf-8'))
+                    continue
+                path = os.path.join(folder, f"{i}_{name}")
+                with open(path, 'wb') as dst:
+                    while True:
+                        chunk = src.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        remaining -= len(chunk)
+                        if remaining < 0:
+                            raise too_big
+                        dst.write(chunk)
+            files[member.filename] = path
+            basenames.setdefault(name, []).append(path)
+    for name, paths in basenames.items():
+        if len(paths) == 1:
+            files.setdefault(name, paths[0])
+    return files, manifest
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analiza varias grabaciones de un reporte en una sola petición.
+
+    Las grabaciones llegan como varios campos `audio` más un campo `items` (JSON: lista
+    de objetos con `word` y, opcionalmente, `level`, `sublevel`, `sessionNumber` y
+    `file`, el nombre del archivo; sin `file` se emparejan por posición) o como un zip
+    `archive` con esa lista en `manifest.json`. `level`, `sublevel` y `sessionNumber`
+    del formulario son los valores por defecto de cada elemento.
+
+    La decodificación y las métricas acústicas se reparten en un pool de procesos;
+    todas las repeticiones se anotan en el reporte con una sola escritura. Cada
+    elemento lleva su propio `status` y su `result` o `error`.
+    """
+    if admission.saturated():
+        return busy_response('analyze_batch', 'queue_full', admission.retry_after(), discard=True)
+
+    rid = request.form.get('reportId')
+    if not rid:
+        return jsonify({"error": "Faltan parámetros requeridos"}), 400
+
+    if not reports_store.exists(rid):
+        return jsonify({"error": "Reporte no encontrado"}), 404
+
+    try:
+        items = json.loads(request.form.get('items') or 'null')
+    except ValueError:
+        return jsonify({"error": "El campo items no es JSON válido"}), 400
+
+    batch_dir = os.path.join(UPLOAD_FOLDER, f"batch_{rid}_{uuid.uuid4().hex[:8]}")
+    os.makedirs(batch_dir)
+    trace = Trace('analyze_batch', reportId=rid)
+    try:
+        # 1) Guardar las grabaciones
+        archive = request.files.get('archive')
+        ordered = []
+        if archive:
+            try:
+                with trace.span('upload'):
+                    files, manifest = extract_batch_archive(archive, batch_dir)
+            except (zipfile.BadZipFile, ValueError) as e:
+                return jsonify({"error": f"Archivo comprimido no válido: {e}"}), 400
+            if items is None:
+                items = manifest
+        else:
+            files = {}
+            for i, audio in enumerate(request.files.getlist('audio')):
+                name = os.path.basename(audio.filename or '') or f"{i}.wav"
+                path = os.path.join(batch_dir, f"{i}_{upload_filename(name)}")
+                try:
+                    with trace.span('upload'):
+                        save_upload(audio, path)
+                except ValueError as e:
+                    return jsonify({"error": f"{name}: {e}"}), 400
+                files[name] = path
+                ordered.append((name, path))
+            if items is None:
+                items = [{} for _ in ordered]
+
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "No hay grabaciones que analizar"}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"Demasiadas grabaciones (máximo {BATCH_MAX_ITEMS})"}), 400
+
+        # 2) Validar cada elemento y repartir la parte CPU en el pool de procesos
+        results = [None] * len(items)
+        pending = []  # (params, path, segundos)
+        for i, item in enumerate(items):
+            item = item if isinstance(item, dict) else {}
+            name, path = item.get('file'), None
+            if name:
+                path = files.get(name)
+            elif i < len(ordered):
+                name, path = ordered[i]
+            params = OrderedDict([
+                ("index", i),
+                ("file", name),
+                ("level", item.get('level') or request.form.get('level')),
+                ("sublevel", item.get('sublevel') or request.form.get('sublevel')),
+                ("sessionNumber", item.get('sessionNumber') or request.form.get('sessionNumber', 1)),
+                ("word", item.get('word')),
+            ])
+            try:
+                params["sessionNumber"] = int(params["sessionNumber"])
+            except (TypeError, ValueError):
+                params["sessionNumber"] = None
+
+            if not path:
+                results[i] = OrderedDict(params, status=400, error="Grabación no encontrada")
+            elif not all([params["level"], params["sublevel"], params["word"], params["sessionNumber"]]):
+                results[i] = OrderedDict(params, status=400, error="Faltan parámetros requeridos")
+            else:
+                try:
+                    seconds = check_upload_limits(path)
+                except ValueError as e:
+                    results[i] = OrderedDict(params, status=413, error=str(e))
+                    continue
+                if seconds is None:
+                    results[i] = OrderedDict(params, status=415, error="Formato de audio no soportado")
+                else:
+                    pending.append((params, path, seconds))
+
+        # Una sola plaza para todo el lote, con el audio de todas sus grabaciones
+        try:
+            with trace.span('admission'):
+                ticket = admission.acquire(sum(seconds for _, _, seconds in pending))
+        except AdmissionRejected as e:
+            trace.finish(503)
+            return busy_response('analyze_batch', e.reason, e.retry_after)
+        admission_wait_seconds.observe(ticket.waited, endpoint='analyze_batch')
+        try:
+            return _run_batch(rid, items, results, pending, batch_dir, trace)
+        finally:
+            admission.release(ticket)
+
+    finally:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+def _run_batch(rid, items, results, pending, batch_dir, trace):
+    """Pasos 2 a 4 de /analyze/batch para los elementos `pending`, con la plaza ya concedida."""
+    jobs = {}
+    pool = get_batch_pool()
+    for params, path, _ in pending:
+        future = pool.submit(
+            batch.measure_recording, path, ANALYSIS_SR,
+            get_f0_method_for_subnivel(params["sublevel"]),
+            use_streaming(path), spool_dir=batch_dir,
+        )
+        jobs[future] = params
+
+    # 3) Transcribir y puntuar cada grabación según termina su parte CPU
+    events = {}
+    event_measurements = {}
+    # Tiempo propio de 'measure': la espera a que el pool de procesos termine cada grabación
+    for future in trace.iterate(as_completed(jobs), 'measure'):
+        params = jobs[future]
+        i, sub, word = params["index"], params["sublevel"], params["word"]
+        try:
+            detected, measured = future.result()
+        except Exception as e:
+            print(f"Error en analyze/batch (elemento {i}): {e}")
+            if isinstance(e, BrokenProcessPool):
+                reset_batch_pool(pool)
+            results[i] = OrderedDict(params, status=500, error=f"Error procesando audio: {e}")
+            continue
+
+        trace.count('detected', detected)
+        trace.count('too_short', detected - len(measured))
+        if detected == 0:
+            results[i] = OrderedDict(params, status=400, error="No se detectó ninguna pronunciación")
+            continue
+
+        rejected = []
+        if QUALITY_GATE_ENABLED:
+            recognizer = get_recognizer_for_subnivel(sub)
+            measured = [m for m in measured
+                        if passes_quality_gate(m[0], m[3], m[2], sub, recognizer, rejected, trace)]
+        with trace.span('transcribe'):
+            transcriptions = transcribe_segments(
+                (y_seg for _, y_seg, _, _ in measured), sub, ANALYSIS_SR, trace=trace
+            )
+        with trace.span('score'):
+            repetitions_data, measurements, asr_errors = score_segments(
+                [(idx, acoustic, len(y_seg) / ANALYSIS_SR) for idx, y_seg, acoustic, _ in measured],
+                transcriptions, word, sub, trace
+            )
+        if not repetitions_data:
+            body, status = no_repetitions_error(asr_errors)
+            if rejected:
+                body["rejectedSegments"] = rejected
+            results[i] = OrderedDict(params, status=status, **body)
+            continue
+
+        events[i] = OrderedDict([
+            ("level", params["level"]),
+            ("sublevel", sub),
+            ("sessionNumber", params["sessionNumber"]),
+            ("word", word),
+            ("repetitions", repetitions_data)
+        ])
+        event_measurements[i] = measurement_entry(params["level"], sub, params["sessionNumber"], word, measurements)
+        results[i] = OrderedDict(params, status=200, result=OrderedDict([
+            ("repetitions", repetitions_data),
+            ("segmentsDetected", detected),
+            ("validSegmentsProcessed", len(repetitions_data)),
+            ("asrFailures", len(asr_errors)),
+            ("rejectedSegments", rejected),
+            ("asrCallsSaved", len(rejected) if get_recognizer_for_subnivel(sub).remote else 0),
+        ]))
+
+    # 4) Una sola escritura del diario para todo el lote, en el orden de los elementos
+    if events:
+        with trace.span('journal'):
+            reports_store.extend(rid, [events[i] for i in sorted(events)],
+                                 [event_measurements[i] for i in sorted(events)])
+            reports_catalog.touch(rid)
+    trace.finish(200, items=len(items), processed=len(events))
+
+    return jsonify({
+        "reportId": rid,
+        "items": results,
+        "processed": len(events),
+        "failed": len(results) - len(events)
+    })
+
+# Duración de todas las peticiones HTTP, por endpoint
+http_request_seconds = REGISTRY.histogram(
+    'http_request_seconds', 'Duración de las peticiones HTTP', ('endpoint', 'method', 'status'))
+wit_events_total = REGISTRY.counter('wit_client_events_total', 'Eventos del cliente de Wit.ai', ('event',))
+wit_circuit_open = REGISTRY.gauge('wit_client_circuit_open', 'Circuit breaker de Wit.ai abierto (1) o no (0)')
+cache_events_total = REGISTRY.counter('analysis_cache_events_total', 'Aciertos, fallos y desalojos de la caché', ('event',))
+cache_entries = REGISTRY.gauge('analysis_cache_entries', 'Entradas en la caché en memoria')
+
+@REGISTRY.collector
+def collect_client_metrics():
+    wit = wit_client.stats()
+    for event, value in wit.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            wit_events_total.set(value, event=event)
+    wit_circuit_open.set(0 if wit["circuit_state"] == "closed" else 1)
+    cache = analysis_cache.stats()
+    for event, value in cache.items():
+        if event == "entries":
+            cache_entries.set(value)
+        else:
+            cache_events_total.set(value, event=event)
+    slots = admission.stats()
+    analyses_in_flight.set(slots["active"])
+    audio_seconds_in_flight.set(slots["audioSeconds"])
+    admission_queue_depth.set(slots["waiting"])
+
+@app.before_request
+def start_request_timer():
+    request.environ['app.start'] = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    start = request.environ.get('app.start')
+    if start is not None:
+        http_request_seconds.observe(
+            time.perf_counter() - start,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method, status=response.status_code,
+        )
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas del proceso en formato de texto de Prometheus."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiles')
+def list_profiles():
+    """Perfiles guardados (nombre, tamaño y fecha), del más reciente al más antiguo."""
+    if not admin_authorized():
+        return jsonify({"error": "No autorizado"}), 403
+    return jsonify({"profiles": profiles.list(), "enabled": PROFILING_ENABLED})
+
+@app.route('/admin/profiles/<name>')
+def download_profile(name):
+    """Descarga un perfil (.prof de pstats) o, con `format=text`, su resumen por `sort`."""
+    if not admin_authorized():
+        return jsonify({"error": "No autorizado"}), 403
+    path = profiles.path(name)
+    if not path or not os.path.exists(path):
+        return jsonify({"error": "Perfil no encontrado"}), 404
+    if request.args.get('format') == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'ncalls'):
+            return jsonify({"error": "sort debe ser cumulative, tottime o ncalls"}), 400
+        return Response(profiles.summary(name, sort), mimetype='text/plain')
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=name,
+                     mimetype='application/octet-stream')
+
+@app.route('/asr/stats')
+def asr_stats():
+    """Contadores del cliente de Wit.ai: peticiones, reintentos, errores, latencia y estado del
+    circuito, más las llamadas que evitó el filtro de calidad."""
+    stats = wit_client.stats()
+    stats["savedByQualityGate"] = asr_calls_saved_total.total()
+    return jsonify(stats)
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Aciertos y fallos de la caché de transcripciones y métricas acústicas."""
+    return jsonify(analysis_cache.stats())
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Estado de un análisis asíncrono: progreso por segmento y, al terminar, el resultado."""
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent events con el estado del trabajo cada vez que cambia, hasta que termina.
+
+    Cada conexión dura como mucho JOB_EVENTS_MAX_SECONDS: entonces envía `retry:` y
+    se cierra, y el EventSource del navegador vuelve a conectarse. Entre medias sólo
+    se mira la fecha del fichero de estado; se lee cuando cambia y, para detectar
+    trabajos cuyo proceso murió, cada pocos segundos.
+    """
+    if analysis_jobs.get(job_id) is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+
+    def stream():
+        deadline = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+        last = seen = None
+        recheck = 0.0
+        while time.monotonic() < deadline:
+            version = analysis_jobs.version(job_id)
+            if version is None:
+                return
+            if version != seen or time.monotonic() >= recheck:
+                seen, recheck = version, time.monotonic() + 5.0
+                job = analysis_jobs.get(job_id)
+                if job is None:
+                    return
+                if job.get("updated") != last:
+                    last = job.get("updated")
+                    yield f"data: {json.dumps(job, ensure_ascii=False)}\n\n"
+                if job["status"] in ("done", "failed"):
+                    return
+            time.sleep(0.25)
+        yield f"retry: {JOB_EVENTS_RETRY_MS}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
 @app.route('/report/<rid>')
+@profiled('report')
 def get_report(rid):
-    """Obtiene el reporte completo y lo marca como completado."""
-    path = os.path.join(RESULTS_FOLDER, f"report_{rid}.json")
-    if not os.path.exists(path):
+    """Descarga el reporte completo. Sólo lee: el estado cambia en /finalize/<rid>.
+
+    Se sirve desde la caché de reportes serializados mientras sus ficheros no
+    cambien, con ETag (`If-None-Match` responde 304) y con gzip si el cliente lo
+    acepta y el reporte es grande.
+    """
+    version = reports_store.version(rid)
+    if version is None:
         return jsonify({"error": "Reporte no encontrado"}), 404
-    
-    report = load_json(path, {})
-    if not report:
-        return jsonify({"error": "Error cargando reporte"}), 500
-    
-    # Marcar como completado y agregar comentarios/recomendaciones
-    report["reportDetails"]["reportStatus"] = "completed"
-    if not report["reportDetails"]["comments"]:
-        report["reportDetails"]["comments"] = "The patient has shown significant improvement in attention and focus."
-    if not report["reportDetails"]["recommendations"]:
-        report["reportDetails"]["recommendations"] = "The patient should continue using the app for at least 30 minutes a day."
-    
-    save_json(path, report)
-
-    # Usar Response en lugar de jsonify para preservar el orden
-    json_str = json.dumps(report, indent=2, ensure_ascii=False, sort_keys=False)
-    return Response(
-        json_str,
-        mimetype='application/json',
-        headers={'Content-Disposition': f'attachment; filename="report_{rid}.json"'}
-    )
+
+    rendered = report_renders.get(rid, version)
+    if rendered is None:
+        # Con el cerrojo, para no leer el base nuevo con el diario ya vaciado (o al revés)
+        with reports_store.lock(rid):
+            version = reports_store.version(rid)
+            report = reports_store.load(rid)
+        if not report:
+            return jsonify({"error": "Error cargando reporte"}), 500
+        rendered = report_renders.put(rid, version, report)
+        result = "miss"
+    else:
+        result = "hit"
+
+    # La variante gzip lleva su propio ETag; cualquiera de los dos vale para el 304
+    gzipped = rendered.gzipped is not None and request.accept_encodings['gzip'] > 0
+    etag = rendered.etag + ('-gzip' if gzipped else '')
+    if request.if_none_match.contains_weak(rendered.etag) or request.if_none_match.contains_weak(rendered.etag + '-gzip'):
+        response = Response(status=304)
+        result = "not_modified"
+    else:
+        # Bytes ya serializados: conservan el orden de las claves (jsonify las ordenaría)
+        response = Response(
+            rendered.gzipped if gzipped else rendered.body,
+            mimetype='application/json',
+            headers={'Content-Disposition': f'attachment; filename="report_{rid}.json"'}
+        )
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+    report_requests_total.inc(result=result)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/reports')
 def list_reports():
-    """Lista todos los reportes disponibles."""
-    reports = []
-    for filename in os.listdir(RESULTS_FOLDER):
-        if filename.startswith('report_') and filename.endswith('.json'):
-            rid = filename.replace('report_', '').replace('.json', '')
-            path = os.path.join(RESULTS_FOLDER, filename)
-            report = load_json(path, {})
-            if report:
-                reports.append({
-                    "reportId": rid,
-                    "patientName": report.get("patientDetails", {}).get("patientFullName", ""),
-                    "created": report.get("reportDetails", {}).get("reportCreated", ""),
-                    "status": report.get("reportDetails", {}).get("reportStatus", "")
-                })
-    return jsonify({"reports": reports})
+    """Lista los reportes desde el catálogo, con paginación y filtros opcionales.
+
+    Parámetros: page, perPage, patient (nombre o ID), status, from/to (YYYY-MM-DD).
+    """
+    page = request.args.get('page', type=int)
+    per_page = max(1, min(500, request.args.get('perPage', 50, type=int)))
+    if page is not None and page < 1:
+        return jsonify({"error": "Parámetros de paginación inválidos"}), 400
+
+    reports, total = reports_catalog.list(
+        page=page,
+        per_page=per_page,
+        patient=request.args.get('patient'),
+        status=request.args.get('status'),
+        date_from=request.args.get('from'),
+        date_to=request.args.get('to'),
+    )
+    result = {"reports": reports, "total": total}
+    if page is not None:
+        result.update({"page": page, "perPage": per_page})
+    return jsonify(result)
+
+@app.route('/reports/export')
+def export_reports():
+    """Exporta en streaming todas las repeticiones de los reportes, una fila por repetición.
+
+    `format` es `ndjson` (por defecto) o `csv`; acepta los mismos filtros que
+    /reports (patient, status, from/to). Si el cliente acepta gzip, se comprime
+    sobre la marcha. Saca los datos de todos los pacientes de una vez, así que
+    requiere la misma autorización que las rutas /admin.
+    """
+    if not admin_authorized():
+        return jsonify({"error": "No autorizado"}), 403
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Formato no soportado: {fmt} (usa {', '.join(EXPORT_FORMATS)})"}), 400
+
+    report_ids = reports_catalog.iter_ids(
+        patient=request.args.get('patient') or None,
+        status=request.args.get('status') or None,
+        date_from=request.args.get('from') or None,
+        date_to=request.args.get('to') or None,
+    )
+    chunks = export_chunks(export_rows(reports_store, report_ids), fmt)
+    headers = {'Content-Disposition': f'attachment; filename="reports_export.{fmt}"', 'Cache-Control': 'no-cache'}
+    if request.accept_encodings['gzip'] > 0:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    response = Response(chunks, mimetype=EXPORT_FORMATS[fmt], headers=headers)
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.cli.command('export')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='ndjson')
+@click.option('--output', '-o', default='-', help='fichero de salida (por defecto, la salida estándar)')
+@click.option('--patient', default=None, help='nombre o ID del paciente')
+@click.option('--status', default=None, help='estado del reporte')
+@click.option('--from', 'date_from', default=None, help='desde esta fecha (YYYY-MM-DD)')
+@click.option('--to', 'date_to', default=None, help='hasta esta fecha, incluida (YYYY-MM-DD)')
+def export_command(fmt, output, patient, status, date_from, date_to):
+    """Exporta todas las repeticiones de los reportes en NDJSON o CSV, una fila por repetición."""
+    report_ids = reports_catalog.iter_ids(patient=patient, status=status, date_from=date_from, date_to=date_to)
+    with click.open_file(output, 'w', encoding='utf-8') as f:
+        for chunk in export_chunks(export_rows(reports_store, report_ids), fmt):
+            f.write(chunk)
+
+@app.cli.command('rebuild-catalog')
+def rebuild_catalog_command():
+    """Reconstruye el catálogo de reportes a partir de los JSON en disco."""
+    count = reports_catalog.rebuild(RESULTS_FOLDER)
+    print(f"Catálogo reconstruido: {count} reportes")
+
+@app.route('/reports/rescore', methods=['POST'])
+def rescore_reports_route():
+    """Repuntúa los reportes con las medidas guardadas y la puntuación actual.
+
+    Acepta los mismos filtros que /reports (`patient`, `status`, `from`, `to`) y
+    `dryRun=1` para sólo contar lo que cambiaría. Reescribe las puntuaciones de
+    todos los reportes que coinciden, así que requiere la autorización de /admin.
+    """
+    if not admin_authorized():
+        return jsonify({"error": "No autorizado"}), 403
+    rows, _ = reports_catalog.list(
+        patient=request.values.get('patient') or None,
+        status=request.values.get('status') or None,
+        date_from=request.values.get('from') or None,
+        date_to=request.values.get('to') or None,
+    )
+    dry_run = request.values.get('dryRun', '').lower() in ('1', 'true', 'yes')
+    stats = rescore_reports(
+        reports_store, [row["reportId"] for row in rows], score_measurements,
+        dry_run=dry_run, on_saved=reports_catalog.touch_many,
+    )
+    return jsonify(stats)
+
+@app.cli.command('rescore')
+@click.option('--patient', default=None, help='nombre o ID del paciente')
+@click.option('--status', default=None, help='estado del reporte')
+@click.option('--dry-run', is_flag=True, help='no guardar, sólo contar los cambios')
+def rescore_command(patient, status, dry_run):
+    """Repuntúa los reportes con las medidas guardadas, sin volver a analizar el audio."""
+    rows, _ = reports_catalog.list(patient=patient, status=status)
+    stats = rescore_reports(
+        reports_store, [row["reportId"] for row in rows], score_measurements,
+        dry_run=dry_run, on_saved=reports_catalog.touch_many,
+    )
+    print(json.dumps(stats, indent=2))
 
 @app.route('/finalize/<rid>', methods=['POST'])
 def finalize_report(rid):
-    """Finaliza un reporte con comentarios y recomendaciones."""
-    data = request.get_json()
-    path = os.path.join(RESULTS_FOLDER, f"report_{rid}.json")
+    """Finaliza un reporte: lo marca como completado y fija comentarios y recomendaciones.
+
+    Los que no vengan en el cuerpo se conservan; si quedan vacíos se usan los
+    textos por defecto.
+    """
+    data = request.get_json(silent=True) or {}
     
-    if not os.path.exists(path):
+    if not reports_store.exists(rid):
         return jsonify({"error": "Reporte no encontrado"}), 404
     
-    report = load_json(path, {})
-    if not report:
-        return jsonify({"error": "Error cargando reporte"}), 500
-    
-    # Actualizar comentarios y recomendaciones
-    report["reportDetails"]["comments"] = data.get("comments", "")
-    report["reportDetails"]["recommendations"] = data.get("recommendations", "")
-    report["reportDetails"]["reportStatus"] = "completed"
-    
-    save_json(path, report)
+    with reports_store.lock(rid):
+        report = reports_store.load(rid)
+        if not report:
+            return jsonify({"error": "Error cargando reporte"}), 500
+        
+        # Actualizar comentarios y recomendaciones
+        details = report["reportDetails"]
+        details["comments"] = data.get("comments") or details.get("comments") or DEFAULT_COMMENTS
+        details["recommendations"] = (data.get("recommendations") or details.get("recommendations")
+                                      or DEFAULT_RECOMMENDATIONS)
+        details["reportStatus"] = "completed"
+        
+        reports_store.save(rid, report)
+        reports_catalog.upsert(report)
     return jsonify({"status": "success", "message": "Reporte finalizado"})
 
+@app.cli.command('warmup')
+def warmup_command():
+    """Carga y compila el camino DSP (útil para medir cuánto tarda)."""
+    warm_up()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
+    if WARMUP_ON_START:
+        warm_up()
     app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
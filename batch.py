@@ -0,0 +1,62 @@
+"""Parte CPU del análisis por lotes, pensada para ejecutarse en un pool de procesos.
+
+`measure_recording` decodifica una grabación, la segmenta y calcula las métricas
+acústicas de cada segmento válido. Sólo depende de `features` y `streaming` (no de
+`app`), para que los procesos hijo arranquen sin levantar la aplicación Flask,
+sus pools de hilos ni sus conexiones.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+
+from features import FeatureFrames, voice_metrics, segment_quality, noise_floor
+from streaming import stream_segments, decode_file
+
+
+def measure_recording(fp, sr, f0_method, streaming=False, top_db=20, min_seconds=0.3, spool_dir=None):
+    """Segmenta `fp` y mide cada segmento válido.
+
+    Devuelve `(detectados, segmentos)`, con `segmentos` una lista de
+    `(idx, y_segmento, (meanF0, jitter, shimmer), calidad)` en orden temporal, donde
+    `calidad` es la tupla de `features.segment_quality` (el filtro se aplica en el
+    proceso principal). Los segmentos de menos de `min_seconds` cuentan como
+    detectados pero no se miden.
+    """
+    if streaming:
+        source = (
+            (start, end, FeatureFrames(y_seg, sr), floor)
+            for start, end, y_seg, floor in stream_segments(fp, sr, top_db=top_db, spool_dir=spool_dir)
+        )
+    else:
+        y, sr = decode_file(fp, sr)
+        frames = FeatureFrames(y, sr)
+        floor = noise_floor(frames.rms, frames.speech(top_db))
+        source = ((start, end, frames.segment(start, end), floor) for start, end in frames.split(top_db=top_db))
+
+    detected = 0
+    segments = []
+    for idx, (start, end, seg, floor) in enumerate(source):
+        detected += 1
+        if end - start < sr * min_seconds:
+            continue
+        try:
+            metrics = voice_metrics(seg, f0_method)
+        except Exception as e:
+            print(f"Error analyzing audio: {e}")
+            metrics = (None, None, None)
+        segments.append((idx, np.ascontiguousarray(seg.y, dtype=np.float32), metrics, segment_quality(seg, floor)))
+    return detected, segments
+
+
+def make_pool(max_workers=None):
+    """Pool de procesos para `measure_recording` (uno por núcleo por defecto).
+
+    Usa `spawn`: hacer fork de un proceso con hilos (los de Wit.ai, los trabajos
+    asíncronos) puede heredar locks tomados.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
@@ -0,0 +1,6 @@
+"""Benchmarks de la aplicación de análisis de audio.
+
+Se ejecutan desde la raíz del repositorio, por ejemplo:
+
+    python -m benchmarks.bench_transcription
+"""
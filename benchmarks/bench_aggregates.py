@@ -0,0 +1,123 @@
+"""Coste de materializar un reporte con promedios incrementales (`RunningAverages`).
+
+Materializa un reporte con `--repetitions` repeticiones en su diario con el
+recálculo de antes (recorrer la palabra y la sesión en cada evento) y con los
+agregados. Que los dos den el mismo reporte lo comprueba tests/test_aggregates.py.
+
+    python -m benchmarks.bench_aggregates --repetitions 20000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+# También como `python benchmarks/bench_aggregates.py`, sin -m
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_store import ReportStore, load_json
+
+WORDS = ['a', 'e', 'i', 'o', 'u', 'b', 'c', 'ma', 'pa']
+
+
+def base_report(rid):
+    return OrderedDict([
+        ("reportDetails", OrderedDict([("reportId", rid), ("reportStatus", "in_progress")])),
+        ("reports", OrderedDict([("games", OrderedDict([("expresatea", OrderedDict([
+            ("levels", OrderedDict([("Level 1", OrderedDict([("sublevels", OrderedDict())]))])),
+        ]))]))])),
+    ])
+
+
+def random_accuracy(rng):
+    kind = rng.random()
+    if kind < 0.2:
+        return 100
+    if kind < 0.35:
+        return 0
+    return round(rng.uniform(0, 100), 1)
+
+
+def legacy_apply(report, event):
+    """Cómo se aplicaba un evento antes: buscar la palabra y recorrer palabra y sesión."""
+    level, sub, sesn, word = event["level"], event["sublevel"], event["sessionNumber"], event["word"]
+    levels = report["reports"]["games"]["expresatea"]["levels"]
+    subs = levels.setdefault(level, {"sublevels": {}})["sublevels"]
+    sessions = subs.setdefault(sub, OrderedDict([("sublevelName", sub), ("sessions", [])]))["sessions"]
+    while len(sessions) < sesn:
+        sessions.append(OrderedDict([("sessionNumber", len(sessions) + 1), ("words", [])]))
+    session_obj = sessions[sesn - 1]
+    word_obj = next((w for w in session_obj["words"] if w["word"] == word), None)
+    if not word_obj:
+        word_obj = OrderedDict([("word", word), ("repetitions", [])])
+        session_obj["words"].append(word_obj)
+    word_obj["repetitions"].extend(OrderedDict(r) for r in event["repetitions"])
+    reps = word_obj["repetitions"]
+    word_obj["individualAverage"] = OrderedDict([
+        ("pronunciationAccuracy", round(sum(r["pronunciationAccuracy"] for r in reps) / len(reps), 1)),
+        ("wordRepeatedCorrectly", any(r["pronunciationMatchesWord"] for r in reps)),
+    ])
+    words = session_obj["words"]
+    session_obj["sessionAverage"] = OrderedDict([
+        ("pronunciationAccuracy", round(sum(w["individualAverage"]["pronunciationAccuracy"] for w in words)
+                                        / len(words), 1)),
+        ("totalCorrectWords", sum(1 for w in words if w["individualAverage"]["wordRepeatedCorrectly"])),
+    ])
+
+
+def bench_materialize(repetitions, per_event, seed):
+    rng = random.Random(seed)
+    store = ReportStore(tempfile.mkdtemp(prefix='bench_aggregates_'), compact_bytes=10 ** 12)
+    rid = "grande"
+    store.create(rid, base_report(rid))
+    events = []
+    for i in range(0, repetitions, per_event):
+        events.append(OrderedDict([
+            ("level", "Level 1"), ("sublevel", "Abecedario"), ("sessionNumber", 1 + i // 5000),
+            ("word", WORDS[(i // per_event) % len(WORDS)]),
+            ("repetitions", [OrderedDict([
+                ("pronunciationAccuracy", random_accuracy(rng)),
+                ("containsPronunciationSound", True),
+                ("pronunciationMatchesWord", rng.random() < 0.4),
+            ]) for _ in range(per_event)]),
+        ]))
+    store.extend(rid, events)
+
+    def legacy():
+        report = load_json(store.path(rid), {})
+        for event in store.events(rid):
+            legacy_apply(report, event)
+        return report
+
+    results = {}
+    for name, fn in (('antes', legacy), ('agregados', lambda: store.load(rid))):
+        best = float('inf')
+        for _ in range(3):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        results[name] = best
+    # Mismo número de repeticiones, leído sin aplicar nada: el coste de parsear el diario
+    t0 = time.perf_counter()
+    for _ in store.events(rid):
+        pass
+    parse = time.perf_counter() - t0
+    print(f"materializar {repetitions} repeticiones en {len(events)} eventos: "
+          f"antes={results['antes'] * 1000:.1f} ms  agregados={results['agregados'] * 1000:.1f} ms  "
+          f"(sólo leer el diario: {parse * 1000:.1f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repetitions', type=int, default=20000)
+    parser.add_argument('--per-event', type=int, default=5, help='repeticiones por evento del diario')
+    args = parser.parse_args()
+
+    bench_materialize(args.repetitions, args.per_event, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Compara una sesión enviada como N peticiones a /analyze con una sola a /analyze/batch.
+
+    python -m benchmarks.bench_batch --items 12 --seconds 20 --delay 0.05
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+
+from benchmarks.fake_wit import FakeWitServer
+from benchmarks.synth import import_app, make_repetitions, wav_bytes
+
+SR = 44100
+
+
+def new_report(client):
+    return client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+
+
+def run_sequential(client, recordings):
+    rid = new_report(client)
+    t0 = time.perf_counter()
+    for i, audio in enumerate(recordings):
+        resp = client.post('/analyze', data={
+            'audio': (io.BytesIO(audio), f'{i}.wav'),
+            'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales',
+            'sessionNumber': '1', 'word': 'a',
+        }, content_type='multipart/form-data')
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    return time.perf_counter() - t0
+
+
+def run_batch(client, recordings, archive=False):
+    rid = new_report(client)
+    items = [{'word': 'a', 'file': f'{i}.wav'} for i in range(len(recordings))]
+    data = {'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales', 'sessionNumber': '1'}
+    if archive:
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as zf:
+            zf.writestr('manifest.json', json.dumps(items))
+            for i, audio in enumerate(recordings):
+                zf.writestr(f'sesion/{i}.wav', audio)
+        data['archive'] = (io.BytesIO(buf.getvalue()), 'sesion.zip')
+    else:
+        data['items'] = json.dumps(items)
+        data['audio'] = [(io.BytesIO(audio), f'{i}.wav') for i, audio in enumerate(recordings)]
+    t0 = time.perf_counter()
+    resp = client.post('/analyze/batch', data=data, content_type='multipart/form-data')
+    elapsed = time.perf_counter() - t0
+    body = resp.get_json()
+    assert resp.status_code == 200 and body['failed'] == 0, resp.get_data(as_text=True)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=12)
+    parser.add_argument('--seconds', type=float, default=20.0, help='duración de cada grabación')
+    parser.add_argument('--delay', type=float, default=0.05, help='latencia simulada de Wit.ai (s)')
+    args = parser.parse_args()
+
+    n_reps = max(1, int(args.seconds))  # una repetición de 0.5 s + 0.5 s de silencio por segundo
+    recordings = [wav_bytes(make_repetitions(n_reps, SR, seed=i, noise=0.001), SR) for i in range(args.items)]
+
+    with FakeWitServer(delay=args.delay) as wit:
+        os.environ['WIT_API_URL'] = wit.url
+        os.environ['ANALYSIS_CACHE_ENTRIES'] = '0'
+        client = import_app(tempfile.mkdtemp(prefix='bench_')).app.test_client()
+        # Calentamiento: JIT de librosa y arranque del pool de procesos
+        run_sequential(client, recordings[:1])
+        run_batch(client, recordings[:1])
+
+        sequential = run_sequential(client, recordings)
+        batched = run_batch(client, recordings)
+        archived = run_batch(client, recordings, archive=True)
+
+    print(f"{args.items} grabaciones de {args.seconds:.0f} s ({os.cpu_count()} núcleos)")
+    print(f"  /analyze x{args.items}:        {sequential:.2f} s")
+    print(f"  /analyze/batch (audio): {batched:.2f} s  ({sequential / batched:.1f}x)")
+    print(f"  /analyze/batch (zip):   {archived:.2f} s  ({sequential / archived:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
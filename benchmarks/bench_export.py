@@ -0,0 +1,120 @@
+"""Exportación masiva (/reports/export) sobre un corpus de reportes sintéticos.
+
+Crea `--reports` reportes (25 repeticiones cada uno, como en bench_reports) y
+compara:
+
+- `descargas`: lo que había que hacer antes, un GET /report/<id> por reporte
+  (tras listar /reports) y aplanar cada JSON en el cliente;
+- `/reports/export` en NDJSON, CSV y NDJSON con gzip, leyendo la respuesta en
+  streaming con el cliente de pruebas de Flask;
+- `flask export` (la misma función) escribiendo a un fichero.
+
+Para cada variante da el tiempo, las filas por segundo y los bytes; con
+`--memory` mide además el pico de memoria de Python (tracemalloc, más lento) de la
+exportación con la mitad y con todo el corpus, que debería ser el mismo.
+
+    python -m benchmarks.bench_export --reports 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+from benchmarks.bench_reports import make_reports
+from benchmarks.synth import import_app
+from report_export import EXPORT_FIELDS, export_chunks, export_rows
+
+
+def flatten(report):
+    """Lo que hacía el cliente con cada reporte descargado: una fila por repetición."""
+    rows = 0
+    levels = report["reports"]["games"]["expresatea"]["levels"]
+    for level_obj in levels.values():
+        for sub_obj in level_obj["sublevels"].values():
+            for session_obj in sub_obj["sessions"]:
+                for word_obj in session_obj["words"]:
+                    rows += len(word_obj["repetitions"])
+    return rows
+
+
+def by_download(client):
+    rows = size = 0
+    for item in client.get('/reports').get_json()['reports']:
+        resp = client.get(f"/report/{item['reportId']}")
+        size += len(resp.data)
+        rows += flatten(resp.get_json())
+    return rows, size
+
+
+def by_export(client, query, headers=None):
+    resp = client.get(f'/reports/export?{query}', headers=headers or {}, buffered=False)
+    assert resp.status_code == 200, resp.status_code
+    inflate = zlib.decompressobj(31) if resp.headers.get('Content-Encoding') == 'gzip' else None
+    size = lines = 0
+    for chunk in resp.response:
+        chunk = chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+        size += len(chunk)
+        lines += (inflate.decompress(chunk) if inflate else chunk).count(b'\n')
+    resp.close()
+    return lines - query.startswith('format=csv'), size
+
+
+def by_cli(app_module, path):
+    ids = app_module.reports_catalog.iter_ids()
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in export_chunks(export_rows(app_module.reports_store, ids), 'csv'):
+            f.write(chunk)
+    with open(path, 'rb') as f:
+        rows = sum(1 for _ in f) - 1
+    return rows, os.path.getsize(path)
+
+
+def export_peak(app_module, limit):
+    """Pico de memoria de Python al exportar en NDJSON los `limit` primeros reportes."""
+    ids = (pair for pair, _ in zip(app_module.reports_catalog.iter_ids(), range(limit)))
+    tracemalloc.start()
+    for _ in export_chunks(export_rows(app_module.reports_store, ids), 'ndjson'):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=10000)
+    parser.add_argument('--memory', action='store_true', help='medir también el pico de memoria')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_export_')
+    folder = os.path.join(workdir, 'results')
+    os.makedirs(folder)
+    make_reports(folder, args.reports)
+    os.environ.setdefault('ADMIN_ALLOW_LOCALHOST', '1')  # el cliente de pruebas llega desde 127.0.0.1
+    app_module = import_app(workdir)
+    app_module.reports_catalog.rebuild(folder)
+    client = app_module.app.test_client()
+    print(f"{args.reports} reportes, {len(EXPORT_FIELDS)} columnas por repetición")
+
+    for label, fn in [
+        ("descargas (/reports + /report/<id>)", lambda: by_download(client)),
+        ("/reports/export ndjson", lambda: by_export(client, 'format=ndjson')),
+        ("/reports/export csv", lambda: by_export(client, 'format=csv')),
+        ("/reports/export ndjson + gzip", lambda: by_export(client, 'format=ndjson', {'Accept-Encoding': 'gzip'})),
+        ("flask export --format csv", lambda: by_cli(app_module, os.path.join(workdir, 'export.csv'))),
+    ]:
+        t0 = time.perf_counter()
+        rows, size = fn()
+        elapsed = time.perf_counter() - t0
+        print(f"{label:<38}{elapsed:7.2f} s  {rows / elapsed:9.0f} filas/s  "
+              f"{size / 1e6:7.1f} MB  ({rows} filas)")
+
+    if args.memory:
+        for limit in (args.reports // 2, args.reports):
+            print(f"pico de memoria exportando {limit} reportes: {export_peak(app_module, limit) / 1e6:.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Tiempo por petición y pico de RSS de /analyze para grabaciones de distinta duración.
+
+Cada duración se mide en un subproceso aparte para que el pico de RSS sea el de esa
+petición. Para comparar con otra versión, se apunta --app-dir a un checkout de ella:
+
+    git worktree add /tmp/antes HEAD~1
+    python -m benchmarks.bench_pipeline --app-dir /tmp/antes
+    python -m benchmarks.bench_pipeline
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_wit import FakeWitServer
+from benchmarks.synth import ROOT, import_app, make_repetitions, wav_bytes
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _analyze(client, audio):
+    rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+    resp = client.post('/analyze', data={
+        'audio': (io.BytesIO(audio), 'bench.wav'),
+        'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales',
+        'sessionNumber': '1', 'word': 'a',
+    }, content_type='multipart/form-data')
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return resp
+
+
+def measure(wav_path, sr, app_dir, wit_delay):
+    """Mide una única petición con el WAV de `wav_path` (se ejecuta dentro del subproceso)."""
+    with FakeWitServer(delay=wit_delay) as wit:
+        os.environ['WIT_API_URL'] = wit.url
+        # Sin caché de análisis: cada pasada sube el mismo audio y se mediría la caché
+        os.environ['ANALYSIS_CACHE_ENTRIES'] = '0'
+        app_module = import_app(tempfile.mkdtemp(prefix='bench_'), app_dir)
+        client = app_module.app.test_client()
+        # Calentamiento con un clip corto: compila numba sin inflar el pico de RSS
+        _analyze(client, wav_bytes(make_repetitions(2, sr), sr))
+
+        with open(wav_path, 'rb') as f:
+            audio = f.read()
+        rss_before = _peak_rss_mb()
+        t0 = time.perf_counter()
+        _analyze(client, audio)
+        wall = time.perf_counter() - t0
+    return {
+        'wall_s': round(wall, 3),
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'rss_growth_mb': round(_peak_rss_mb() - rss_before, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--durations', default='10,60,300', help='duraciones en segundos')
+    parser.add_argument('--sr', type=int, default=44100, help='frecuencia de la grabación subida')
+    parser.add_argument('--app-dir', default=ROOT)
+    parser.add_argument('--wit-delay', type=float, default=0.0)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child, args.sr, os.path.abspath(args.app_dir), args.wit_delay)))
+        return
+
+    tmp = tempfile.mkdtemp(prefix='bench_audio_')
+    for seconds in (int(d) for d in args.durations.split(',')):
+        # La grabación se genera aquí para que no cuente en el RSS del subproceso
+        wav_path = os.path.join(tmp, f'{seconds}s.wav')
+        with open(wav_path, 'wb') as f:
+            f.write(wav_bytes(make_repetitions(seconds, args.sr), args.sr))
+        out = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_pipeline', '--child', wav_path,
+             '--sr', str(args.sr), '--app-dir', args.app_dir, '--wit-delay', str(args.wit_delay)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        row = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{seconds:>6d} s  wall={row['wall_s']:.3f} s  "
+              f"pico RSS={row['peak_rss_mb']:.1f} MB  (+{row['rss_growth_mb']:.1f} MB en la petición)")
+
+
+if __name__ == '__main__':
+    main()
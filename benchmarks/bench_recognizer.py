@@ -0,0 +1,64 @@
+"""Precisión y latencia por segmento del reconocedor local por plantillas.
+
+Genera plantillas de vocales sintéticas (varias voces por vocal), reconoce otras
+grabaciones sintéticas con distinta F0 y ruido, e informa de aciertos y latencia:
+
+    python -m benchmarks.bench_recognizer --templates-per-label 3 --queries 50
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks.synth import VOWEL_FORMANTS, make_vowel
+from recognizers import TemplateRecognizer
+
+
+def write_templates(folder, per_label, sr):
+    for vowel in VOWEL_FORMANTS:
+        os.makedirs(os.path.join(folder, vowel), exist_ok=True)
+        for i in range(per_label):
+            y = make_vowel(vowel, sr, dur_s=0.4 + 0.1 * i, f0=120 + 60 * i, seed=i)
+            sf.write(os.path.join(folder, vowel, f'{i}.wav'), y, sr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--templates-per-label', type=int, default=3)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--sr', type=int, default=16000)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='templates_')
+    write_templates(folder, args.templates_per_label, args.sr)
+    recognizer = TemplateRecognizer(folder, sr=args.sr)
+    recognizer.load()
+
+    rng = np.random.default_rng(1)
+    vowels = list(VOWEL_FORMANTS)
+    # Primera llamada aparte: incluye la compilación JIT de la DTW de librosa
+    recognizer.recognize(make_vowel('a', args.sr, seed=99), args.sr)
+
+    hits, times, confidences = 0, [], []
+    for q in range(args.queries):
+        vowel = vowels[q % len(vowels)]
+        y = make_vowel(vowel, args.sr, dur_s=rng.uniform(0.3, 0.9), f0=rng.uniform(100, 260),
+                       noise=rng.uniform(0.0, 0.02), seed=1000 + q)
+        t0 = time.perf_counter()
+        text, confidence = recognizer.recognize(y, args.sr)
+        times.append(time.perf_counter() - t0)
+        hits += text == vowel
+        confidences.append(confidence)
+
+    times_ms = np.array(times) * 1000
+    print(f"plantillas: {len(recognizer.templates())} ({len(vowels)} etiquetas)")
+    print(f"aciertos: {hits}/{args.queries}  confianza media: {np.mean(confidences):.2f}")
+    print(f"latencia por segmento: p50={np.percentile(times_ms, 50):.1f} ms  "
+          f"p95={np.percentile(times_ms, 95):.1f} ms  máx={times_ms.max():.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Listado de reportes (escaneo de todos los JSON frente al catálogo SQLite) y
+descarga de un reporte grande con GET /report/<id> (sin caché, en caché, 304 y gzip).
+
+    python -m benchmarks.bench_reports --reports 10000 --download-repetitions 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.synth import import_app
+from report_store import load_json, save_json
+
+PATIENTS = ['Ana López', 'Luis Pérez', 'Sofía Ramírez', 'Mateo Díaz', 'Valentina Cruz']
+
+
+def make_reports(folder, n, seed=0):
+    """Escribe `n` reportes sintéticos con algunas repeticiones cada uno."""
+    rng = random.Random(seed)
+    for i in range(n):
+        rid = f"2026{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}_120000_{i:08x}"
+        words = [{"word": w, "repetitions": [
+            {"pronunciationAccuracy": 75.0, "containsPronunciationSound": True, "pronunciationMatchesWord": True}
+        ] * 5, "individualAverage": {"pronunciationAccuracy": 75.0, "wordRepeatedCorrectly": True}}
+            for w in 'aeiou']
+        save_json(os.path.join(folder, f"report_{rid}.json"), {
+            "patientDetails": {"patientId": str(i % 500), "patientFullName": rng.choice(PATIENTS)},
+            "medicalDetails": {},
+            "reportDetails": {
+                "reportId": rid,
+                "reportCreated": f"{rid[6:8]}-{rid[4:6]}-{rid[:4]} 12:00",
+                "reportType": "game",
+                "reportStatus": rng.choice(["in_progress", "completed"]),
+                "comments": "", "recommendations": "",
+            },
+            "reports": {"games": {"expresatea": {"levels": {"Level 1": {"sublevels": {"Vocales": {
+                "sublevelName": "Subnivel 1: Vocales",
+                "sessions": [{"sessionNumber": 1, "words": words}],
+            }}}}}}},
+        })
+
+
+def make_large_report(app_module, repetitions, per_event=10):
+    """Crea un reporte con `repetitions` repeticiones anotadas en su diario."""
+    client = app_module.app.test_client()
+    rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+    events = []
+    for i in range(0, repetitions, per_event):
+        events.append({
+            "level": "Level 1", "sublevel": "Vocales", "sessionNumber": 1 + i // 1000, "word": 'aeiou'[i % 5],
+            "repetitions": [{"pronunciationAccuracy": 75.0 + j, "containsPronunciationSound": True,
+                             "pronunciationMatchesWord": True} for j in range(per_event)],
+        })
+    app_module.reports_store.extend(rid, events)
+    return rid
+
+
+def scan_all(folder):
+    """Listado como se hacía antes del catálogo: abrir y parsear cada JSON."""
+    reports = []
+    for filename in os.listdir(folder):
+        if filename.startswith('report_') and filename.endswith('.json'):
+            report = load_json(os.path.join(folder, filename), {})
+            if report:
+                reports.append({
+                    "reportId": filename[len('report_'):-len('.json')],
+                    "patientName": report.get("patientDetails", {}).get("patientFullName", ""),
+                    "created": report.get("reportDetails", {}).get("reportCreated", ""),
+                    "status": report.get("reportDetails", {}).get("reportStatus", ""),
+                })
+    return reports
+
+
+def timed(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=10000)
+    parser.add_argument('--download-repetitions', type=int, default=5000,
+                        help='repeticiones del reporte que se descarga (0: no medir la descarga)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_reports_')
+    folder = os.path.join(workdir, 'results')
+    os.makedirs(folder)
+    make_reports(folder, args.reports)
+
+    app_module = import_app(workdir)
+    client = app_module.app.test_client()
+
+    t, rows = timed(lambda: scan_all(folder), repeat=1)
+    label = f"escaneo de {args.reports} JSON"
+    print(f"{label:<42}{t * 1000:9.1f} ms ({len(rows)} filas)")
+    t, count = timed(lambda: app_module.reports_catalog.rebuild(folder), repeat=1)
+    print(f"{'rebuild-catalog':<42}{t * 1000:9.1f} ms ({count} filas)")
+    for label, url in [
+        ("/reports (todos)", "/reports"),
+        ("/reports?page=1&perPage=50", "/reports?page=1&perPage=50"),
+        ("/reports?status=completed&page=3", "/reports?status=completed&page=3"),
+        ("/reports?patient=sofía&from=2026-03-01", "/reports?patient=sof%C3%ADa&from=2026-03-01&to=2026-06-30&page=1"),
+    ]:
+        t, resp = timed(lambda: client.get(url))
+        print(f"{label:<42}{t * 1000:9.1f} ms (total={resp.get_json()['total']})")
+
+    if args.download_repetitions:
+        rid = make_large_report(app_module, args.download_repetitions)
+        url = f'/report/{rid}'
+        t0 = time.perf_counter()
+        resp = client.get(url)
+        t = time.perf_counter() - t0
+        etag = resp.headers.get('ETag')
+        print(f"{'/report (sin caché)':<42}{t * 1000:9.1f} ms ({len(resp.data)} bytes)")
+        for label, headers in [
+            ("/report (en caché)", {}),
+            ("/report (If-None-Match: 304)", {'If-None-Match': etag or ''}),
+            ("/report (Accept-Encoding: gzip)", {'Accept-Encoding': 'gzip'}),
+        ]:
+            t, resp = timed(lambda: client.get(url, headers=headers), repeat=20)
+            print(f"{label:<42}{t * 1000:9.1f} ms ({resp.status_code}, {len(resp.data)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Repuntuación masiva de reportes a partir de sus medidas guardadas.
+
+Crea reportes sintéticos con sus medidas en bruto (puntuados con una confianza
+distinta, como si los pesos hubieran cambiado) y mide /reports/rescore:
+
+    python -m benchmarks.bench_rescore --reports 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import OrderedDict
+
+from benchmarks.synth import import_app
+
+WORDS = ['a', 'e', 'i', 'o', 'u']
+HEARD = ['a', 'e', 'i', 'o', 'u', 'ah', 'eh', 'oh', '']
+
+
+def make_reports(app_module, n, reps_per_word=5, seed=0):
+    """Crea `n` reportes con una sesión de vocales y sus medidas, vía ReportStore."""
+    rng = random.Random(seed)
+    client = app_module.app.test_client()
+    for _ in range(n):
+        rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+        for word in WORDS:
+            rows, reps = [], []
+            for seg in range(reps_per_word):
+                text = rng.choice(HEARD)
+                confidence, jitter, shimmer = rng.random(), rng.random() * 0.02, rng.random() * 0.4
+                rows.append([seg, text, confidence, 180 + rng.random() * 60, jitter, shimmer, 0.5])
+                reps.append(OrderedDict([
+                    ("pronunciationAccuracy", app_module.calculate_pronunciation_accuracy(
+                        text, word, confidence * 0.9, jitter, shimmer, 'Vocales')),
+                    ("containsPronunciationSound", True),
+                    ("pronunciationMatchesWord", app_module.word_matches(text, word)),
+                ]))
+            app_module.reports_store.append(rid, OrderedDict([
+                ("level", "Level 1"), ("sublevel", "Vocales"), ("sessionNumber", 1),
+                ("word", word), ("repetitions", reps),
+            ]), measurements=app_module.measurement_entry("Level 1", "Vocales", 1, word, rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('ADMIN_ALLOW_LOCALHOST', '1')  # el cliente de pruebas llega desde 127.0.0.1
+    app_module = import_app(tempfile.mkdtemp(prefix='bench_rescore_'))
+    t0 = time.perf_counter()
+    make_reports(app_module, args.reports)
+    print(f"{args.reports} reportes creados en {time.perf_counter() - t0:.1f} s")
+
+    client = app_module.app.test_client()
+    for label in ('dryRun=1', '', ''):
+        t0 = time.perf_counter()
+        stats = client.post(f'/reports/rescore?{label}').get_json()
+        elapsed = time.perf_counter() - t0
+        print(f"  rescore {label or '(guardando)':12s} {elapsed:6.2f} s  "
+              f"repeticiones={stats['repetitionsRescored']} cambiadas={stats['repetitionsChanged']} "
+              f"reportes cambiados={stats['reportsChanged']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Arranque de un worker: tiempo de importar app.py y latencia de las primeras peticiones.
+
+Cada modo se mide en un proceso nuevo: `cold` importa la aplicación y atiende
+directamente las peticiones; `warm` llama antes a `app.warm_up()`, como hace el
+maestro de gunicorn con gunicorn.conf.py (los workers lo heredan por fork).
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --app-dir /tmp/antes   # otra versión
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_wit import FakeWitServer
+from benchmarks.synth import ROOT, import_app, make_repetitions, wav_bytes
+
+
+def _analyze(client, audio, seed):
+    rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+    t0 = time.perf_counter()
+    resp = client.post('/analyze', data={
+        'audio': (io.BytesIO(audio), f'bench_{seed}.wav'),
+        'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales',
+        'sessionNumber': '1', 'word': 'a',
+    }, content_type='multipart/form-data')
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return time.perf_counter() - t0
+
+
+def measure(mode, app_dir):
+    """Mide un arranque (se ejecuta dentro del subproceso)."""
+    os.environ['WARMUP_ON_START'] = '0'
+    row = {'mode': mode}
+    with FakeWitServer(delay=0.0) as wit:
+        os.environ['WIT_API_URL'] = wit.url
+        t0 = time.perf_counter()
+        app_module = import_app(tempfile.mkdtemp(prefix='bench_'), app_dir)
+        row['import_s'] = round(time.perf_counter() - t0, 3)
+        row['modules'] = len(sys.modules)
+
+        if mode == 'warm':
+            t0 = time.perf_counter()
+            app_module.warm_up()
+            row['warmup_s'] = round(time.perf_counter() - t0, 3)
+
+        client = app_module.app.test_client()
+        t0 = time.perf_counter()
+        assert client.get('/reports').status_code == 200
+        row['first_reports_s'] = round(time.perf_counter() - t0, 4)
+
+        # 44,1 kHz para que la primera subida también pase por el remuestreo;
+        # F0 distinta en cada una para no acertar en la caché de análisis
+        sr = 44100
+        row['first_analyze_s'] = round(_analyze(client, wav_bytes(make_repetitions(4, sr, f0=210.0), sr), 1), 3)
+        row['second_analyze_s'] = round(_analyze(client, wav_bytes(make_repetitions(4, sr, f0=230.0), sr), 2), 3)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='arranques por modo (se da la mediana)')
+    parser.add_argument('--app-dir', default=ROOT)
+    parser.add_argument('--out', help='fichero JSON con los resultados')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    app_dir = os.path.abspath(args.app_dir)
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child, app_dir)))
+        return
+
+    results = []
+    for mode in ('cold', 'warm'):
+        runs = []
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--child', mode,
+                                  '--app-dir', app_dir], cwd=ROOT, capture_output=True, text=True, check=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        row = {key: sorted(r[key] for r in runs)[len(runs) // 2] for key in runs[0] if key != 'mode'}
+        row['mode'] = mode
+        results.append(row)
+        print(f"{mode:<5s} import={row['import_s']:.3f} s  warm_up={row.get('warmup_s', 0):.3f} s  "
+              f"1.er /reports={row['first_reports_s'] * 1000:.1f} ms  "
+              f"1.er /analyze={row['first_analyze_s']:.3f} s  2.º /analyze={row['second_analyze_s']:.3f} s")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
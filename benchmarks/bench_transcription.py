@@ -0,0 +1,55 @@
+"""Compara /analyze con transcripción en serie y concurrente contra un Wit.ai falso.
+
+    python -m benchmarks.bench_transcription --repetitions 8 --delay 0.3
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.fake_wit import FakeWitServer
+from benchmarks.synth import import_app, make_repetitions, wav_bytes
+
+
+def run(app_module, audio, runs):
+    client = app_module.app.test_client()
+    times = []
+    for _ in range(runs):
+        rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+        t0 = time.perf_counter()
+        resp = client.post('/analyze', data={
+            'audio': (io.BytesIO(audio), 'bench.wav'),
+            'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales',
+            'sessionNumber': '1', 'word': 'a',
+        }, content_type='multipart/form-data')
+        times.append(time.perf_counter() - t0)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    return min(times), resp.get_json()['result']['validSegmentsProcessed']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repetitions', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.3, help='latencia simulada de Wit.ai (s)')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    with FakeWitServer(delay=args.delay) as wit:
+        os.environ['WIT_API_URL'] = wit.url
+        # Sin caché de análisis: cada pasada sube el mismo audio y se mediría la caché
+        os.environ['ANALYSIS_CACHE_ENTRIES'] = '0'
+        app_module = import_app(tempfile.mkdtemp(prefix='bench_'))
+        audio = wav_bytes(make_repetitions(args.repetitions), 16000)
+        # Primera pasada para no medir la compilación JIT de librosa/numba
+        run(app_module, audio, 1)
+
+        for cap in (1, app_module.WIT_MAX_CONCURRENCY_PER_REQUEST):
+            app_module.WIT_MAX_CONCURRENCY_PER_REQUEST = cap
+            best, segments = run(app_module, audio, args.runs)
+            print(f'concurrencia por petición={cap}: {best:.3f} s '
+                  f'({segments} segmentos, latencia Wit.ai {args.delay:.2f} s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Bytes subidos y latencia de /analyze según el formato en que llega el audio.
+
+Compara la misma grabación (44,1 kHz estéreo, como la que suele elegir el usuario)
+subida tal cual, como WAV mono a 16 kHz (lo que prepara el navegador, ver
+prepareUpload en static/script.js) y como ese WAV comprimido con gzip. El tiempo
+de subida se estima con el ancho de banda indicado (la wifi de la consulta); el
+de servidor es el de /analyze con el cliente de pruebas de Flask y un Wit.ai falso
+sin latencia, y `decode` la etapa de decodificación de su traza. La preparación en
+el navegador no se mide aquí.
+
+    python -m benchmarks.bench_upload --seconds 60 --mbps 5
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import soxr
+
+from benchmarks.fake_wit import FakeWitServer
+from benchmarks.synth import import_app, make_repetitions, wav_bytes
+
+SR = 44100
+
+
+def client_formats(y, sr, noise, seed):
+    """Las tres variantes de subida de una grabación mono `y` a `sr`."""
+    rng = np.random.default_rng(seed)
+    # Estéreo con canales ligeramente distintos, como un micrófono real
+    stereo = np.stack([y, y + noise * rng.standard_normal(len(y)).astype(np.float32)], axis=1)
+    original = wav_bytes(stereo, sr)
+    # Lo mismo que hace el navegador: mezcla a mono, remuestreo a 16 kHz y WAV de 16 bits
+    mono = soxr.resample(stereo.mean(axis=1), sr, 16000, quality='HQ')
+    canonical = wav_bytes(mono, 16000)
+    return [
+        ('original', original, 'sesion.wav'),
+        ('wav16k', canonical, 'sesion.wav'),
+        ('wav16k+gzip', gzip.compress(canonical, 6), 'sesion.wav.gz'),
+    ]
+
+
+def post(client, audio, filename):
+    rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+    log = io.StringIO()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        resp = client.post('/analyze', data={
+            'audio': (io.BytesIO(audio), filename),
+            'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales',
+            'sessionNumber': '1', 'word': 'a',
+        }, content_type='multipart/form-data')
+    elapsed = time.perf_counter() - t0
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    trace = next(json.loads(line) for line in log.getvalue().splitlines()
+                 if line.startswith('{') and '"event": "analysis"' in line)
+    return elapsed, trace['stages'].get('decode', 0.0), resp.get_json()['result']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=int, default=60, help='duración (una repetición por segundo)')
+    parser.add_argument('--noise', type=float, default=0.002)
+    parser.add_argument('--mbps', type=float, default=5.0, help='ancho de banda de subida (Mbit/s)')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['WARMUP_ON_START'] = '0'
+    y = make_repetitions(args.seconds, SR, noise=args.noise)
+    formats = client_formats(y, SR, args.noise, seed=1)
+    with FakeWitServer(delay=0.0) as wit:
+        os.environ['WIT_API_URL'] = wit.url
+        app_module = import_app(tempfile.mkdtemp(prefix='bench_upload_'))
+        client = app_module.app.test_client()
+        post(client, formats[0][1], formats[0][2])  # calentamiento: no se mide
+
+        baseline = None
+        for name, audio, filename in formats:
+            runs = [post(client, audio, filename) for _ in range(args.runs)]
+            server = float(np.median([r[0] for r in runs]))
+            decode = float(np.median([r[1] for r in runs]))
+            upload = len(audio) * 8 / (args.mbps * 1e6)
+            reps = len(runs[0][2]['repetitions'])
+            if baseline is None:
+                baseline = (len(audio), upload + server)
+            print(f"{name:<12s} {len(audio) / 1024:9.1f} kB ({len(audio) / baseline[0]:5.1%})  "
+                  f"subida={upload:6.2f} s  servidor={server:.3f} s (decode={decode * 1000:.1f} ms)  "
+                  f"total={upload + server:6.2f} s ({(upload + server) / baseline[1]:5.1%})  repeticiones={reps}")
+
+
+if __name__ == '__main__':
+    main()
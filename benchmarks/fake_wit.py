@@ -0,0 +1,103 @@
+"""Servidor local que imita el endpoint /speech de Wit.ai."""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeWitServer:
+    """Responde a cada POST tras `delay` segundos con un texto y una confianza fijos.
+
+    Para simular fallos, las primeras `fail_first` peticiones (y después una fracción
+    `fail_rate` al azar) responden `fail_status`. Cuenta las llamadas y las conexiones
+    TCP abiertas (HTTP/1.1 keep-alive).
+
+    Se usa como gestor de contexto y expone `url`, lista para asignarse a WIT_API_URL.
+    """
+
+    def __init__(self, delay=0.2, text='a', confidence=0.9, fail_first=0, fail_rate=0.0,
+                 fail_status=503, host='127.0.0.1', port=0, seed=0):
+        self.delay = delay
+        self.text = text
+        self.confidence = confidence
+        self.fail_first = fail_first
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.calls = 0
+        self.failures = 0
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.rfile.read(length)
+                with server._lock:
+                    server.calls += 1
+                    fail = server.calls <= server.fail_first or server._random.random() < server.fail_rate
+                    server.failures += fail
+                time.sleep(server.delay)
+                if fail:
+                    self.send_response(server.fail_status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps({
+                    'text': server.text,
+                    'speech': {'confidence': server.confidence},
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/speech?v=20201126'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.2)
+    parser.add_argument('--text', default='a')
+    args = parser.parse_args()
+    with FakeWitServer(delay=args.delay, text=args.text, port=args.port) as srv:
+        print(f'Fake Wit.ai escuchando en {srv.url}')
+        threading.Event().wait()
@@ -0,0 +1,153 @@
+"""Prueba de carga: latencia de las rutas ligeras con /analyze saturado, con y sin control de admisión.
+
+Arranca gunicorn (gunicorn.conf.py, un worker con `--threads` hilos) contra un
+Wit.ai falso y, durante `--duration` segundos, `--analyzers` clientes envían
+grabaciones a /analyze sin pausa mientras otro consulta `/`, `/reports` y `/start`
+cada 100 ms. Se repite con el control de admisión desactivado (`off`) y con la
+configuración por defecto (`on`), y se comparan la latencia p50/p99 de las rutas
+ligeras (un timeout cuenta como error) y el resultado de las subidas.
+
+    python -m benchmarks.load_admission --analyzers 8 --duration 30
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+from benchmarks.fake_wit import FakeWitServer
+from benchmarks.synth import ROOT, make_repetitions, wav_bytes
+
+MODES = {
+    'off': {'ADMISSION_MAX_CONCURRENT': '0', 'ADMISSION_MAX_AUDIO_SECONDS': '0'},
+    'on': {},
+}
+LIGHT_ROUTES = ('/', '/reports', '/start')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, threads, wit_url):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY='1', GUNICORN_THREADS=str(threads),
+               WIT_API_URL=wit_url, WARMUP_ON_START='1', PYTHONPATH=ROOT, **MODES[mode])
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), 'app:app'],
+        cwd=tempfile.mkdtemp(prefix='bench_load_'), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(600):
+        try:
+            requests.get(url + '/reports', timeout=1)
+            return proc, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('gunicorn no arrancó')
+
+
+def run(mode, args, audio):
+    with FakeWitServer(delay=args.wit_delay) as wit:
+        proc, url = start_server(mode, args.threads, wit.url)
+        try:
+            rid = requests.post(url + '/start', json={'patientDetails': {}, 'medicalDetails': {}}).json()['reportId']
+            stop = time.monotonic() + args.duration
+            light = {route: [] for route in LIGHT_ROUTES}
+            light_errors = 0
+            outcomes = {}
+            analyze_seconds = []
+            lock = threading.Lock()
+
+            def analyzer():
+                session = requests.Session()
+                while time.monotonic() < stop:
+                    t0 = time.perf_counter()
+                    try:
+                        resp = session.post(url + '/analyze', files={'audio': ('carga.wav', audio)}, data={
+                            'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales',
+                            'sessionNumber': '1', 'word': 'a',
+                        }, timeout=args.timeout * 10)
+                        status = resp.status_code
+                    except requests.RequestException:
+                        status = 'error'
+                    with lock:
+                        outcomes[status] = outcomes.get(status, 0) + 1
+                        if status == 200:
+                            analyze_seconds.append(time.perf_counter() - t0)
+                    if status == 503:
+                        time.sleep(float(resp.headers.get('Retry-After', 1)))
+
+            def prober():
+                nonlocal light_errors
+                session = requests.Session()
+                for i in range(10 ** 9):
+                    if time.monotonic() >= stop:
+                        return
+                    route = LIGHT_ROUTES[i % len(LIGHT_ROUTES)]
+                    t0 = time.perf_counter()
+                    try:
+                        if route == '/start':
+                            resp = session.post(url + route, json={'patientDetails': {}, 'medicalDetails': {}},
+                                                timeout=args.timeout)
+                        else:
+                            resp = session.get(url + route, timeout=args.timeout)
+                        ok = resp.status_code == 200
+                    except requests.RequestException:
+                        ok = False
+                    if ok:
+                        light[route].append(time.perf_counter() - t0)
+                    else:
+                        light_errors += 1
+                    time.sleep(0.1)
+
+            workers = [threading.Thread(target=analyzer) for _ in range(args.analyzers)]
+            workers.append(threading.Thread(target=prober))
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    samples = np.concatenate([np.asarray(v, dtype=float) for v in light.values()])
+    print(f"[{mode}] rutas ligeras: n={len(samples)} p50={np.percentile(samples, 50) * 1000:.1f} ms "
+          f"p99={np.percentile(samples, 99) * 1000:.1f} ms máx={samples.max() * 1000:.1f} ms "
+          f"errores/timeouts={light_errors}")
+    for route, values in light.items():
+        if values:
+            print(f"       {route:<9s} p50={np.percentile(values, 50) * 1000:7.1f} ms  "
+                  f"p99={np.percentile(values, 99) * 1000:7.1f} ms")
+    p50 = f"{np.percentile(analyze_seconds, 50):.2f} s" if analyze_seconds else '-'
+    print(f"       /analyze  respuestas={dict(sorted(outcomes.items(), key=str))} p50 (200)={p50}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--analyzers', type=int, default=8, help='clientes subiendo audio a la vez')
+    parser.add_argument('--seconds', type=int, default=30, help='duración de cada grabación')
+    parser.add_argument('--duration', type=float, default=30, help='segundos de carga por modo')
+    parser.add_argument('--threads', type=int, default=4, help='hilos del worker de gunicorn')
+    parser.add_argument('--wit-delay', type=float, default=0.3)
+    parser.add_argument('--timeout', type=float, default=5, help='timeout de las rutas ligeras (s)')
+    parser.add_argument('--modes', default='off,on')
+    args = parser.parse_args()
+
+    audio = wav_bytes(make_repetitions(args.seconds, 44100, noise=0.002), 44100)
+    for mode in args.modes.split(','):
+        run(mode, args, audio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Prueba de estrés: N llamadas concurrentes a /analyze sobre el mismo reporte.
+
+Reparte las llamadas entre varios procesos (como varios workers de gunicorn) y
+varios hilos por proceso, y comprueba que el reporte final contiene todas las
+repeticiones devueltas por /analyze, sin pérdidas.
+
+    python -m benchmarks.stress_analyze --calls 40 --processes 4
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_wit import FakeWitServer
+from benchmarks.synth import import_app, make_repetitions, wav_bytes
+
+WORDS = ['a', 'e', 'i', 'o', 'u']
+
+
+def _worker(args):
+    """Ejecuta `calls` peticiones /analyze con `threads` hilos; devuelve las repeticiones aceptadas."""
+    rid, calls, threads, audio, offset = args
+    import app
+    client = app.app.test_client()
+
+    def one(i):
+        resp = client.post('/analyze', data={
+            'audio': (io.BytesIO(audio), 'stress.wav'),
+            'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales',
+            'sessionNumber': str(1 + (offset + i) % 3), 'word': WORDS[(offset + i) % len(WORDS)],
+        }, content_type='multipart/form-data')
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+        return len(resp.get_json()['result']['repetitions'])
+
+    with ThreadPoolExecutor(threads) as pool:
+        return sum(pool.map(one, range(calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=40, help='llamadas a /analyze en total')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4, help='hilos por proceso')
+    parser.add_argument('--repetitions', type=int, default=3, help='repeticiones por grabación')
+    args = parser.parse_args()
+
+    # Se comprueba el diario, no el control de admisión: sin límite de análisis a la vez
+    os.environ['ADMISSION_MAX_CONCURRENT'] = '0'
+    os.environ['ADMISSION_MAX_AUDIO_SECONDS'] = '0'
+    with FakeWitServer(delay=0.05) as wit:
+        os.environ['WIT_API_URL'] = wit.url
+        # Sin caché de análisis: cada pasada sube el mismo audio y se mediría la caché
+        os.environ['ANALYSIS_CACHE_ENTRIES'] = '0'
+        app_module = import_app(tempfile.mkdtemp(prefix='stress_'))
+        # Un reporte pequeño compacta a menudo y ejercita también esa ruta
+        app_module.reports_store.compact_bytes = 4 * 1024
+        client = app_module.app.test_client()
+        rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+        audio = wav_bytes(make_repetitions(args.repetitions), 16000)
+
+        per_process = [args.calls // args.processes + (i < args.calls % args.processes)
+                       for i in range(args.processes)]
+        jobs = [(rid, n, args.threads, audio, sum(per_process[:i])) for i, n in enumerate(per_process)]
+        with multiprocessing.get_context('fork').Pool(args.processes) as pool:
+            accepted = sum(pool.map(_worker, jobs))
+
+        report = client.get(f'/report/{rid}').get_json()
+        stored = sum(
+            len(word['repetitions'])
+            for sub in report['reports']['games']['expresatea']['levels']['Level 1']['sublevels'].values()
+            for session in sub['sessions']
+            for word in session['words']
+        )
+
+    print(f'{args.calls} llamadas en {args.processes} procesos x {args.threads} hilos: '
+          f'{accepted} repeticiones devueltas, {stored} guardadas en el reporte')
+    if stored != accepted:
+        print('ERROR: se perdieron repeticiones')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
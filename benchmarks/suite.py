@@ -0,0 +1,264 @@
+"""Suite reproducible de benchmarks del flujo completo, con salida JSON comparable.
+
+Para cada combinación de duración, frecuencia de muestreo y nivel de ruido genera
+grabaciones sintéticas deterministas (repeticiones de un tono vocálico separadas por
+silencio), levanta un Wit.ai falso con la latencia y la tasa de fallos indicadas y
+recorre `/start`, `/analyze`, `/report/<id>` y `/reports` con el cliente de pruebas
+de Flask. Cada caso se ejecuta en un subproceso para que el pico de RSS sea sólo el
+suyo.
+
+Por endpoint se mide el rendimiento (peticiones/s), la latencia p50/p99 y el
+crecimiento del pico de RSS durante esa fase; por etapa del análisis (decode,
+features, transcribe, score...) la latencia p50/p99, a partir de las líneas JSON
+que escribe `metrics.Trace`.
+
+    python -m benchmarks.suite --out results_antes.json
+    python -m benchmarks.suite --out results_despues.json --compare results_antes.json
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fake_wit import FakeWitServer
+from benchmarks.synth import ROOT, import_app, make_repetitions, wav_bytes
+
+# Métricas que se comparan con --compare (más es peor salvo el rendimiento)
+COMPARED = ('p50_s', 'p99_s', 'rps', 'peak_rss_growth_mb')
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def summarize(samples):
+    """p50, p99, media y rendimiento de una lista de latencias en segundos."""
+    if not samples:
+        return {'count': 0}
+    a = np.asarray(samples, dtype=float)
+    return {
+        'count': len(a),
+        'p50_s': round(float(np.percentile(a, 50)), 4),
+        'p99_s': round(float(np.percentile(a, 99)), 4),
+        'mean_s': round(float(a.mean()), 4),
+        'rps': round(len(a) / a.sum(), 2) if a.sum() > 0 else None,
+    }
+
+
+class Phase:
+    """Latencias, errores y crecimiento del pico de RSS de un endpoint."""
+
+    def __init__(self):
+        self.samples = []
+        self.errors = 0
+        self.rss_growth = 0.0
+
+    @contextlib.contextmanager
+    def measure(self):
+        rss = _peak_rss_mb()
+        t0 = time.perf_counter()
+        yield
+        self.samples.append(time.perf_counter() - t0)
+        self.rss_growth = max(self.rss_growth, _peak_rss_mb() - rss)
+
+    def result(self):
+        out = summarize(self.samples)
+        out['errors'] = self.errors
+        out['peak_rss_growth_mb'] = round(self.rss_growth, 1)
+        return out
+
+
+def run_case(case, recordings, app_dir):
+    """Ejecuta un caso dentro del subproceso y devuelve su resultado."""
+    with FakeWitServer(delay=case['wit_delay'], fail_rate=case['wit_fail_rate'], seed=case['seed']) as wit:
+        os.environ['WIT_API_URL'] = wit.url
+        os.environ.pop('ANALYSIS_CACHE_DIR', None)
+        app_module = import_app(tempfile.mkdtemp(prefix='bench_suite_'), app_dir)
+        client = app_module.app.test_client()
+        phases = {name: Phase() for name in ('start', 'analyze', 'report', 'reports')}
+        stages = {}
+        log = io.StringIO()
+
+        # Calentamiento con un clip corto (numba, imports perezosos): no se mide
+        with contextlib.redirect_stdout(io.StringIO()):
+            rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+            client.post('/analyze', data={
+                'audio': (io.BytesIO(wav_bytes(make_repetitions(2, case['sr']), case['sr'])), 'warmup.wav'),
+                'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales', 'sessionNumber': '1', 'word': 'a',
+            }, content_type='multipart/form-data')
+        rss_start = _peak_rss_mb()
+
+        for session, path in enumerate(recordings, start=1):
+            with open(path, 'rb') as f:
+                audio = f.read()
+            with phases['start'].measure():
+                resp = client.post('/start', json={
+                    'patientDetails': {'patientId': str(session), 'patientFullName': f'Paciente {session}'},
+                    'medicalDetails': {},
+                })
+            if resp.status_code != 200:
+                phases['start'].errors += 1
+                continue
+            rid = resp.get_json()['reportId']
+
+            with contextlib.redirect_stdout(log), phases['analyze'].measure():
+                resp = client.post('/analyze', data={
+                    'audio': (io.BytesIO(audio), 'bench.wav'),
+                    'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales',
+                    'sessionNumber': '1', 'word': 'a',
+                }, content_type='multipart/form-data')
+            phases['analyze'].errors += resp.status_code != 200
+
+            with phases['report'].measure():
+                resp = client.get(f'/report/{rid}')
+            phases['report'].errors += resp.status_code != 200
+
+            with phases['reports'].measure():
+                resp = client.get('/reports')
+            phases['reports'].errors += resp.status_code != 200
+
+        wit_calls, wit_failures = wit.calls, wit.failures
+
+    # Desglose por etapa a partir de las trazas de /analyze
+    for line in log.getvalue().splitlines():
+        if not line.startswith('{'):
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if event.get('event') != 'analysis':
+            continue
+        for stage, seconds in itertools.chain(event['stages'].items(), event['segmentStages'].items()):
+            stages.setdefault(stage, []).append(seconds)
+
+    return {
+        'case': case,
+        'endpoints': {name: phase.result() for name, phase in phases.items()},
+        'stages': {stage: summarize(samples) for stage, samples in stages.items()},
+        'wit': {'calls': wit_calls, 'failures': wit_failures},
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'peak_rss_growth_mb': round(_peak_rss_mb() - rss_start, 1),
+    }
+
+
+def git_commit(app_dir):
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=app_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """Imprime los cambios relativos de cada métrica frente a un resultado anterior."""
+    def key(result):
+        c = result['case']
+        return (c['seconds'], c['sr'], c['noise'])
+
+    old = {key(r): r for r in baseline['results']}
+    print(f"\nComparación con {baseline.get('commit') or '?'} (positivo = más lento / más memoria):")
+    for result in current['results']:
+        before = old.get(key(result))
+        if before is None:
+            continue
+        c = result['case']
+        for group in ('endpoints', 'stages'):
+            for name, now in result[group].items():
+                prev = before[group].get(name, {})
+                for metric in COMPARED:
+                    if group == 'stages' and metric == 'rps':
+                        continue
+                    a, b = prev.get(metric), now.get(metric)
+                    if not a or b is None or (metric.endswith('_s') and max(a, b) < 0.001):
+                        continue
+                    change = (b - a) / a * 100
+                    if metric == 'rps':
+                        change = -change
+                    if abs(change) >= 10:
+                        print(f"  {c['seconds']}s {c['sr']}Hz ruido={c['noise']}  {group[:-1]} {name} "
+                              f"{metric}: {a} -> {b} ({change:+.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--durations', default='10,60', help='duraciones en segundos (una repetición por segundo)')
+    parser.add_argument('--sample-rates', default='16000,44100')
+    parser.add_argument('--noise', default='0,0.01', help='desviación del ruido gaussiano añadido')
+    parser.add_argument('--sessions', type=int, default=3, help='grabaciones (y reportes) por caso')
+    parser.add_argument('--wit-delay', type=float, default=0.05)
+    parser.add_argument('--wit-fail-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--app-dir', default=ROOT)
+    parser.add_argument('--out', help='fichero JSON con los resultados')
+    parser.add_argument('--compare', help='resultado JSON anterior con el que comparar')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    app_dir = os.path.abspath(args.app_dir)
+
+    if args.child is not None:
+        spec = json.loads(args.child)
+        result = run_case(spec['case'], spec['recordings'], app_dir)
+        print(json.dumps(result))
+        return
+
+    tmp = tempfile.mkdtemp(prefix='bench_suite_audio_')
+    results = []
+    for seconds, sr, noise in itertools.product(
+            (int(d) for d in args.durations.split(',')),
+            (int(s) for s in args.sample_rates.split(',')),
+            (float(n) for n in args.noise.split(','))):
+        case = {'seconds': seconds, 'sr': sr, 'noise': noise, 'sessions': args.sessions,
+                'wit_delay': args.wit_delay, 'wit_fail_rate': args.wit_fail_rate, 'seed': args.seed}
+        # Grabaciones distintas por sesión (F0 y ruido) para no acertar en la caché de análisis
+        recordings = []
+        for session in range(args.sessions):
+            path = os.path.join(tmp, f'{seconds}s_{sr}_{noise}_{session}.wav')
+            y = make_repetitions(seconds, sr, f0=200.0 + 5 * session, noise=noise, seed=args.seed + session)
+            with open(path, 'wb') as f:
+                f.write(wav_bytes(y, sr))
+            recordings.append(path)
+
+        out = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.suite', '--child',
+             json.dumps({'case': case, 'recordings': recordings}), '--app-dir', app_dir],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        results.append(result)
+
+        analyze = result['endpoints']['analyze']
+        print(f"{seconds:>5d} s {sr:>6d} Hz ruido={noise:<5g} /analyze p50={analyze.get('p50_s')} s "
+              f"p99={analyze.get('p99_s')} s errores={analyze['errors']}  pico RSS={result['peak_rss_mb']} MB")
+        for stage, s in result['stages'].items():
+            print(f"      {stage:<12s} p50={s['p50_s']:.4f} s  p99={s['p99_s']:.4f} s")
+
+    report = {
+        'commit': git_commit(app_dir),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados en {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
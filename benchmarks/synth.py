@@ -0,0 +1,66 @@
+"""Generación de grabaciones sintéticas deterministas para los benchmarks."""
+import io
+import os
+import sys
+
+import numpy as np
+import soundfile as sf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_repetitions(n=8, sr=16000, tone_s=0.5, gap_s=0.5, f0=220.0, noise=0.0, seed=0):
+    """Devuelve una señal con `n` repeticiones tonales separadas por silencio."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(tone_s * sr)) / sr
+    # Tono con armónicos, ligera modulación de F0 y envolvente suave (parecido a una vocal)
+    vibrato = 1.0 + 0.01 * np.sin(2 * np.pi * 5 * t)
+    phase = 2 * np.pi * np.cumsum(f0 * vibrato) / sr
+    tone = sum(np.sin(k * phase) / k for k in range(1, 5))
+    tone *= np.hanning(len(tone)) * 0.5
+    gap = np.zeros(int(gap_s * sr))
+    y = np.concatenate([gap] + [np.concatenate([tone, gap]) for _ in range(n)])
+    if noise:
+        y = y + noise * rng.standard_normal(len(y))
+    return y.astype(np.float32)
+
+
+# Formantes aproximados (Hz) de las vocales del español
+VOWEL_FORMANTS = {
+    'a': (800, 1200, 2500),
+    'e': (450, 1900, 2600),
+    'i': (300, 2300, 3000),
+    'o': (500, 900, 2400),
+    'u': (320, 800, 2300),
+}
+
+
+def make_vowel(vowel, sr=16000, dur_s=0.5, f0=180.0, noise=0.005, seed=0):
+    """Vocal sintética: armónicos de `f0` ponderados por resonancias en sus formantes."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(dur_s * sr)) / sr
+    f0 = f0 * (1.0 + 0.02 * rng.standard_normal())
+    phase = 2 * np.pi * np.cumsum(f0 * (1.0 + 0.01 * np.sin(2 * np.pi * 5 * t))) / sr
+    y = np.zeros_like(t)
+    for k in range(1, int(4000 / f0)):
+        gain = sum(1.0 / (1.0 + ((k * f0 - f) / 80.0) ** 2) for f in VOWEL_FORMANTS[vowel])
+        y += gain * np.sin(k * phase) / k
+    y *= np.hanning(len(y)) / (np.abs(y).max() + 1e-9) * 0.5
+    y += noise * rng.standard_normal(len(y))
+    return y.astype(np.float32)
+
+
+def wav_bytes(y, sr):
+    """Codifica la señal como WAV PCM de 16 bits en memoria."""
+    buf = io.BytesIO()
+    sf.write(buf, y, sr, format='WAV', subtype='PCM_16')
+    return buf.getvalue()
+
+
+def import_app(workdir, app_dir=ROOT):
+    """Importa app.py de `app_dir` trabajando en `workdir`, para no ensuciar uploads/ y results/."""
+    if app_dir not in sys.path:
+        sys.path.insert(0, app_dir)
+    os.chdir(workdir)
+    import app
+    return app
@@ -0,0 +1,183 @@
+"""Catálogo indexado de reportes (SQLite) para listar sin abrir cada JSON.
+
+Guarda por reportId los campos que muestra el listado. Lo mantienen al día
+/start, /analyze y /finalize, y se puede reconstruir desde los JSON en disco:
+
+    flask --app app rebuild-catalog
+"""
+import datetime
+import os
+import sqlite3
+from contextlib import closing
+
+from report_store import load_json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id       TEXT PRIMARY KEY,
+    patient_id      TEXT NOT NULL DEFAULT '',
+    patient_name    TEXT NOT NULL DEFAULT '',
+    report_created  TEXT NOT NULL DEFAULT '',
+    created_at      TEXT NOT NULL DEFAULT '',
+    report_status   TEXT NOT NULL DEFAULT '',
+    updated_at      TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at, report_id);
+CREATE INDEX IF NOT EXISTS idx_reports_status ON reports (report_status, created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_patient ON reports (patient_name COLLATE NOCASE);
+"""
+
+
+def _created_at(report_created):
+    """'dd-mm-YYYY HH:MM' (formato del reporte) -> 'YYYY-mm-dd HH:MM', ordenable como texto."""
+    try:
+        return datetime.datetime.strptime(report_created, '%d-%m-%Y %H:%M').strftime('%Y-%m-%d %H:%M')
+    except (TypeError, ValueError):
+        return ''
+
+
+def _now():
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ReportCatalog:
+    """Índice SQLite de reportes en `db_path`."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.is_new = not os.path.exists(db_path)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def upsert(self, report, conn=None):
+        """Inserta o actualiza la fila de un reporte a partir de su JSON."""
+        patient = report.get("patientDetails", {})
+        details = report.get("reportDetails", {})
+        row = (
+            details.get("reportId", ""),
+            str(patient.get("patientId", "")),
+            patient.get("patientFullName", ""),
+            details.get("reportCreated", ""),
+            _created_at(details.get("reportCreated", "")),
+            details.get("reportStatus", ""),
+            _now(),
+        )
+        sql = """
+            INSERT INTO reports (report_id, patient_id, patient_name, report_created,
+                                 created_at, report_status, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (report_id) DO UPDATE SET
+                patient_id = excluded.patient_id,
+                patient_name = excluded.patient_name,
+                report_created = excluded.report_created,
+                created_at = excluded.created_at,
+                report_status = excluded.report_status,
+                updated_at = excluded.updated_at
+        """
+        if conn is not None:
+            conn.execute(sql, row)
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.execute(sql, row)
+
+    def touch(self, rid):
+        """Marca el reporte como modificado ahora (p. ej. tras añadir repeticiones)."""
+        self.touch_many([rid])
+
+    def touch_many(self, rids):
+        """Como `touch`, para varios reportes en una sola transacción."""
+        now = _now()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("UPDATE reports SET updated_at = ? WHERE report_id = ?", ((now, rid) for rid in rids))
+
+    @staticmethod
+    def _filters(patient=None, status=None, date_from=None, date_to=None):
+        """Condiciones WHERE (lista) y sus parámetros para los filtros de `list`."""
+        where, params = [], []
+        if patient:
+            where.append("(patient_name LIKE ? COLLATE NOCASE OR patient_id = ?)")
+            params += [f"%{patient}%", patient]
+        if status:
+            where.append("report_status = ?")
+            params.append(status)
+        if date_from:
+            where.append("created_at >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("created_at < ?")
+            params.append(date_to + '~')  # incluye todo el día date_to
+        return where, params
+
+    def list(self, page=None, per_page=50, patient=None, status=None, date_from=None, date_to=None):
+        """Reportes filtrados, del más reciente al más antiguo. Devuelve (filas, total).
+
+        `patient` busca por nombre (subcadena, sin distinguir mayúsculas) o por patientId
+        exacto; `date_from`/`date_to` son fechas 'YYYY-mm-dd' inclusivas. Sin `page`
+        se devuelven todos.
+        """
+        where, params = self._filters(patient, status, date_from, date_to)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+        query = f"""
+            SELECT report_id, patient_name, report_created, report_status
+            FROM reports {clause}
+            ORDER BY created_at DESC, report_id DESC
+        """
+        query_params = list(params)
+        if page is not None:
+            query += " LIMIT ? OFFSET ?"
+            query_params += [per_page, (page - 1) * per_page]
+
+        with closing(self._connect()) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM reports {clause}", params).fetchone()[0]
+            rows = [
+                {"reportId": rid, "patientName": name, "created": created, "status": status}
+                for rid, name, created, status in conn.execute(query, query_params)
+            ]
+        return rows, total
+
+    def iter_ids(self, patient=None, status=None, date_from=None, date_to=None, batch=500):
+        """Genera `(reportId, created_at)` de los reportes filtrados como en `list`, en el mismo orden.
+
+        Lee de `batch` en `batch` filas, cada vez con una consulta nueva que sigue
+        donde acabó la anterior, para no tener abierta una lectura durante todo un
+        recorrido largo (una exportación) ni cargar todos los ids en memoria.
+        """
+        where, params = self._filters(patient, status, date_from, date_to)
+        after = None
+        while True:
+            conditions = list(where)
+            query_params = list(params)
+            if after is not None:
+                conditions.append("(created_at, report_id) < (?, ?)")
+                query_params += list(after)
+            clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            with closing(self._connect()) as conn:
+                rows = conn.execute(f"""
+                    SELECT report_id, created_at FROM reports {clause}
+                    ORDER BY created_at DESC, report_id DESC LIMIT ?
+                """, query_params + [batch]).fetchall()
+            for report_id, created_at in rows:
+                yield report_id, created_at
+            if len(rows) < batch:
+                return
+            after = (rows[-1][1], rows[-1][0])
+
+    def rebuild(self, folder):
+        """Vuelve a generar el catálogo leyendo todos los report_*.json de `folder`."""
+        count = 0
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM reports")
+            for filename in os.listdir(folder):
+                if filename.startswith('report_') and filename.endswith('.json'):
+                    report = load_json(os.path.join(folder, filename), {})
+                    if report:
+                        report.setdefault("reportDetails", {}).setdefault(
+                            "reportId", filename[len('report_'):-len('.json')])
+                        self.upsert(report, conn)
+                        count += 1
+        return count
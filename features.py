@@ -0,0 +1,276 @@
+"""Extracción de características acústicas para el análisis.
+
+`FeatureFrames` calcula una sola vez, para toda la subida, la energía por trama
+(RMS) y el espectrograma de magnitud (STFT), y entrega vistas de ambos para cada
+segmento. La segmentación, la F0, el jitter y el shimmer trabajan sobre esas
+vistas en lugar de volver a enmarcar la señal.
+
+Cada extractor de F0 recibe un `FeatureFrames` y devuelve un array con la F0 (Hz)
+de las tramas sonoras, en orden temporal.
+"""
+import itertools
+
+import numpy as np
+import librosa
+
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+
+# Contador global de STFT calculadas (para instrumentación)
+stft_counter = itertools.count(1)
+stft_total = 0
+
+
+def speech_frames(rms, top_db=20):
+    """Tramas a menos de `top_db` dB del máximo RMS: las que `librosa.effects.split` considera voz."""
+    return librosa.amplitude_to_db(rms, ref=np.max, top_db=None) > -top_db
+
+
+class FeatureFrames:
+    """Energía por trama y STFT de una señal, calculadas bajo demanda y una sola vez.
+
+    Las tramas están centradas (como en librosa): la trama `i` empieza en la
+    muestra `i * hop_length` de la señal rellenada con `frame_length // 2` ceros.
+    """
+
+    def __init__(self, y, sr, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, rms=None, magnitude=None):
+        self.y = y
+        self.sr = sr
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.stft_count = 0
+        self._rms = rms
+        self._magnitude = magnitude
+
+    @property
+    def rms(self):
+        """RMS por trama, shape (n_frames,)."""
+        if self._rms is None:
+            self._rms = librosa.feature.rms(
+                y=self.y, frame_length=self.frame_length, hop_length=self.hop_length
+            )[0]
+        return self._rms
+
+    @property
+    def magnitude(self):
+        """Espectrograma de magnitud, shape (1 + frame_length // 2, n_frames)."""
+        if self._magnitude is None:
+            global stft_total
+            self._magnitude = np.abs(librosa.stft(
+                self.y, n_fft=self.frame_length, hop_length=self.hop_length
+            ))
+            self.stft_count += 1
+            stft_total = next(stft_counter)
+        return self._magnitude
+
+    def speech(self, top_db=20):
+        """Máscara de las tramas de voz (las que caen dentro de los intervalos de `split`)."""
+        return speech_frames(self.rms, top_db)
+
+    def split(self, top_db=20):
+        """Equivalente a `librosa.effects.split(y, top_db, frame_length, hop_length)` reutilizando el RMS."""
+        non_silent = self.speech(top_db)
+
+        edges = [np.flatnonzero(np.diff(non_silent.astype(int))) + 1]
+        if non_silent[0]:
+            edges.insert(0, np.array([0]))
+        if non_silent[-1]:
+            edges.append(np.array([len(non_silent)]))
+
+        edges = librosa.frames_to_samples(np.concatenate(edges), hop_length=self.hop_length)
+        edges = np.minimum(edges, self.y.shape[-1])
+        return edges.reshape((-1, 2))
+
+    def segment(self, start, end):
+        """Vista del segmento [start, end) (muestras) con las mismas tramas que
+        `FeatureFrames(y[start:end])`, reutilizando las de la señal completa.
+
+        Las tramas interiores son las de la señal completa. Las de los bordes (las
+        que asoman `frame_length // 2` muestras fuera del segmento) verían ahí las
+        muestras vecinas, así que se recalculan con ceros, como al enmarcar el
+        segmento por separado: las medidas no dependen de lo que haya alrededor.
+        """
+        y_seg = self.y[start:end]
+        hop, half = self.hop_length, self.frame_length // 2
+        n_frames = 1 + len(y_seg) // hop
+        head = min(n_frames, -(-half // hop))
+        tail = max(head, (len(y_seg) - half) // hop + 1) if len(y_seg) >= half else n_frames
+        if start % hop or head == n_frames:
+            # Segmento no alineado con las tramas, o sin tramas interiores
+            return FeatureFrames(y_seg, self.sr, self.frame_length, hop)
+
+        first = start // hop
+        padded = np.pad(y_seg, half)
+        rms = [self._edge_rms(padded, 0, head), self.rms[first + head:first + tail],
+               self._edge_rms(padded, tail, n_frames)]
+        magnitude = [self._edge_magnitude(padded, 0, head), self.magnitude[:, first + head:first + tail],
+                     self._edge_magnitude(padded, tail, n_frames)]
+        return FeatureFrames(
+            y_seg, self.sr, self.frame_length, hop,
+            rms=np.concatenate(rms), magnitude=np.concatenate(magnitude, axis=1),
+        )
+
+    def _edge_rms(self, padded, i, j):
+        """RMS de las tramas [i, j) de un segmento ya rellenado con ceros."""
+        if j <= i:
+            return np.zeros(0, dtype=self.rms.dtype)
+        chunk = padded[i * self.hop_length:(j - 1) * self.hop_length + self.frame_length]
+        return librosa.feature.rms(y=chunk, frame_length=self.frame_length,
+                                   hop_length=self.hop_length, center=False)[0]
+
+    def _edge_magnitude(self, padded, i, j):
+        """Magnitud de la STFT de las tramas [i, j) de un segmento ya rellenado con ceros."""
+        if j <= i:
+            return np.zeros((1 + self.frame_length // 2, 0), dtype=self.magnitude.dtype)
+        chunk = padded[i * self.hop_length:(j - 1) * self.hop_length + self.frame_length]
+        return np.abs(librosa.stft(chunk, n_fft=self.frame_length, hop_length=self.hop_length, center=False))
+
+
+def f0_piptrack(frames):
+    """F0 con piptrack: en cada trama, el pitch del bin de mayor magnitud (tramas con pitch > 0)."""
+    pitches, magnitudes = librosa.piptrack(
+        S=frames.magnitude, sr=frames.sr, n_fft=frames.frame_length,
+        hop_length=frames.hop_length, threshold=0.1,
+    )
+    columns = np.arange(pitches.shape[1])
+    f0 = pitches[magnitudes.argmax(axis=0), columns]
+    return f0[f0 > 0]
+
+
+def autocorr_pitch(frames, fmin=65.0, fmax=1000.0, voicing_threshold=0.5, octave_ratio=0.9):
+    """F0 (Hz) y máscara de sonoridad de cada trama, por autocorrelación normalizada
+    (tipo YIN simplificado), vectorizada sobre todas las tramas.
+
+    La autocorrelación se obtiene del espectro de potencia de la STFT compartida y
+    se corrige por la autocorrelación de la ventana. El periodo es el primer máximo
+    local del rango [fmin, fmax] que llega a `octave_ratio` veces el máximo (los
+    múltiplos del periodo tienen picos casi igual de altos: quedarse con el mayor
+    daba errores de octava). Una trama se considera sonora si ese pico normalizado
+    supera `voicing_threshold`.
+    """
+    import scipy.fft  # aquí y no arriba: importar app (y las rutas sin audio) no lo necesita
+
+    sr, n_fft = frames.sr, frames.frame_length
+    min_lag = max(1, int(sr / fmax))
+    max_lag = min(n_fft // 2 - 2, int(sr / fmin))
+    if frames.magnitude.shape[1] == 0:
+        return np.zeros(0), np.zeros(0, dtype=bool)
+
+    acf = scipy.fft.irfft(frames.magnitude.T ** 2, n=n_fft, axis=1)[:, :max_lag + 2]
+    window = scipy.fft.irfft(np.abs(scipy.fft.rfft(librosa.filters.get_window('hann', n_fft))) ** 2)
+    acf = acf / (window[:max_lag + 2] / window[0])
+
+    energy = acf[:, 0]
+    span = acf[:, min_lag:max_lag + 1]
+    peaks = ((span >= acf[:, min_lag - 1:max_lag]) & (span > acf[:, min_lag + 1:max_lag + 2])
+             & (span >= octave_ratio * span.max(axis=1, keepdims=True)))
+    lag = np.where(peaks.any(axis=1), peaks.argmax(axis=1), span.argmax(axis=1)) + min_lag
+    rows = np.arange(len(lag))
+    peak = acf[rows, lag]
+    voiced = (energy > 0) & (peak > voicing_threshold * np.maximum(energy, 1e-12))
+
+    # Interpolación parabólica alrededor del pico para afinar el periodo
+    left, right = acf[rows, lag - 1], acf[rows, lag + 1]
+    denom = left - 2 * peak + right
+    shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / np.where(denom == 0, 1, denom), 0.0)
+    return sr / (lag + shift), voiced
+
+
+def f0_autocorr(frames, fmin=65.0, fmax=1000.0, voicing_threshold=0.5):
+    """F0 de las tramas sonoras según `autocorr_pitch`."""
+    f0, voiced = autocorr_pitch(frames, fmin, fmax, voicing_threshold)
+    return f0[voiced]
+
+
+F0_EXTRACTORS = {
+    'piptrack': f0_piptrack,
+    'autocorr': f0_autocorr,
+}
+
+
+def parse_f0_method(name):
+    """Valida el nombre de un extractor de F0 (una clave de F0_EXTRACTORS) y lo devuelve."""
+    method = (name or '').strip().lower()
+    if method not in F0_EXTRACTORS:
+        raise ValueError(f"Extractor de F0 desconocido: {name!r} (opciones: {', '.join(F0_EXTRACTORS)})")
+    return method
+
+
+def extract_f0(frames, method='piptrack'):
+    """Devuelve la F0 de las tramas sonoras de `frames` con el extractor `method`."""
+    try:
+        extractor = F0_EXTRACTORS[method]
+    except KeyError:
+        raise ValueError(f"Extractor de F0 desconocido: {method!r}") from None
+    return extractor(frames)
+
+
+def voice_metrics(frames, method='piptrack'):
+    """F0 media, jitter y shimmer de un segmento; `(None, None, None)` si no hay voz suficiente."""
+    # Extraer pitch/F0 de las tramas sonoras
+    pitch_values = extract_f0(frames, method)
+
+    if len(pitch_values) < 3:
+        return None, None, None
+
+    meanF0 = float(np.mean(pitch_values))
+
+    # Cálculo de jitter (variabilidad de período)
+    periods = 1.0 / pitch_values
+    period_diff = np.diff(periods)
+    jitter = float(np.std(period_diff) / np.mean(periods)) if len(period_diff) > 0 else 0.0
+
+    # Cálculo de shimmer (variabilidad de amplitud)
+    rms = frames.rms
+    if len(rms) > 1:
+        rms_diff = np.diff(rms)
+        shimmer = float(np.std(rms_diff) / np.mean(rms)) if np.mean(rms) > 0 else 0.0
+    else:
+        shimmer = 0.0
+
+    return meanF0, jitter, shimmer
+
+
+# Amplitud a partir de la cual una muestra se considera saturada
+CLIP_LEVEL = 0.99
+
+# Medidas de calidad que devuelve `segment_quality`, en orden
+QUALITY_FIELDS = ("duration", "voicedRatio", "snrDb", "clipping")
+
+
+def noise_floor(rms, speech=None):
+    """Nivel de ruido de fondo de una grabación: el percentil 10 del RMS de las tramas sin voz.
+
+    `speech` es la máscara de las tramas de voz (`speech_frames`); sin ella, todas
+    las tramas cuentan como fondo. Devuelve None si no queda ninguna trama fuera de
+    la voz (un clip ya recortado): no hay con qué comparar y el SNR no se mide.
+    """
+    quiet = rms if speech is None else rms[~speech]
+    if not len(quiet):
+        return None
+    return max(float(np.percentile(quiet, 10)), 1e-5)
+
+
+def segment_quality(frames, floor):
+    """Medidas baratas de un segmento para decidir si merece pasar por el reconocedor.
+
+    Devuelve una tupla con los campos de QUALITY_FIELDS:
+
+    - `duration`: segundos.
+    - `voicedRatio`: fracción de tramas sonoras según `autocorr_pitch`.
+    - `snrDb`: percentil 90 del RMS del segmento frente a `floor`, el ruido de fondo
+      de la grabación (`noise_floor`); None si `floor` es None.
+    - `clipping`: fracción de muestras saturadas (|y| >= CLIP_LEVEL).
+
+    Reutiliza el RMS y la STFT de `frames`, así que cuesta poco más que indexarlos.
+    """
+    _, voiced = autocorr_pitch(frames)
+    rms = frames.rms
+    level = float(np.percentile(rms, 90)) if len(rms) else 0.0
+    y = frames.y
+    return (
+        len(y) / frames.sr,
+        float(voiced.mean()) if len(voiced) else 0.0,
+        float(20.0 * np.log10(max(level, 1e-5) / floor)) if floor is not None else None,
+        float(np.count_nonzero(np.abs(y) >= CLIP_LEVEL)) / len(y) if len(y) else 0.0,
+    )
@@ -0,0 +1,25 @@
+"""Configuración de gunicorn (se lee sola al ejecutar `gunicorn app:app` desde aquí).
+
+Con `preload_app` el proceso maestro importa la aplicación y la calienta
+(`app.warm_up`) una sola vez antes de crear los workers; éstos la heredan por fork
+ya cargada y compilada, así que un worker nuevo o reiniciado responde a su primera
+subida sin pagar los imports de librosa ni la compilación de numba.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Hilos por worker (gthread): cada sesión de /analyze/live ocupa uno mientras dura
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = True
+
+
+def on_starting(server):
+    # Con preload_app, `app` ya está importado en el maestro; se calienta antes de
+    # instalar los manejadores de señales (ctypes lanza subprocesos que gunicorn
+    # confundiría con workers) y del primer fork. warm_up no deja hilos ni
+    # conexiones abiertas, así que es seguro hacer fork después.
+    import app
+    if app.WARMUP_ON_START:
+        app.warm_up()
@@ -0,0 +1,136 @@
+"""Trabajos de análisis asíncronos.
+
+Un `JobManager` ejecuta funciones en un pool local de hilos y guarda el estado de
+cada trabajo en `folder/{jobId}.json`. Como el estado vive en disco, cualquier
+worker de gunicorn puede responder a `/jobs/<id>`, no sólo el que lo lanzó.
+
+Estados: queued -> running -> done | failed. La función recibe un argumento
+`progress` (callable) para publicar el avance, y devuelve `(cuerpo, código HTTP)`,
+que se guardan como `result` y `httpStatus`.
+
+Cada trabajo anota el proceso que lo ejecuta (`owner`: host y pid). Si ese proceso
+muere (un worker reiniciado por gunicorn, un despliegue), el trabajo se queda sin
+terminar; al leerlo desde el mismo host se marca como `failed`. Un `JobManager`
+nuevo repasa además todos los trabajos al crearse.
+"""
+import datetime
+import os
+import socket
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from report_store import load_json, save_json
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='milliseconds')
+
+
+# Identifica a este proceso aunque otro anterior tuviera el mismo pid
+_PROCESS_TOKEN = uuid.uuid4().hex
+
+
+def _pid_alive(pid):
+    """Si existe un proceso con ese pid (en Windows no se puede saber: se supone que sí)."""
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    def __init__(self, folder, max_workers=2, ttl_seconds=24 * 3600):
+        self.folder = folder
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(folder, exist_ok=True)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self.recover()
+
+    def path(self, job_id):
+        return os.path.join(self.folder, f"{job_id}.json")
+
+    def get(self, job_id):
+        """Estado del trabajo, o None si no existe."""
+        if not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        job = load_json(self.path(job_id), None)
+        if job and job["status"] in ("queued", "running") and self._orphaned(job):
+            job.update(status="failed", httpStatus=500, result={
+                "error": "El proceso que ejecutaba el análisis terminó antes de acabarlo"})
+            self._write(job)
+        return job
+
+    def version(self, job_id):
+        """Marca de la última escritura del estado (None si no existe), sin leerlo."""
+        try:
+            stat = os.stat(self.path(job_id))
+        except (FileNotFoundError, ValueError):
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _orphaned(self, job):
+        """Si el proceso dueño del trabajo ya no existe (sólo se sabe en el mismo host)."""
+        owner = job.get("owner") or {}
+        if owner.get("host") != socket.gethostname() or not owner.get("pid"):
+            return False
+        if owner["pid"] == os.getpid():
+            return owner.get("process") != _PROCESS_TOKEN
+        return not _pid_alive(owner["pid"])
+
+    def recover(self):
+        """Marca como fallidos los trabajos sin terminar cuyo proceso ya no existe."""
+        for filename in os.listdir(self.folder):
+            if filename.endswith('.json'):
+                self.get(filename[:-len('.json')])
+
+    def _write(self, job):
+        job["updated"] = _now()
+        save_json(self.path(job["jobId"]), job)
+
+    def submit(self, fn, *args, **kwargs):
+        """Encola `fn(*args, progress=..., **kwargs)` y devuelve el ID del trabajo."""
+        self.prune()
+        job = {
+            "jobId": uuid.uuid4().hex,
+            "status": "queued",
+            "progress": {},
+            "created": _now(),
+            "owner": {"host": socket.gethostname(), "pid": os.getpid(), "process": _PROCESS_TOKEN},
+        }
+        self._write(job)
+        self.pool.submit(self._run, job, fn, args, kwargs)
+        return job["jobId"]
+
+    def _run(self, job, fn, args, kwargs):
+        job["status"] = "running"
+        self._write(job)
+
+        def progress(**fields):
+            job["progress"].update(fields)
+            self._write(job)
+
+        try:
+            body, status = fn(*args, progress=progress, **kwargs)
+            job.update(status="done" if status < 400 else "failed", result=body, httpStatus=status)
+        except Exception as e:
+            traceback.print_exc()
+            job.update(status="failed", result={"error": f"Error procesando audio: {e}"}, httpStatus=500)
+        self._write(job)
+
+    def prune(self):
+        """Borra los estados de trabajos con más de `ttl_seconds`."""
+        limit = time.time() - self.ttl_seconds
+        for filename in os.listdir(self.folder):
+            path = os.path.join(self.folder, filename)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,267 @@
+"""Métricas del análisis en formato de texto de Prometheus y trazas por petición.
+
+- `Counter` y `Histogram` con etiquetas, seguros entre hilos, registrados en
+  `REGISTRY`; `render()` produce el texto que sirve `/metrics`.
+- `Trace` mide las etapas de una petición (`with trace.span('decode'):`). Los
+  spans anidados descuentan el tiempo de sus hijos, así que la suma de etapas es
+  (casi) el tiempo total de la petición. Al terminar, cada etapa se observa en
+  `analysis_stage_seconds` y se escribe una línea JSON con el desglose. Lo que
+  ocurre por segmento en otros hilos (el ASR) se acumula aparte, en
+  `segmentStages`, porque esas llamadas se solapan.
+
+Las métricas son por proceso: con varios workers de gunicorn, Prometheus debe
+consultar cada uno (o sumarlas por instancia).
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Buckets (s) de los histogramas de latencia: de 1 ms a 2 min
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for name, value in zip(names, values))
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monótono con etiquetas."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, value, **labels):
+        """Fija el valor (para contadores que ya se llevan en otro objeto, p. ej. WitClient)."""
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def total(self):
+        """Suma de todas las series."""
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Gauge(Counter):
+    """Valor instantáneo con etiquetas."""
+
+    kind = 'gauge'
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas (buckets `le`, `_sum` y `_count`)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        # Primer bucket que contiene el valor (búsqueda lineal: son pocos)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        names = self.labelnames + ('le',)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                yield f"{self.name}_bucket{_labels(names, key + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(total, 6))}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, fn):
+        """Registra una función que actualiza métricas justo antes de cada `render()`."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        for fn in self._collectors:
+            fn()
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+_END = object()
+
+REGISTRY = Registry()
+
+request_seconds = REGISTRY.histogram(
+    'analysis_request_seconds', 'Duración de las peticiones de análisis', ('endpoint', 'status'))
+stage_seconds = REGISTRY.histogram(
+    'analysis_stage_seconds', 'Tiempo por etapa y petición (sin contar etapas anidadas)', ('stage',))
+segment_seconds = REGISTRY.histogram(
+    'analysis_segment_seconds', 'Tiempo por segmento de las etapas por segmento', ('stage',))
+segments_total = REGISTRY.counter(
+    'analysis_segments_total', 'Segmentos por resultado', ('outcome',))
+
+
+class Trace:
+    """Desglose de tiempos y contadores de una petición de análisis."""
+
+    def __init__(self, endpoint, **fields):
+        self.endpoint = endpoint
+        self.fields = OrderedDict(fields)
+        self.stages = OrderedDict()
+        self.segment_stages = OrderedDict()
+        self.counts = OrderedDict()
+        self.started = self._last = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _add(self, table, key, value):
+        with self._lock:
+            table[key] = table.get(key, 0) + value
+
+    def span(self, stage, per_segment=False):
+        """Context manager que mide `stage`; con `per_segment` también va al histograma por segmento."""
+        return _Span(self, stage, per_segment)
+
+    def iterate(self, iterable, stage):
+        """Recorre `iterable` midiendo como `stage` el tiempo de producir cada elemento."""
+        it = iter(iterable)
+        while True:
+            with self.span(stage):
+                item = next(it, _END)
+            if item is _END:
+                return
+            yield item
+
+    def gap(self, stage):
+        """Anota como `stage` el tiempo desde el último span (p. ej. la espera en cola)."""
+        now = time.perf_counter()
+        self._add(self.stages, stage, now - self._last)
+        self._last = now
+
+    def observe(self, stage, seconds):
+        """Tiempo de una etapa por segmento medida en otro hilo (p. ej. cada llamada al ASR)."""
+        segment_seconds.observe(seconds, stage=stage)
+        self._add(self.segment_stages, stage, seconds)
+
+    def count(self, outcome, value=1):
+        segments_total.inc(value, outcome=outcome)
+        self._add(self.counts, outcome, value)
+
+    def finish(self, status, **fields):
+        """Observa las etapas, registra la petición y escribe la línea JSON del desglose."""
+        elapsed = time.perf_counter() - self.started
+        request_seconds.observe(elapsed, endpoint=self.endpoint, status=status)
+        with self._lock:
+            stages = OrderedDict((k, round(v, 4)) for k, v in self.stages.items())
+            segment_stages = OrderedDict((k, round(v, 4)) for k, v in self.segment_stages.items())
+            counts = OrderedDict(self.counts)
+        for stage, seconds in stages.items():
+            stage_seconds.observe(seconds, stage=stage)
+        self.fields.update(fields)
+        print(json.dumps(OrderedDict([
+            ("event", "analysis"),
+            ("endpoint", self.endpoint),
+            ("status", status),
+            ("seconds", round(elapsed, 4)),
+            *self.fields.items(),
+            ("stages", stages),
+            ("segmentStages", segment_stages),
+            ("segments", counts),
+        ]), ensure_ascii=False), flush=True)
+        return elapsed
+
+
+class _Span:
+    """Mide una etapa; el tiempo de los spans anidados (del mismo hilo) se descuenta."""
+
+    __slots__ = ('trace', 'stage', 'per_segment', 'start', 'children')
+
+    def __init__(self, trace, stage, per_segment=False):
+        self.trace = trace
+        self.stage = stage
+        self.per_segment = per_segment
+
+    def __enter__(self):
+        stack = getattr(self.trace._local, 'stack', None)
+        if stack is None:
+            stack = self.trace._local.stack = []
+        stack.append(self)
+        self.children = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.trace._local.stack
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        else:
+            self.trace._last = self.start + elapsed
+        self.trace._add(self.trace.stages, self.stage, elapsed - self.children)
+        if self.per_segment:
+            segment_seconds.observe(elapsed, stage=self.stage)
+        return False
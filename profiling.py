@@ -0,0 +1,95 @@
+"""Perfilado bajo demanda de peticiones concretas con cProfile.
+
+Una petición se perfila si el perfilado está activo y trae la cabecera
+`X-Profile`, o si le toca por muestreo (una de cada N). El perfil (formato pstats,
+legible con `python -m pstats` o snakeviz) se guarda en un anillo acotado en
+disco: al superar `max_files` se borran los más antiguos.
+
+cProfile sólo ve el hilo de la petición: decodificación, segmentación, métricas
+acústicas y puntuación sí, pero las llamadas al ASR (en el pool de hilos) aparecen
+como espera.
+"""
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import re
+import threading
+import time
+
+# Nombre de un perfil: <fecha>_<hora>_<microsegundos>_<endpoint>_<reportId>.prof
+PROFILE_NAME = re.compile(r'^[0-9]{8}_[0-9]{6}_[0-9]{6}_[A-Za-z0-9_-]+\.prof$')
+
+
+class ProfileRing:
+    """Perfiles en `folder`, como mucho `max_files` (se descartan los más antiguos)."""
+
+    def __init__(self, folder, max_files=50, sample_every=0):
+        self.folder = folder
+        self.max_files = max_files
+        self.sample_every = sample_every
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def sampled(self):
+        """True para una de cada `sample_every` peticiones (nunca si es 0)."""
+        return bool(self.sample_every) and next(self._counter) % self.sample_every == 0
+
+    def path(self, name):
+        if not PROFILE_NAME.match(name):
+            return None
+        return os.path.join(self.folder, name)
+
+    def run(self, fn, endpoint, key):
+        """Ejecuta `fn()` bajo cProfile y guarda el perfil. Devuelve `(resultado, nombre)`."""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Otro perfilador activo en este hilo: se ejecuta sin perfilar
+            return fn(), None
+        try:
+            result = fn()
+        finally:
+            profiler.disable()
+        stamp = time.strftime('%Y%m%d_%H%M%S') + f"_{int(time.time() * 1e6) % 1000000:06d}"
+        safe_key = re.sub(r'[^A-Za-z0-9-]', '-', key or 'none')[:64]
+        name = f"{stamp}_{endpoint}_{safe_key}.prof"
+        os.makedirs(self.folder, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.folder, name))
+        self._trim()
+        return result, name
+
+    def _trim(self):
+        with self._lock:
+            names = sorted(n for n in os.listdir(self.folder) if PROFILE_NAME.match(n))
+            for name in names[:max(0, len(names) - self.max_files)]:
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except FileNotFoundError:
+                    pass  # otro proceso lo borró antes
+
+    def list(self):
+        """Perfiles guardados, del más reciente al más antiguo."""
+        if not os.path.isdir(self.folder):
+            return []
+        profiles = []
+        for name in sorted((n for n in os.listdir(self.folder) if PROFILE_NAME.match(n)), reverse=True):
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                continue
+            profiles.append({
+                "name": name,
+                "bytes": stat.st_size,
+                "created": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(stat.st_mtime)),
+            })
+        return profiles
+
+    def summary(self, name, sort='cumulative', limit=60):
+        """Resumen de texto del perfil, como `pstats` ordenado por `sort`."""
+        out = io.StringIO()
+        stats = pstats.Stats(self.path(name), stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
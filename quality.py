@@ -0,0 +1,80 @@
+"""Filtro de calidad de los segmentos antes del reconocimiento de voz.
+
+Cada segmento de más de 0,3 s se enviaba al reconocedor aunque después el análisis
+acústico lo descartase por no tener F0 suficiente: ruidos, golpes, respiraciones o
+audio saturado costaban una llamada a Wit.ai y cuota de la API. `QualityGate` decide
+con las medidas de `features.segment_quality` (y la F0 ya calculada) si un segmento
+se reconoce o se descarta, y con qué motivo.
+
+Los umbrales se configuran por subnivel con una cadena `clave=valor` separada por
+comas, p. ej. `QUALITY_GATE_ABECEDARIO="min_voiced=0.15,max_seconds=4"`. Por
+defecto sólo se aplican las comprobaciones que ya decidían qué segmentos se
+puntúan (duración mínima y F0): el filtro ahorra llamadas sin cambiar resultados.
+"""
+from collections import OrderedDict
+
+from features import QUALITY_FIELDS
+
+# Umbrales por defecto; None es una comprobación desactivada. Valores de partida
+# para activarlas: max_seconds=10, min_voiced=0.2, min_snr_db=6, max_clipping=0.01
+DEFAULTS = OrderedDict([
+    ("min_seconds", 0.3),    # duración mínima (s), la que ya se exigía para puntuar
+    ("max_seconds", None),   # duración máxima (s)
+    ("min_voiced", None),    # fracción mínima de tramas sonoras
+    ("min_snr_db", None),    # nivel del segmento sobre el ruido de fondo (dB)
+    ("max_clipping", None),  # fracción máxima de muestras saturadas
+])
+
+
+class QualityGate:
+    """Umbrales de calidad de un subnivel (ver DEFAULTS)."""
+
+    def __init__(self, **thresholds):
+        unknown = set(thresholds) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Umbrales de calidad desconocidos: {', '.join(sorted(unknown))}")
+        self.thresholds = OrderedDict()
+        for key, default in DEFAULTS.items():
+            value = thresholds.get(key, default)
+            self.thresholds[key] = None if value is None else float(value)
+
+    @classmethod
+    def parse(cls, spec):
+        """Crea el filtro a partir de `"min_voiced=0.3,max_seconds=5"` (vacío: por defecto)."""
+        thresholds = {}
+        for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise ValueError(f"Umbral de calidad sin valor: {item!r}")
+            thresholds[key.strip()] = float(value)
+        return cls(**thresholds)
+
+    def reject_reason(self, quality, meanF0=None):
+        """Motivo para descartar el segmento, o None si debe reconocerse.
+
+        `quality` es la tupla de `features.segment_quality` y `meanF0` la F0 media del
+        análisis acústico (None si no encontró pitch suficiente). Los umbrales a None
+        no se comprueban, ni el SNR cuando no se pudo medir (`snrDb` None).
+        """
+        duration, voiced, snr_db, clipping = quality
+        t = self.thresholds
+        if t["min_seconds"] is not None and duration < t["min_seconds"]:
+            return "too_short"
+        if t["max_seconds"] is not None and duration > t["max_seconds"]:
+            return "too_long"
+        if t["max_clipping"] is not None and clipping > t["max_clipping"]:
+            return "clipped"
+        if t["min_voiced"] is not None and voiced < t["min_voiced"]:
+            return "unvoiced"
+        if t["min_snr_db"] is not None and snr_db is not None and snr_db < t["min_snr_db"]:
+            return "low_snr"
+        if meanF0 is None:
+            return "no_pitch"
+        return None
+
+
+def rejection(idx, reason, quality):
+    """Entrada de `rejectedSegments` en la respuesta de /analyze."""
+    return OrderedDict([("segment", idx + 1), ("reason", reason)] +
+                       [(name, None if value is None else round(value, 3))
+                        for name, value in zip(QUALITY_FIELDS, quality)])
@@ -0,0 +1,171 @@
+"""Reconocedores de voz intercambiables para puntuar cada segmento.
+
+Todos cumplen el mismo contrato: `recognize(y, sr)` recibe la señal de un segmento
+y devuelve `(texto, confianza)` con la confianza en [0, 1], o lanza
+`TranscriptionError` si no puede dar una respuesta (el segmento no se puntúa).
+`cache_params()` devuelve lo que identifica al reconocedor en la caché por contenido
+y `remote` indica si cada llamada sale a la red (y consume cuota).
+
+- `WitRecognizer`: envía el segmento a Wit.ai con una API key.
+- `TemplateRecognizer`: local y sin red. Compara los MFCC del segmento con
+  plantillas grabadas del vocabulario cerrado (vocales, consonantes, sílabas) por
+  DTW y devuelve la etiqueta de la plantilla más cercana.
+"""
+import hashlib
+import io
+import os
+import threading
+
+import numpy as np
+import librosa
+import soundfile as sf
+
+from wit_client import TranscriptionError
+
+
+def encode_wav(y, sr):
+    """Codifica una señal como WAV PCM de 16 bits en memoria para enviarla al ASR."""
+    buf = io.BytesIO()
+    sf.write(buf, y, sr, format='WAV', subtype='PCM_16')
+    return buf.getvalue()
+
+
+class WitRecognizer:
+    """Transcripción remota con Wit.ai (una API key por vocabulario)."""
+
+    name = 'wit'
+    remote = True
+
+    def __init__(self, client, api_key):
+        self.client = client
+        self.api_key = api_key
+
+    def cache_params(self):
+        return {'url': self.client.url, 'api_key': self.api_key}
+
+    def recognize(self, y, sr):
+        data = self.client.speech(encode_wav(y, sr), self.api_key)
+
+        text = data.get('text', '').strip()
+
+        # Extraer confianza del speech
+        confidence = 0.0
+        if 'speech' in data and 'confidence' in data['speech']:
+            confidence = data['speech']['confidence']
+        elif 'intents' in data and len(data['intents']) > 0:
+            confidence = data['intents'][0].get('confidence', 0.0)
+
+        return text, confidence
+
+
+class TemplateRecognizer:
+    """Reconocimiento local por plantillas: MFCC + DTW al vecino más cercano.
+
+    Las plantillas son WAV en `folder/<etiqueta>/*.wav`; la etiqueta (p. ej. `a`,
+    `efe` o `ba`) es el texto que se devuelve. La confianza es la probabilidad de la
+    etiqueta ganadora en un softmax de las distancias DTW por etiqueta con
+    temperatura `temperature`; si la mejor distancia supera `max_distance` el
+    segmento no se parece a ninguna plantilla y se devuelve `('', 0.0)`.
+    """
+
+    name = 'templates'
+    remote = False
+
+    def __init__(self, folder, sr=16000, n_mfcc=13, temperature=0.02, max_distance=0.6):
+        self.folder = folder
+        self.sr = sr
+        self.n_mfcc = n_mfcc
+        self.temperature = temperature
+        self.max_distance = max_distance
+        # Ventanas de 25 ms cada 10 ms, las habituales en reconocimiento de voz
+        self.n_fft = int(0.025 * sr)
+        self.hop_length = int(0.010 * sr)
+        self._templates = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    def mfcc(self, y, sr):
+        """MFCC normalizados por segmento (sin c0) con forma (tramas, coeficientes)."""
+        if sr != self.sr:
+            y = librosa.resample(y, orig_sr=sr, target_sr=self.sr)
+        m = librosa.feature.mfcc(y=y, sr=self.sr, n_mfcc=self.n_mfcc + 1,
+                                 n_fft=self.n_fft, hop_length=self.hop_length)[1:]
+        m = (m - m.mean(axis=1, keepdims=True)) / (m.std(axis=1, keepdims=True) + 1e-8)
+        return np.ascontiguousarray(m.T)
+
+    def _files(self):
+        if not os.path.isdir(self.folder):
+            return []
+        files = []
+        for label in sorted(os.listdir(self.folder)):
+            label_dir = os.path.join(self.folder, label)
+            if not os.path.isdir(label_dir):
+                continue
+            for name in sorted(os.listdir(label_dir)):
+                if name.lower().endswith('.wav'):
+                    files.append((label, os.path.join(label_dir, name)))
+        return files
+
+    def load(self):
+        """Lee (o relee) las plantillas. Devuelve el número de plantillas cargadas."""
+        templates = []
+        digest = hashlib.sha256()
+        for label, path in self._files():
+            y, sr = sf.read(path, dtype='float32', always_2d=True)
+            y = y.mean(axis=1)
+            templates.append((label, self.mfcc(y, sr)))
+            stat = os.stat(path)
+            digest.update(f"{label}/{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+        self._fingerprint = digest.hexdigest()[:16]
+        self._templates = templates
+        print(f"Plantillas de reconocimiento cargadas: {len(templates)} desde {self.folder}")
+        return len(templates)
+
+    def templates(self):
+        if self._templates is None:
+            with self._lock:
+                if self._templates is None:
+                    self.load()
+        return self._templates
+
+    @property
+    def labels(self):
+        return sorted({label for label, _ in self.templates()})
+
+    def cache_params(self):
+        self.templates()
+        return {'backend': self.name, 'templates': self._fingerprint,
+                'n_mfcc': self.n_mfcc, 'template_sr': self.sr}
+
+    def distance(self, a, b):
+        """Coste DTW medio por paso entre dos secuencias de MFCC (distancia coseno)."""
+        cost = 1.0 - (a / (np.linalg.norm(a, axis=1, keepdims=True) + 1e-8)) @ \
+                     (b / (np.linalg.norm(b, axis=1, keepdims=True) + 1e-8)).T
+        D = librosa.sequence.dtw(C=cost, backtrack=False)
+        return D[-1, -1] / (len(a) + len(b))
+
+    def recognize(self, y, sr):
+        templates = self.templates()
+        if not templates:
+            raise TranscriptionError(f"No hay plantillas de reconocimiento en {self.folder}")
+
+        query = self.mfcc(np.asarray(y, dtype=np.float32), sr)
+        if len(query) < 2:
+            return '', 0.0
+
+        # Mejor distancia de cada etiqueta
+        best = {}
+        for label, template in templates:
+            d = self.distance(query, template)
+            if d < best.get(label, np.inf):
+                best[label] = d
+
+        labels = list(best)
+        distances = np.array([best[label] for label in labels])
+        winner = int(np.argmin(distances))
+        if distances[winner] > self.max_distance:
+            return '', 0.0
+
+        weights = np.exp(-(distances - distances[winner]) / self.temperature)
+        confidence = float(weights[winner] / weights.sum())
+        return labels[winner], round(confidence, 4)
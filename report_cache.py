@@ -0,0 +1,71 @@
+"""Caché en memoria de los reportes ya serializados que sirve GET /report/<id>.
+
+Materializar un reporte (JSON base más diario) y serializarlo con `indent=2` cuesta
+más cuantas más repeticiones tiene, y se repetía en cada descarga. Cada entrada
+guarda el JSON en bytes, su versión gzip (si es grande) y el ETag, junto con la
+versión de los ficheros del reporte de la que salió (`ReportStore.version`): si
+el reporte cambia (una repetición nueva, una repuntuación, la finalización),
+aunque sea en otro worker de gunicorn, la versión deja de coincidir y la entrada se
+vuelve a generar.
+"""
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+class RenderedReport:
+    """Un reporte serializado: `body` (JSON en UTF-8), `gzipped` (o None) y `etag`."""
+
+    __slots__ = ('version', 'etag', 'body', 'gzipped')
+
+    def __init__(self, version, report, gzip_min_bytes=1024):
+        self.version = version
+        # El ETag sólo depende de la versión, así que coincide en todos los workers
+        self.etag = hashlib.sha1(version.encode('utf-8')).hexdigest()[:20]
+        self.body = json.dumps(report, indent=2, ensure_ascii=False, sort_keys=False).encode('utf-8')
+        self.gzipped = gzip.compress(self.body, 6) if len(self.body) >= gzip_min_bytes else None
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.gzipped or b'')
+
+
+class ReportRenderCache:
+    """LRU de reportes serializados por id, acotado por bytes."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, gzip_min_bytes=1024):
+        self.max_bytes = max_bytes
+        self.gzip_min_bytes = gzip_min_bytes
+        self._entries = OrderedDict()  # rid -> RenderedReport
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, rid, version):
+        """Reporte serializado de `rid` si está en caché y su versión es `version`."""
+        with self._lock:
+            entry = self._entries.get(rid)
+            if entry is None or entry.version != version:
+                return None
+            self._entries.move_to_end(rid)
+            return entry
+
+    def put(self, rid, version, report):
+        """Serializa `report` (la versión `version` de `rid`), lo guarda y lo devuelve."""
+        entry = RenderedReport(version, report, self.gzip_min_bytes)
+        with self._lock:
+            old = self._entries.pop(rid, None)
+            if old is not None:
+                self._bytes -= old.size
+            if entry.size <= self.max_bytes:
+                self._entries[rid] = entry
+                self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
@@ -0,0 +1,129 @@
+"""Exportación masiva de las repeticiones de los reportes (NDJSON o CSV) para análisis.
+
+Recorre los reportes que da el catálogo (`ReportCatalog.iter_ids`, con los mismos
+filtros que /reports) de uno en uno: materializa cada reporte bajo su cerrojo, lo
+aplana en filas, una por repetición, y lo suelta antes de pasar al siguiente. Todo
+son generadores, así que la memoria depende del reporte más grande y no de
+cuántos se exportan, y la salida sale en trozos de unos `chunk_bytes` bytes.
+
+La hora de cada repetición (`recordedAt`) sale del archivo de medidas del reporte;
+va vacía en las repeticiones anotadas antes de que se guardaran medidas.
+"""
+import csv
+import io
+import json
+import zlib
+from collections import OrderedDict
+
+# Columnas de cada fila exportada, una fila por repetición
+EXPORT_FIELDS = (
+    "reportId", "patientId", "reportCreated", "reportStatus", "level", "sublevel",
+    "sessionNumber", "word", "repetition", "pronunciationAccuracy",
+    "pronunciationMatchesWord", "containsPronunciationSound", "recordedAt",
+)
+
+# Formatos de exportación y su tipo MIME
+EXPORT_FORMATS = OrderedDict([
+    ("ndjson", "application/x-ndjson"),
+    ("csv", "text/csv"),
+])
+
+
+def recorded_times(store, rid):
+    """`{(nivel, subnivel, sesión, palabra): [recordedAt, ...]}` con una hora por repetición.
+
+    Las entradas de medidas van en el mismo orden que los eventos del diario, con
+    una fila por repetición, igual que las empareja la repuntuación.
+    """
+    times = {}
+    for entry in store.measurements(rid):
+        key = (entry["level"], entry["sublevel"], entry["sessionNumber"], entry["word"])
+        times.setdefault(key, []).extend([entry.get("recordedAt", "")] * len(entry["rows"]))
+    return times
+
+
+def report_rows(report, created_at, times):
+    """Filas (tuplas en el orden de EXPORT_FIELDS) de las repeticiones de un reporte materializado."""
+    details = report.get("reportDetails", {})
+    head = (
+        details.get("reportId", ""),
+        str(report.get("patientDetails", {}).get("patientId", "")),
+        created_at,
+        details.get("reportStatus", ""),
+    )
+    levels = report.get("reports", {}).get("games", {}).get("expresatea", {}).get("levels", {})
+    for level, level_obj in levels.items():
+        for sub, sub_obj in level_obj.get("sublevels", {}).items():
+            for session_obj in sub_obj.get("sessions", []):
+                sesn = session_obj["sessionNumber"]
+                for word_obj in session_obj["words"]:
+                    word = word_obj["word"]
+                    reps = word_obj["repetitions"]
+                    recorded = times.get((level, sub, sesn, word), ())
+                    if len(recorded) != len(reps):
+                        recorded = ()  # medidas incompletas: no se puede emparejar
+                    for i, rep in enumerate(reps):
+                        yield head + (
+                            level, sub, sesn, word, i + 1,
+                            rep.get("pronunciationAccuracy"),
+                            rep.get("pronunciationMatchesWord"),
+                            rep.get("containsPronunciationSound"),
+                            recorded[i] if recorded else "",
+                        )
+
+
+def export_rows(store, report_ids):
+    """Filas de todos los reportes de `report_ids` (pares `(reportId, created_at)`), de uno en uno."""
+    for rid, created_at in report_ids:
+        # Con el cerrojo, para no leer el base nuevo con el diario ya vaciado (o al revés)
+        with store.lock(rid):
+            report = store.load(rid)
+            times = recorded_times(store, rid) if report else {}
+        if report:
+            yield from report_rows(report, created_at, times)
+
+
+def ndjson_chunks(rows, chunk_bytes=64 * 1024):
+    """Texto NDJSON (un objeto por fila) en trozos de unos `chunk_bytes` caracteres."""
+    buf, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n'
+        buf.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield ''.join(buf)
+            buf, size = [], 0
+    if buf:
+        yield ''.join(buf)
+
+
+def csv_chunks(rows, chunk_bytes=64 * 1024):
+    """Texto CSV (con cabecera) en trozos de unos `chunk_bytes` caracteres. Los booleanos van como true/false."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow(['true' if v is True else 'false' if v is False else v for v in row])
+        if out.tell() >= chunk_bytes:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue()
+
+
+def export_chunks(rows, fmt, chunk_bytes=64 * 1024):
+    """Trozos de texto de `rows` en el formato `fmt` (una clave de EXPORT_FORMATS)."""
+    if fmt == "csv":
+        return csv_chunks(rows, chunk_bytes)
+    return ndjson_chunks(rows, chunk_bytes)
+
+
+def gzip_chunks(chunks, level=6):
+    """Comprime en gzip un flujo de trozos de texto sin juntarlos en memoria."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,623 @@
+"""Almacenamiento de reportes: JSON base más un diario (journal) de repeticiones.
+
+Cada reporte vive en `results/report_{rid}.json`. Las repeticiones que añade
+/analyze no reescriben ese fichero: se anotan como un evento por línea en
+`results/report_{rid}.journal` (append-only, O(1) por petición). El documento
+anidado `patientDetails/.../sessions/words/repetitions` se materializa
+reproduciendo los eventos sobre el JSON base sólo cuando se pide el reporte, y
+se compacta (se reescribe el base y se vacía el diario) al guardarlo o cuando
+el diario supera `compact_bytes`.
+
+Toda escritura de un reporte se hace bajo `ReportStore.lock(rid)`, un cerrojo de
+fichero que excluye también a otros procesos (varios workers de gunicorn), y los
+JSON se escriben de forma atómica (fichero temporal + rename).
+
+Cada diario empieza con una cabecera con su generación (un identificador
+aleatorio). Al compactar, el base nuevo anota en `journalApplied` la generación y
+los bytes del diario que ya incluye: si el proceso muere después de escribir el
+base y antes de borrar el diario, `load` se salta esa parte en lugar de duplicar
+las repeticiones.
+
+Junto a cada reporte, `results/report_{rid}.measurements.ndjson` guarda las medidas
+en bruto de cada repetición (texto, confianza, F0, jitter, shimmer, duración), con
+una línea por evento del diario, para poder repuntuar sin volver a analizar el audio.
+"""
+import json
+import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Columnas de cada fila de medidas, una fila por repetición anotada en el reporte
+MEASUREMENT_FIELDS = ("segment", "text", "confidence", "meanF0", "jitter", "shimmer", "duration")
+
+# Clave de la cabecera de cada diario y de la marca del base con lo ya aplicado
+JOURNAL_GENERATION = "journalGeneration"
+JOURNAL_APPLIED = "journalApplied"
+
+# Mapeo del subnivel a su número
+SUBLEVEL_NUMBERS = {
+    "Vocales": 1,
+    "Abecedario": 2,
+    "Sílabas": 3
+}
+
+
+def load_json(path, default):
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except:
+            return default
+    return default
+
+
+def save_json(path, obj):
+    """Escribe el JSON de forma atómica: nunca queda a medias aunque el proceso muera."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp_', suffix='.json')
+    try:
+        # Serializar primero y escribir una vez: json.dump hace una escritura por token
+        data = json.dumps(obj, indent=2, ensure_ascii=False, sort_keys=False)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+@contextmanager
+def file_lock(path, remove=False):
+    """Cerrojo exclusivo sobre `path`, válido entre hilos y entre procesos.
+
+    Con `remove`, el fichero del cerrojo se borra al soltarlo para no dejar uno por
+    reporte (sólo con fcntl). Quien esperaba sobre el fichero ya borrado lo nota al
+    conseguir el cerrojo (el inodo ya no es el de `path`) y vuelve a empezar.
+    """
+    if fcntl is None:
+        with open(path, 'a+b') as f:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.01)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+
+    while True:
+        f = open(path, 'a+b')
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            current = os.stat(path)
+        except FileNotFoundError:
+            current = None
+        held = os.fstat(f.fileno())
+        if current and (current.st_dev, current.st_ino) == (held.st_dev, held.st_ino):
+            break
+        f.close()  # lo borró quien lo tenía antes: el cerrojo bueno es el del fichero nuevo
+    try:
+        yield
+    finally:
+        try:
+            if remove:
+                os.remove(path)
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            f.close()
+
+
+def complete_length(path):
+    """Bytes de `path` hasta su último salto de línea (0 si no existe o no tiene ninguno)."""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return 0
+    with f:
+        pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            step = min(pos, 64 * 1024)
+            f.seek(pos - step)
+            newline = f.read(step).rfind(b'\n')
+            if newline >= 0:
+                return pos - step + newline + 1
+            pos -= step
+    return 0
+
+
+def sequential_sum(values):
+    """Suma de izquierda a derecha, la misma que hace `sum()` hasta Python 3.11.
+
+    Los promedios incrementales (`RunningAverages`) suman las repeticiones en ese
+    mismo orden, así que coinciden al bit con el recálculo completo. Desde 3.12,
+    `sum()` compensa el error de redondeo y ya no coincidiría.
+    """
+    total = 0
+    for value in values:
+        total = total + value
+    return total
+
+
+def _tenths(accuracy):
+    """Un promedio ya redondeado a un decimal, como entero de décimas (exacto)."""
+    return round(accuracy * 10)
+
+
+def _group_average(tenths, correct_words, count):
+    """Promedio de un subnivel o nivel a partir de la suma en décimas de sus partes."""
+    return OrderedDict([
+        ("pronunciationAccuracy", round(tenths / (10 * count), 1) if count else 0.0),
+        ("totalCorrectWords", correct_words)
+    ])
+
+
+def recalculate_averages(session_obj, word_obj=None):
+    """Recalcula el promedio de la palabra (si se indica) y el de su sesión."""
+    if word_obj is not None:
+        reps = word_obj["repetitions"]
+        if reps:
+            avg_accuracy = sequential_sum(r["pronunciationAccuracy"] for r in reps) / len(reps)
+            any_correct = any(r["pronunciationMatchesWord"] for r in reps)
+            word_obj["individualAverage"] = OrderedDict([
+                ("pronunciationAccuracy", round(avg_accuracy, 1)),
+                ("wordRepeatedCorrectly", any_correct)
+            ])
+
+    words = session_obj["words"]
+    if words:
+        session_accuracies = [w["individualAverage"]["pronunciationAccuracy"] for w in words]
+        correct_words = sum(1 for w in words if w["individualAverage"]["wordRepeatedCorrectly"])
+        session_obj["sessionAverage"] = OrderedDict([
+            ("pronunciationAccuracy", round(sequential_sum(session_accuracies) / len(session_accuracies), 1)),
+            ("totalCorrectWords", correct_words)
+        ])
+
+
+def recalculate_group_averages(report):
+    """Recalcula los promedios de subnivel y de nivel a partir de los de sesión.
+
+    El de un subnivel es la media de sus sesiones con palabras y el de un nivel la
+    media de sus subniveles con alguna sesión; `totalCorrectWords` es la suma.
+    """
+    levels = report["reports"]["games"]["expresatea"]["levels"]
+    for level_obj in levels.values():
+        level_tenths = level_correct = level_count = 0
+        for sub_obj in level_obj["sublevels"].values():
+            tenths = correct = count = 0
+            for session_obj in sub_obj["sessions"]:
+                if session_obj["words"]:
+                    if "sessionAverage" not in session_obj:
+                        recalculate_averages(session_obj)
+                    tenths += _tenths(session_obj["sessionAverage"]["pronunciationAccuracy"])
+                    correct += session_obj["sessionAverage"]["totalCorrectWords"]
+                    count += 1
+            sub_obj["sublevelAverage"] = _group_average(tenths, correct, count)
+            if count:
+                level_tenths += _tenths(sub_obj["sublevelAverage"]["pronunciationAccuracy"])
+                level_correct += correct
+                level_count += 1
+        level_obj["levelAverage"] = _group_average(level_tenths, level_correct, level_count)
+
+
+def recalculate_report_averages(report):
+    """Recalcula desde cero todos los promedios del reporte (palabra, sesión, subnivel y nivel)."""
+    levels = report["reports"]["games"]["expresatea"]["levels"]
+    for level_obj in levels.values():
+        for sub_obj in level_obj["sublevels"].values():
+            for session_obj in sub_obj["sessions"]:
+                for word_obj in session_obj["words"]:
+                    recalculate_averages(session_obj, word_obj)
+                recalculate_averages(session_obj)
+    recalculate_group_averages(report)
+
+
+class _WordTotals:
+    """Suma, número de repeticiones y si alguna coincide, de una palabra."""
+
+    __slots__ = ('total', 'count', 'correct')
+
+    def __init__(self, word_obj):
+        reps = word_obj["repetitions"]
+        self.total = sequential_sum(r["pronunciationAccuracy"] for r in reps)
+        self.count = len(reps)
+        self.correct = any(r["pronunciationMatchesWord"] for r in reps)
+
+
+class _SessionTotals:
+    """Promedios ya redondeados de las palabras de una sesión y sus sumas parciales.
+
+    `prefix[i]` es la suma (de izquierda a derecha) de los `i` primeros promedios,
+    así que actualizar la última palabra de la sesión, lo habitual, cuesta O(1).
+    """
+
+    __slots__ = ('positions', 'accuracies', 'correct', 'prefix', 'correct_words')
+
+    def __init__(self, session_obj):
+        self.positions = {}
+        self.accuracies = []
+        self.correct = []
+        self.prefix = [0]
+        for i, word_obj in enumerate(session_obj["words"]):
+            self.positions.setdefault(word_obj["word"], i)
+            average = word_obj["individualAverage"]
+            self.accuracies.append(average["pronunciationAccuracy"])
+            self.correct.append(bool(average["wordRepeatedCorrectly"]))
+            self.prefix.append(self.prefix[-1] + self.accuracies[-1])
+        self.correct_words = sum(self.correct)
+
+    def set(self, i, accuracy, correct):
+        """Fija el promedio de la palabra `i` (o añade una al final si `i` es el número de palabras)."""
+        if i == len(self.accuracies):
+            self.accuracies.append(accuracy)
+            self.correct.append(correct)
+            self.prefix.append(None)
+        else:
+            self.correct_words -= self.correct[i]
+            self.accuracies[i] = accuracy
+            self.correct[i] = correct
+        self.correct_words += correct
+        for j in range(i, len(self.accuracies)):
+            self.prefix[j + 1] = self.prefix[j] + self.accuracies[j]
+
+
+class _GroupTotals:
+    """Suma en décimas de los promedios de las partes (sesiones o subniveles) con datos."""
+
+    __slots__ = ('parts', 'tenths', 'correct')
+
+    def __init__(self):
+        self.parts = {}
+        self.tenths = 0
+        self.correct = 0
+
+    def set(self, key, average):
+        """Sustituye la aportación de la parte `key`; `average` None si aún no tiene datos."""
+        old = self.parts.pop(key, None)
+        if old is not None:
+            self.tenths -= old[0]
+            self.correct -= old[1]
+        if average is not None:
+            part = (_tenths(average["pronunciationAccuracy"]), average["totalCorrectWords"])
+            self.parts[key] = part
+            self.tenths += part[0]
+            self.correct += part[1]
+
+    def average(self):
+        return _group_average(self.tenths, self.correct, len(self.parts))
+
+
+class RunningAverages:
+    """Agregados de un reporte materializado para actualizar sus promedios por repetición.
+
+    Por palabra se guarda la suma y el número de repeticiones, por sesión los
+    promedios de sus palabras con sus sumas parciales, y por subnivel y nivel la
+    suma de los promedios de sus partes. Añadir repeticiones cuesta O(1) por
+    repetición en lugar de volver a recorrer la palabra y la sesión, y los
+    resultados son idénticos a los de `recalculate_report_averages`.
+
+    Los agregados se construyen al tocar cada palabra, sesión o nivel por primera
+    vez, a partir de lo que ya hay en el reporte, y no se guardan en el JSON.
+    """
+
+    def __init__(self, report):
+        self.levels = report["reports"]["games"]["expresatea"]["levels"]
+        self._words = {}
+        self._sessions = {}
+        self._sublevels = {}
+        self._levels = {}
+
+    def _level(self, level):
+        totals = self._levels.get(level)
+        if totals is None:
+            totals = self._levels[level] = _GroupTotals()
+            for sub in self.levels[level]["sublevels"]:
+                self._sublevel(level, sub)
+            self.levels[level]["levelAverage"] = totals.average()
+        return totals
+
+    def _sublevel(self, level, sub):
+        key = (level, sub)
+        totals = self._sublevels.get(key)
+        if totals is None:
+            totals = self._sublevels[key] = _GroupTotals()
+            sub_obj = self.levels[level]["sublevels"][sub]
+            for i, session_obj in enumerate(sub_obj["sessions"]):
+                if session_obj["words"]:
+                    if "sessionAverage" not in session_obj:
+                        recalculate_averages(session_obj)
+                    totals.set(i, session_obj["sessionAverage"])
+            sub_obj["sublevelAverage"] = totals.average()
+            self._level(level).set(sub, sub_obj["sublevelAverage"] if totals.parts else None)
+        return totals
+
+    def _session(self, level, sub, index, session_obj):
+        key = (level, sub, index)
+        totals = self._sessions.get(key)
+        if totals is None:
+            totals = self._sessions[key] = _SessionTotals(session_obj)
+        return totals
+
+    def add(self, level, sub, index, word, repetitions):
+        """Añade `repetitions` a la palabra `word` de la sesión `index` (desde 0) y actualiza los promedios.
+
+        La palabra se crea al final de la sesión si no existe; el nivel, el subnivel
+        y la sesión tienen que existir ya.
+        """
+        level_totals = self._level(level)
+        sub_totals = self._sublevel(level, sub)
+        sub_obj = self.levels[level]["sublevels"][sub]
+        session_obj = sub_obj["sessions"][index]
+        session = self._session(level, sub, index, session_obj)
+
+        words = session_obj["words"]
+        i = session.positions.get(word)
+        if i is None:
+            i = session.positions[word] = len(words)
+            words.append(OrderedDict([
+                ("word", word),
+                ("repetitions", []),
+                ("individualAverage", OrderedDict([
+                    ("pronunciationAccuracy", 0.0),
+                    ("wordRepeatedCorrectly", False)
+                ]))
+            ]))
+        word_obj = words[i]
+        word_key = (level, sub, index, i)
+        word_totals = self._words.get(word_key)
+        if word_totals is None:
+            word_totals = self._words[word_key] = _WordTotals(word_obj)
+
+        reps = word_obj["repetitions"]
+        for rep in repetitions:
+            rep = OrderedDict(rep)
+            reps.append(rep)
+            word_totals.total = word_totals.total + rep["pronunciationAccuracy"]
+            word_totals.count += 1
+            word_totals.correct = word_totals.correct or bool(rep["pronunciationMatchesWord"])
+        if word_totals.count:
+            word_obj["individualAverage"] = OrderedDict([
+                ("pronunciationAccuracy", round(word_totals.total / word_totals.count, 1)),
+                ("wordRepeatedCorrectly", word_totals.correct)
+            ])
+
+        average = word_obj["individualAverage"]
+        session.set(i, average["pronunciationAccuracy"], bool(average["wordRepeatedCorrectly"]))
+        session_obj["sessionAverage"] = OrderedDict([
+            ("pronunciationAccuracy", round(session.prefix[-1] / len(session.accuracies), 1)),
+            ("totalCorrectWords", session.correct_words)
+        ])
+
+        sub_totals.set(index, session_obj["sessionAverage"])
+        sub_obj["sublevelAverage"] = sub_totals.average()
+        level_totals.set(sub, sub_obj["sublevelAverage"])
+        self.levels[level]["levelAverage"] = level_totals.average()
+
+    def complete(self):
+        """Añade los promedios de subnivel y nivel que falten (reportes anteriores a ellos)."""
+        for level in self.levels:
+            self._level(level)
+
+
+def apply_repetitions(report, event, averages=None):
+    """Añade al reporte las repeticiones de un evento y actualiza los promedios.
+
+    `averages` son los agregados del reporte (`RunningAverages`); al reproducir
+    varios eventos sobre el mismo reporte hay que pasar siempre el mismo.
+    """
+    level, sub, sesn, word = event["level"], event["sublevel"], event["sessionNumber"], event["word"]
+    if averages is None:
+        averages = RunningAverages(report)
+
+    levels = report["reports"]["games"]["expresatea"]["levels"]
+    levels.setdefault(level, {"sublevels": {}})
+    subs = levels[level]["sublevels"]
+
+    sublevel_num = SUBLEVEL_NUMBERS.get(sub, 1)  # default a 1 si no encuentra
+    subs.setdefault(sub, OrderedDict([
+        ("sublevelName", f"Subnivel {sublevel_num}: {sub}"),
+        ("sessions", [])
+    ]))
+
+    sessions = subs[sub]["sessions"]
+    while len(sessions) < sesn:
+        sessions.append(OrderedDict([
+            ("sessionNumber", len(sessions) + 1),
+            ("words", []),
+            ("sessionAverage", OrderedDict([
+                ("pronunciationAccuracy", 0.0),
+                ("totalCorrectWords", 0)
+            ]))
+        ]))
+
+    averages.add(level, sub, sesn - 1, word, event["repetitions"])
+
+    return report
+
+
+class ReportStore:
+    """Reportes en disco dentro de `folder`, con diario de repeticiones por reporte."""
+
+    def __init__(self, folder, compact_bytes=256 * 1024):
+        self.folder = folder
+        self.compact_bytes = compact_bytes
+
+    def path(self, rid):
+        return os.path.join(self.folder, f"report_{rid}.json")
+
+    def journal_path(self, rid):
+        return os.path.join(self.folder, f"report_{rid}.journal")
+
+    def lock_path(self, rid):
+        return os.path.join(self.folder, f"report_{rid}.lock")
+
+    def measurements_path(self, rid):
+        return os.path.join(self.folder, f"report_{rid}.measurements.ndjson")
+
+    def exists(self, rid):
+        return os.path.exists(self.path(rid))
+
+    def version(self, rid):
+        """Versión de los ficheros del reporte (None si no existe), sin leerlos.
+
+        Cambia con cada escritura: el JSON base se reemplaza (inodo y mtime nuevos)
+        y el diario sólo crece o desaparece. Al ser de los ficheros, es la misma
+        para todos los procesos.
+        """
+        try:
+            base = os.stat(self.path(rid))
+        except FileNotFoundError:
+            return None
+        try:
+            journal = os.stat(self.journal_path(rid))
+            journal_part = f"{journal.st_ino}-{journal.st_size}"
+        except FileNotFoundError:
+            journal_part = "0"
+        return f"{base.st_ino}-{base.st_mtime_ns}-{base.st_size}:{journal_part}"
+
+    def lock(self, rid):
+        """Cerrojo del reporte; quien lo tiene es el único que escribe su base y su diario."""
+        return file_lock(self.lock_path(rid), remove=True)
+
+    def create(self, rid, report):
+        """Guarda el JSON base de un reporte nuevo."""
+        with self.lock(rid):
+            save_json(self.path(rid), report)
+
+    def append(self, rid, event, measurements=None):
+        """Anota un evento de repeticiones en el diario del reporte."""
+        self.extend(rid, [event], [measurements] if measurements else None)
+
+    def extend(self, rid, events, measurements=None):
+        """Anota varios eventos con una sola escritura (y un solo fsync) del diario.
+
+        `measurements`, si se pasa, tiene una entrada por evento con las medidas en
+        bruto de sus repeticiones (ver MEASUREMENT_FIELDS); se guardan aparte, en el
+        archivo de medidas del reporte, para poder repuntuarlo sin el audio.
+        """
+        lines = ''.join(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n'
+                        for event in events)
+        if not lines:
+            return
+        journal = self.journal_path(rid)
+        with self.lock(rid):
+            complete = complete_length(journal)
+            with open(journal, 'ab') as f:
+                if f.tell() != complete:
+                    f.truncate(complete)  # última línea a medias de una escritura interrumpida
+                if not complete:
+                    header = {JOURNAL_GENERATION: uuid.uuid4().hex}
+                    lines = json.dumps(header, separators=(',', ':')) + '\n' + lines
+                f.write(lines.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            if measurements:
+                with open(self.measurements_path(rid), 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(m, ensure_ascii=False, separators=(',', ':')) + '\n'
+                                    for m in measurements))
+                    f.flush()
+                    os.fsync(f.fileno())
+            if os.path.getsize(journal) >= self.compact_bytes:
+                self._compact(rid)
+
+    def events(self, rid, applied=None):
+        """Eventos pendientes del diario, en orden.
+
+        `applied` es la marca `journalApplied` del base: si el diario es de esa
+        generación, se empieza tras los bytes que el base ya incluye.
+        """
+        journal = self.journal_path(rid)
+        if not os.path.exists(journal):
+            return
+        with open(journal, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # última línea a medias (escritura interrumpida)
+                if not line.strip():
+                    continue
+                entry = json.loads(line, object_pairs_hook=OrderedDict)
+                if JOURNAL_GENERATION in entry:
+                    if applied and applied.get("generation") == entry[JOURNAL_GENERATION]:
+                        f.seek(applied["offset"])
+                    continue
+                yield entry
+
+    def generation(self, rid):
+        """Generación del diario del reporte (None si no hay diario o no tiene cabecera)."""
+        try:
+            with open(self.journal_path(rid), 'rb') as f:
+                first = f.readline()
+        except FileNotFoundError:
+            return None
+        if not first.endswith(b'\n'):
+            return None
+        return json.loads(first).get(JOURNAL_GENERATION)
+
+    def measurements(self, rid):
+        """Entradas del archivo de medidas del reporte, en orden."""
+        path = self.measurements_path(rid)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # última línea a medias (escritura interrumpida)
+                if line.strip():
+                    yield json.loads(line, object_pairs_hook=OrderedDict)
+
+    def load(self, rid):
+        """Materializa el reporte: JSON base más los eventos del diario. {} si no existe o está dañado."""
+        report = load_json(self.path(rid), {})
+        if not report:
+            return report
+        applied = report.pop(JOURNAL_APPLIED, None)
+        averages = RunningAverages(report)
+        for event in self.events(rid, applied):
+            apply_repetitions(report, event, averages)
+        averages.complete()
+        return report
+
+    def save(self, rid, report):
+        """Reescribe el JSON base con el reporte materializado y vacía el diario.
+
+        Debe llamarse con `lock(rid)` tomado desde antes de `load`, para que
+        ninguna repetición anotada entre medias se pierda. El base anota qué parte
+        del diario incluye (`journalApplied`), así que morir antes de borrar el
+        diario no duplica sus eventos.
+        """
+        journal = self.journal_path(rid)
+        report = OrderedDict(report)
+        report.pop(JOURNAL_APPLIED, None)
+        generation = self.generation(rid)
+        if generation:
+            report[JOURNAL_APPLIED] = OrderedDict([
+                ("generation", generation), ("offset", complete_length(journal)),
+            ])
+        save_json(self.path(rid), report)
+        if os.path.exists(journal):
+            os.remove(journal)
+
+    def compact(self, rid):
+        with self.lock(rid):
+            self._compact(rid)
+
+    def _compact(self, rid):
+        report = self.load(rid)
+        if report:
+            self.save(rid, report)
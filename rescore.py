@@ -0,0 +1,125 @@
+"""Repuntuación de reportes a partir de las medidas en bruto, sin volver a analizar audio.
+
+Las medidas de todos los reportes se leen primero y se puntúan de una vez con una
+función vectorizada (`app.score_measurements`); después, bajo el cerrojo de cada
+reporte, se sustituyen la precisión y la coincidencia de cada repetición y se
+recalculan los promedios de palabra, sesión, subnivel y nivel.
+
+Una palabra sólo se repuntúa si tiene una fila de medidas por repetición; las
+anotadas antes de que se guardaran medidas se dejan como estaban.
+"""
+import time
+from collections import OrderedDict
+
+from report_store import MEASUREMENT_FIELDS, recalculate_averages, recalculate_group_averages
+
+TEXT = MEASUREMENT_FIELDS.index("text")
+CONFIDENCE = MEASUREMENT_FIELDS.index("confidence")
+JITTER = MEASUREMENT_FIELDS.index("jitter")
+SHIMMER = MEASUREMENT_FIELDS.index("shimmer")
+
+
+def collect(store, rids):
+    """Lee las medidas de los reportes y las reparte en columnas para puntuarlas juntas.
+
+    Devuelve `(columnas, reportes)`: `columnas` son las listas texto, palabra,
+    subnivel, confianza, jitter y shimmer de todas las filas; `reportes` relaciona
+    cada reporte con `(número de entradas, {(nivel, subnivel, sesión, palabra): [fila, ...]})`,
+    donde cada fila es su posición en las columnas.
+    """
+    columns = ([], [], [], [], [], [])
+    reports = OrderedDict()
+    for rid in rids:
+        groups = OrderedDict()
+        entries = 0
+        for entry in store.measurements(rid):
+            entries += 1
+            key = (entry["level"], entry["sublevel"], entry["sessionNumber"], entry["word"])
+            positions = groups.setdefault(key, [])
+            for row in entry["rows"]:
+                positions.append(len(columns[0]))
+                columns[0].append(row[TEXT])
+                columns[1].append(entry["word"])
+                columns[2].append(entry["sublevel"])
+                columns[3].append(row[CONFIDENCE])
+                columns[4].append(row[JITTER])
+                columns[5].append(row[SHIMMER])
+        if entries:
+            reports[rid] = (entries, groups)
+    return columns, reports
+
+
+def apply_scores(report, groups, accuracies, matches, stats):
+    """Sustituye las puntuaciones de las palabras con medidas. Devuelve si algo cambió."""
+    changed = False
+    levels = report["reports"]["games"]["expresatea"]["levels"]
+    for level, level_obj in levels.items():
+        for sub, sub_obj in level_obj["sublevels"].items():
+            for session_obj in sub_obj["sessions"]:
+                session_changed = False
+                for word_obj in session_obj["words"]:
+                    positions = groups.get((level, sub, session_obj["sessionNumber"], word_obj["word"]))
+                    if positions is None:
+                        continue
+                    reps = word_obj["repetitions"]
+                    if len(positions) != len(reps):
+                        stats["wordsSkipped"] += 1
+                        continue
+                    for rep, pos in zip(reps, positions):
+                        stats["repetitionsRescored"] += 1
+                        if (rep["pronunciationAccuracy"], rep["pronunciationMatchesWord"]) != (accuracies[pos], matches[pos]):
+                            rep["pronunciationAccuracy"] = accuracies[pos]
+                            rep["pronunciationMatchesWord"] = matches[pos]
+                            stats["repetitionsChanged"] += 1
+                            session_changed = True
+                    recalculate_averages(session_obj, word_obj)
+                if session_changed:
+                    recalculate_averages(session_obj)
+                    changed = True
+    if changed:
+        recalculate_group_averages(report)
+    return changed
+
+
+def rescore_reports(store, rids, score_fn, dry_run=False, on_saved=None):
+    """Repuntúa los reportes `rids` con `score_fn` y devuelve un resumen.
+
+    `score_fn(textos, palabras, subniveles, confianzas, jitters, shimmers)` devuelve
+    `(precisiones, coincidencias)`. Con `dry_run` se calcula todo pero no se guarda.
+    `on_saved(rids)` recibe al final la lista de reportes guardados (p. ej. para
+    actualizar el catálogo de una vez).
+    """
+    t0 = time.perf_counter()
+    stats = OrderedDict([
+        ("reports", 0), ("reportsChanged", 0), ("repetitionsRescored", 0),
+        ("repetitionsChanged", 0), ("wordsSkipped", 0),
+    ])
+
+    saved = []
+    columns, reports = collect(store, rids)
+    accuracies, matches = score_fn(*columns)
+
+    for rid, (entries, groups) in reports.items():
+        with store.lock(rid):
+            report_accuracies, report_matches = accuracies, matches
+            if sum(1 for _ in store.measurements(rid)) != entries:
+                # Llegaron repeticiones nuevas mientras se puntuaba: repetir sólo éste
+                report_columns, fresh = collect(store, [rid])
+                groups = fresh[rid][1]
+                report_accuracies, report_matches = score_fn(*report_columns)
+
+            report = store.load(rid)
+            if not report:
+                continue
+            stats["reports"] += 1
+            if apply_scores(report, groups, report_accuracies, report_matches, stats):
+                stats["reportsChanged"] += 1
+                if not dry_run:
+                    store.save(rid, report)
+                    saved.append(rid)
+
+    if saved and on_saved:
+        on_saved(saved)
+
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    return stats
@@ -321,21 +321,18 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   };
 
-  // 4) Submit de análisis con validaciones
-  analyzeForm.addEventListener('submit', async e => {
-    e.preventDefault();
-    
-    // Validaciones
+  // 4) Validaciones comunes al análisis de un archivo y al análisis en vivo
+  function validateAnalysisFields() {
     if (!reportId) {
       showAlert('Error: No se ha iniciado el reporte.');
-      return;
+      return false;
     }
     
     if (!levelSelect.value) {
       showAlert('Por favor selecciona un nivel.');
       levelSelect.focus();
       showFieldError(levelSelect);
-      return;
+      return false;
     }
     
     const subSelect = document.getElementById('subSelect');
@@ -345,20 +342,31 @@ document.addEventListener('DOMContentLoaded', () => {
         subSelect.focus();
         showFieldError(subSelect);
       }
-      return;
+      return false;
     }
     
     if (!wordSelect.value) {
       showAlert('Por favor selecciona una palabra.');
       wordSelect.focus();
       showFieldError(wordSelect);
-      return;
+      return false;
     }
     
     if (!sessionInput.value || sessionInput.value < 1) {
       showAlert('Por favor ingresa un número de sesión válido.');
       sessionInput.focus();
       showFieldError(sessionInput);
+      return false;
+    }
+    return true;
+  }
+
+  // Submit de análisis con validaciones
+  analyzeForm.addEventListener('submit', async e => {
+    e.preventDefault();
+    
+    // Validaciones
+    if (!validateAnalysisFields()) {
       return;
     }
     
@@ -375,109 +383,16 @@ document.addEventListener('DOMContentLoaded', () => {
     loading.style.display = 'block';
     
     try {
-      const res = await fetch('/analyze', { method:'POST', body: form });
-      if (!res.ok) {
-        const errorText = await res.text();
-        throw new Error(errorText);
-      }
-      const { result } = await res.json();
+      const upload = await prepareUpload(audioInput.files[0]);
+      form.set('audio', upload, upload.name);
       
-      console.log('Resultado del análisis:', result);
+      const { result } = await postAnalysis(form);
       
-      // Mostrar tabla de resultados
-      document.getElementById('resultsTable').style.display = 'table';
-      
-      // Limpiar tabla solo si tiene el mensaje inicial "Sin datos"
-      if (resultsBody.children[0]?.children[0]?.classList?.contains('no-data')) {
-        resultsBody.innerHTML = '';
-      }
-      
-      // Agregar separador visual si ya hay datos en la tabla
-      if (resultsBody.children.length > 0) {
-        const separatorTr = document.createElement('tr');
-        separatorTr.style.borderTop = '3px solid var(--primary-blue)';
-        separatorTr.innerHTML = `<td colspan="6" style="height: 8px; background: linear-gradient(90deg, var(--primary-blue-light) 0%, white 100%);"></td>`;
-        resultsBody.appendChild(separatorTr);
-      }
+      console.log('Resultado del análisis:', result);
       
-      // Agregar una fila por cada repetición detectada
-      if (result.repetitions && result.repetitions.length > 0) {
-        result.repetitions.forEach((repetition, index) => {
-          const tr = document.createElement('tr');
-          tr.style.transition = 'all 0.3s ease';
-          
-          // Determinar clase de precisión
-          let accuracyClass = 'danger';
-          if (repetition.pronunciationAccuracy >= 70) accuracyClass = 'success';
-          else if (repetition.pronunciationAccuracy >= 50) accuracyClass = 'warning';
-          
-          tr.innerHTML = `
-            <td><strong>${result.reportId}</strong></td>
-            <td><span class="badge">Sesión ${result.sessionNumber}</span></td>
-            <td><span style="color: var(--primary-blue); font-weight: 600;">${result.word}</span></td>
-            <td>Repetición ${index + 1}</td>
-            <td><span class="accuracy-badge ${accuracyClass}">${repetition.pronunciationAccuracy}%</span></td>
-            <td><span class="validation-badge ${repetition.pronunciationMatchesWord ? 'success' : 'danger'}">
-              ${repetition.pronunciationMatchesWord ? '✓ Correcto' : '✗ Incorrecto'}
-            </span></td>
-          `;
-          resultsBody.appendChild(tr);
-        });
-        
-        // Agregar fila de resumen para este análisis específico
-        const avgAccuracy = result.repetitions.reduce((sum, rep) => sum + rep.pronunciationAccuracy, 0) / result.repetitions.length;
-        const correctCount = result.repetitions.filter(rep => rep.pronunciationMatchesWord).length;
-        
-        const summaryTr = document.createElement('tr');
-        summaryTr.style.background = 'linear-gradient(135deg, var(--primary-blue-light) 0%, white 100%)';
-        summaryTr.style.fontWeight = 'bold';
-        summaryTr.style.borderTop = '2px solid var(--primary-blue)';
-        summaryTr.style.borderBottom = '2px solid var(--primary-blue)';
-        summaryTr.innerHTML = `
-          <td colspan="3" style="color: var(--primary-blue);">📊 <strong>RESUMEN - ${result.word.toUpperCase()}</strong></td>
-          <td><span class="summary-badge">${result.repetitions.length} repeticiones</span></td>
-          <td><span class="summary-badge">Promedio: ${avgAccuracy.toFixed(1)}%</span></td>
-          <td><span class="summary-badge">${correctCount}/${result.repetitions.length} correctas</span></td>
-        `;
-        resultsBody.appendChild(summaryTr);
-        
-        // Mostrar información adicional para este análisis
-        if (result.segmentsDetected !== undefined) {
-          const infoTr = document.createElement('tr');
-          infoTr.style.background = 'var(--warning-yellow)';
-          infoTr.style.fontSize = '0.9em';
-          infoTr.style.fontStyle = 'italic';
-          infoTr.style.color = '#856404';
-          infoTr.innerHTML = `
-            <td colspan="6" style="padding: 15px;">
-              ℹ️ <strong>Análisis completado:</strong> 
-              ${result.segmentsDetected} segmentos detectados, 
-              ${result.validSegmentsProcessed} procesados válidos para "${result.word}"
-              <small style="float: right; color: #666; font-weight: 600;">
-                ${new Date().toLocaleTimeString()}
-              </small>
-            </td>
-          `;
-          resultsBody.appendChild(infoTr);
-        }
-      } else {
-        // Si no hay repeticiones, mostrar mensaje de error pero mantener resultados anteriores
-        const tr = document.createElement('tr');
-        tr.style.background = '#ffe6e6';
-        tr.style.color = 'var(--danger-red)';
-        tr.innerHTML = `
-          <td><strong>${result.reportId}</strong></td>
-          <td>Sesión ${result.sessionNumber}</td>
-          <td><span style="color: var(--danger-red); font-weight: 600;">${result.word}</span></td>
-          <td colspan="3" style="text-align: center;">
-            ⏱ <strong>No se detectaron repeticiones válidas en el audio</strong>
-            <small style="display: block; color: #666; margin-top: 5px;">
-              ${new Date().toLocaleTimeString()}
-            </small>
-          </td>
-        `;
-        resultsBody.appendChild(tr);
-      }
+      startResultGroup();
+      (result.repetitions || []).forEach((repetition, index) => appendRepetitionRow(result, repetition, index));
+      appendResultSummary(result);
       
       // Update wizard to step 4 (results) and show finish button
       updateWizard(4);
@@ -501,6 +416,366 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   });
 
+  // Tabla de resultados: un grupo por análisis, con una fila por repetición y un resumen
+  function startResultGroup() {
+    // Mostrar tabla de resultados
+    document.getElementById('resultsTable').style.display = 'table';
+    
+    // Limpiar tabla solo si tiene el mensaje inicial "Sin datos"
+    if (resultsBody.children[0]?.children[0]?.classList?.contains('no-data')) {
+      resultsBody.innerHTML = '';
+    }
+    
+    // Agregar separador visual si ya hay datos en la tabla
+    if (resultsBody.children.length > 0) {
+      const separatorTr = document.createElement('tr');
+      separatorTr.style.borderTop = '3px solid var(--primary-blue)';
+      separatorTr.innerHTML = `<td colspan="6" style="height: 8px; background: linear-gradient(90deg, var(--primary-blue-light) 0%, white 100%);"></td>`;
+      resultsBody.appendChild(separatorTr);
+    }
+  }
+
+  function appendRepetitionRow(result, repetition, index) {
+    const tr = document.createElement('tr');
+    tr.style.transition = 'all 0.3s ease';
+    
+    // Determinar clase de precisión
+    let accuracyClass = 'danger';
+    if (repetition.pronunciationAccuracy >= 70) accuracyClass = 'success';
+    else if (repetition.pronunciationAccuracy >= 50) accuracyClass = 'warning';
+    
+    tr.innerHTML = `
+      <td><strong>${result.reportId}</strong></td>
+      <td><span class="badge">Sesión ${result.sessionNumber}</span></td>
+      <td><span style="color: var(--primary-blue); font-weight: 600;">${result.word}</span></td>
+      <td>Repetición ${index + 1}</td>
+      <td><span class="accuracy-badge ${accuracyClass}">${repetition.pronunciationAccuracy}%</span></td>
+      <td><span class="validation-badge ${repetition.pronunciationMatchesWord ? 'success' : 'danger'}">
+        ${repetition.pronunciationMatchesWord ? '✓ Correcto' : '✗ Incorrecto'}
+      </span></td>
+    `;
+    resultsBody.appendChild(tr);
+  }
+
+  function appendResultSummary(result) {
+    if (result.repetitions && result.repetitions.length > 0) {
+      // Agregar fila de resumen para este análisis específico
+      const avgAccuracy = result.repetitions.reduce((sum, rep) => sum + rep.pronunciationAccuracy, 0) / result.repetitions.length;
+      const correctCount = result.repetitions.filter(rep => rep.pronunciationMatchesWord).length;
+    
+      const summaryTr = document.createElement('tr');
+      summaryTr.style.background = 'linear-gradient(135deg, var(--primary-blue-light) 0%, white 100%)';
+      summaryTr.style.fontWeight = 'bold';
+      summaryTr.style.borderTop = '2px solid var(--primary-blue)';
+      summaryTr.style.borderBottom = '2px solid var(--primary-blue)';
+      summaryTr.innerHTML = `
+        <td colspan="3" style="color: var(--primary-blue);">📊 <strong>RESUMEN - ${result.word.toUpperCase()}</strong></td>
+        <td><span class="summary-badge">${result.repetitions.length} repeticiones</span></td>
+        <td><span class="summary-badge">Promedio: ${avgAccuracy.toFixed(1)}%</span></td>
+        <td><span class="summary-badge">${correctCount}/${result.repetitions.length} correctas</span></td>
+      `;
+      resultsBody.appendChild(summaryTr);
+    
+      // Mostrar información adicional para este análisis
+      if (result.segmentsDetected !== undefined) {
+        const infoTr = document.createElement('tr');
+        infoTr.style.background = 'var(--warning-yellow)';
+        infoTr.style.fontSize = '0.9em';
+        infoTr.style.fontStyle = 'italic';
+        infoTr.style.color = '#856404';
+        infoTr.innerHTML = `
+          <td colspan="6" style="padding: 15px;">
+            ℹ️ <strong>Análisis completado:</strong> 
+            ${result.segmentsDetected} segmentos detectados, 
+            ${result.validSegmentsProcessed} procesados válidos para "${result.word}"
+            <small style="float: right; color: #666; font-weight: 600;">
+              ${new Date().toLocaleTimeString()}
+            </small>
+          </td>
+        `;
+        resultsBody.appendChild(infoTr);
+      }
+    } else {
+      // Si no hay repeticiones, mostrar mensaje de error pero mantener resultados anteriores
+      const tr = document.createElement('tr');
+      tr.style.background = '#ffe6e6';
+      tr.style.color = 'var(--danger-red)';
+      tr.innerHTML = `
+        <td><strong>${result.reportId}</strong></td>
+        <td>Sesión ${result.sessionNumber}</td>
+        <td><span style="color: var(--danger-red); font-weight: 600;">${result.word}</span></td>
+        <td colspan="3" style="text-align: center;">
+          ⏱ <strong>No se detectaron repeticiones válidas en el audio</strong>
+          <small style="display: block; color: #666; margin-top: 5px;">
+            ${new Date().toLocaleTimeString()}
+          </small>
+        </td>
+      `;
+      resultsBody.appendChild(tr);
+    }
+  }
+
+  // Antes de subir, el audio se decodifica en el navegador, se mezcla a mono y se
+  // remuestrea a 16 kHz (la frecuencia del análisis): un WAV de 16 bits ocupa 32 kB/s
+  // frente a los ~190 kB/s de un 48 kHz estéreo, y el servidor no tiene que
+  // remuestrear. Si el navegador lo permite se comprime además con gzip (sin
+  // pérdidas; los silencios entre repeticiones comprimen mucho). Con
+  // data-client-encode="false" en el formulario, o si algo falla, se sube el original.
+  const UPLOAD_SR = 16000;
+  const UPLOAD_MAX_DECODE_BYTES = 200 * 1024 * 1024;  // más grande: decodificarlo entero en memoria no compensa
+
+  async function prepareUpload(file) {
+    const OfflineCtx = window.OfflineAudioContext || window.webkitOfflineAudioContext;
+    if (analyzeForm.dataset.clientEncode === 'false' || !OfflineCtx || file.size > UPLOAD_MAX_DECODE_BYTES) {
+      return file;
+    }
+    try {
+      const t0 = performance.now();
+      // decodeAudioData remuestrea a la frecuencia del contexto; el render a un
+      // canal mezcla los canales a mono
+      const decoded = await new OfflineCtx(1, 1, UPLOAD_SR).decodeAudioData(await file.arrayBuffer());
+      const ctx = new OfflineCtx(1, Math.max(1, Math.ceil(decoded.duration * UPLOAD_SR)), UPLOAD_SR);
+      const source = ctx.createBufferSource();
+      source.buffer = decoded;
+      source.connect(ctx.destination);
+      source.start();
+      const rendered = await ctx.startRendering();
+
+      let blob = encodeWav(rendered.getChannelData(0), UPLOAD_SR);
+      let name = file.name.replace(/\.[^.]*$/, '') + '.wav';
+      if (window.CompressionStream) {
+        const compressed = await new Response(blob.stream().pipeThrough(new CompressionStream('gzip'))).blob();
+        if (compressed.size < blob.size) {
+          blob = compressed;
+          name += '.gz';
+        }
+      }
+      console.log(`Audio preparado en ${Math.round(performance.now() - t0)} ms: ${file.size} -> ${blob.size} bytes`);
+      return blob.size < file.size ? new File([blob], name, { type: blob.type || 'application/gzip' }) : file;
+    } catch (err) {
+      console.warn('No se pudo preparar el audio en el navegador; se sube el original:', err);
+      return file;
+    }
+  }
+
+  // WAV PCM de 16 bits, mono
+  function encodeWav(samples, sampleRate) {
+    const view = new DataView(new ArrayBuffer(44 + samples.length * 2));
+    const writeString = (offset, text) => {
+      for (let i = 0; i < text.length; i++) view.setUint8(offset + i, text.charCodeAt(i));
+    };
+    writeString(0, 'RIFF');
+    view.setUint32(4, 36 + samples.length * 2, true);
+    writeString(8, 'WAVE');
+    writeString(12, 'fmt ');
+    view.setUint32(16, 16, true);              // tamaño del bloque fmt
+    view.setUint16(20, 1, true);               // PCM
+    view.setUint16(22, 1, true);               // mono
+    view.setUint32(24, sampleRate, true);
+    view.setUint32(28, sampleRate * 2, true);  // bytes por segundo
+    view.setUint16(32, 2, true);               // bytes por muestra
+    view.setUint16(34, 16, true);              // bits por muestra
+    writeString(36, 'data');
+    view.setUint32(40, samples.length * 2, true);
+    for (let i = 0; i < samples.length; i++) {
+      const s = Math.max(-1, Math.min(1, samples[i]));
+      view.setInt16(44 + i * 2, s < 0 ? s * 0x8000 : s * 0x7fff, true);
+    }
+    return new Blob([view.buffer], { type: 'audio/wav' });
+  }
+
+  // Envía el formulario a /analyze. Con data-async="true" en el formulario usa el
+  // modo asíncrono: recibe un jobId y consulta /jobs/<id> mostrando el progreso.
+  async function postAnalysis(form) {
+    const useAsync = analyzeForm.dataset.async === 'true';
+    const res = await fetch(useAsync ? '/analyze?async=1' : '/analyze', { method:'POST', body: form });
+    if (!res.ok) {
+      const errorText = await res.text();
+      throw new Error(errorText);
+    }
+    const data = await res.json();
+    return useAsync ? waitForJob(data.jobId) : data;
+  }
+
+  async function waitForJob(jobId) {
+    const subtitle = loading.querySelector('.loading-subtitle');
+    const defaultSubtitle = subtitle ? subtitle.textContent : '';
+    try {
+      while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const res = await fetch(`/jobs/${jobId}`);
+        if (!res.ok) {
+          throw new Error(await res.text());
+        }
+        const job = await res.json();
+        const p = job.progress || {};
+        if (subtitle && p.segmentsTotal !== undefined) {
+          subtitle.textContent = `Segmentos transcritos: ${p.segmentsTranscribed || 0}/${p.segmentsTotal} · analizados: ${p.segmentsAnalyzed || 0}/${p.segmentsTotal}`;
+        }
+        if (job.status === 'done') return job.result;
+        if (job.status === 'failed') throw new Error(JSON.stringify(job.result));
+      }
+    } finally {
+      if (subtitle) subtitle.textContent = defaultSubtitle;
+    }
+  }
+
+  // 4b) Análisis en vivo: el audio del micrófono se envía por WebSocket a
+  // /analyze/live como PCM de 16 bits y cada repetición se puntúa al terminar.
+  const liveBtn = document.getElementById('liveBtn');
+  let liveSession = null;
+
+  // Procesador de audio que convierte las muestras a Int16 y las envía en bloques de 4096
+  const PCM_WORKLET = `
+    class PcmCapture extends AudioWorkletProcessor {
+      constructor() {
+        super();
+        this.buffer = new Int16Array(4096);
+        this.length = 0;
+      }
+      process(inputs) {
+        const input = inputs[0][0];
+        if (input) {
+          for (let i = 0; i < input.length; i++) {
+            const s = Math.max(-1, Math.min(1, input[i]));
+            this.buffer[this.length++] = s < 0 ? s * 0x8000 : s * 0x7fff;
+            if (this.length === this.buffer.length) {
+              this.port.postMessage(this.buffer.buffer, [this.buffer.buffer]);
+              this.buffer = new Int16Array(4096);
+              this.length = 0;
+            }
+          }
+        }
+        return true;
+      }
+    }
+    registerProcessor('pcm-capture', PcmCapture);
+  `;
+
+  function setLiveState(state) {
+    liveBtn.disabled = state === 'processing';
+    liveBtn.textContent = {
+      idle: '🎙️ Grabar en Vivo',
+      recording: '⏹️ Detener Grabación',
+      processing: '⏳ Procesando...'
+    }[state];
+  }
+
+  if (liveBtn) {
+    if (!window.AudioWorkletNode || !navigator.mediaDevices?.getUserMedia) {
+      liveBtn.style.display = 'none';
+    }
+    liveBtn.onclick = async () => {
+      if (liveSession) {
+        liveSession.stop();
+        return;
+      }
+      if (!validateAnalysisFields()) {
+        return;
+      }
+      try {
+        liveSession = await startLiveAnalysis();
+      } catch (err) {
+        console.error('Error iniciando la grabación:', err);
+        showAlert('No se pudo acceder al micrófono: ' + err.message);
+        liveSession = null;
+        setLiveState('idle');
+      }
+    };
+  }
+
+  async function startLiveAnalysis() {
+    const stream = await navigator.mediaDevices.getUserMedia({
+      audio: { channelCount: 1, echoCancellation: false, noiseSuppression: false }
+    });
+    const ctx = new AudioContext();
+    const workletUrl = URL.createObjectURL(new Blob([PCM_WORKLET], { type: 'application/javascript' }));
+    await ctx.audioWorklet.addModule(workletUrl);
+    URL.revokeObjectURL(workletUrl);
+    const source = ctx.createMediaStreamSource(stream);
+    const node = new AudioWorkletNode(ctx, 'pcm-capture', { numberOfOutputs: 0 });
+
+    const params = {
+      reportId,
+      level: levelSelect.value,
+      sublevel: document.getElementById('subSelect').value,
+      sessionNumber: Number(sessionInput.value),
+      word: wordSelect.value,
+      sampleRate: ctx.sampleRate
+    };
+    const result = { reportId, sessionNumber: params.sessionNumber, word: params.word };
+    let shown = 0;
+    let finished = false;
+
+    const protocol = location.protocol === 'https:' ? 'wss' : 'ws';
+    const ws = new WebSocket(`${protocol}://${location.host}/analyze/live`);
+    ws.binaryType = 'arraybuffer';
+
+    const stopCapture = () => {
+      node.port.onmessage = null;
+      source.disconnect();
+      stream.getTracks().forEach(track => track.stop());
+      if (ctx.state !== 'closed') ctx.close();
+    };
+
+    const stop = () => {
+      stopCapture();
+      setLiveState('processing');
+      if (ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({ type: 'stop' }));
+      }
+    };
+
+    const finish = () => {
+      finished = true;
+      stopCapture();
+      liveSession = null;
+      setLiveState('idle');
+    };
+
+    ws.onopen = () => ws.send(JSON.stringify(params));
+    ws.onmessage = event => {
+      const msg = JSON.parse(event.data);
+      if (msg.type === 'ready') {
+        node.port.onmessage = e => {
+          if (ws.readyState === WebSocket.OPEN) ws.send(e.data);
+        };
+        source.connect(node);
+        setLiveState('recording');
+        updateWizard(3);
+        startResultGroup();
+      } else if (msg.type === 'repetition') {
+        appendRepetitionRow(result, msg.repetition, shown++);
+      } else if (msg.type === 'limit') {
+        showAlert(msg.reason === 'idle'
+          ? `La grabación se detuvo: no llegó audio en ${msg.idleSeconds} s`
+          : `Se alcanzó la duración máxima de la grabación (${msg.maxSeconds} s)`, 'warning');
+        stop();
+      } else if (msg.type === 'done') {
+        finish();
+        if (msg.status === 200) {
+          appendResultSummary(msg.result);
+          updateWizard(4);
+          finishBtn.style.display = 'inline-block';
+          showAlert('Análisis completado correctamente', 'success');
+        } else {
+          showAlert('Error: ' + (msg.error || `código ${msg.status}`));
+          updateWizard(2);
+        }
+        ws.close();
+      }
+    };
+    ws.onclose = () => {
+      if (!finished) {
+        finish();
+        showAlert('Se perdió la conexión con el servidor durante la grabación.');
+        updateWizard(2);
+      }
+    };
+
+    return { stop };
+  }
+
   // 5) Finalizar y descargar JSON maestro
   finishBtn.onclick = async () => {
     if (!reportId) {
@@ -512,6 +787,16 @@ document.addEventListener('DOMContentLoaded', () => {
       finishBtn.disabled = true;
       finishBtn.textContent = '🔥 Descargando...';
       
+      // Marcar el reporte como completado (GET /report sólo lo lee)
+      const fin = await fetch(`/finalize/${reportId}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: '{}'
+      });
+      if (!fin.ok) {
+        throw new Error('Error al finalizar el reporte');
+      }
+      
       const res = await fetch(`/report/${reportId}`);
       if (!res.ok) {
         throw new Error('Error al obtener el reporte');
@@ -430,17 +430,9 @@
     elements.loading.style.display = 'block';
     
     try {
-      const response = await fetch('/analyze', {
-        method: 'POST',
-        body: formData
-      });
-      
-      if (!response.ok) {
-        const errorText = await response.text();
-        throw new Error(errorText);
-      }
-      
-      const data = await response.json();
+      const upload = await prepareUpload(elements.audioInput.files[0]);
+      formData.set('audio', upload, upload.name);
+      const data = await postAnalysis(formData);
       console.log('Resultado del análisis:', data.result);
       
       addResultsToTable(data.result);
@@ -463,6 +455,116 @@
     }
   }
 
+  // Before uploading, the audio is decoded in the browser, mixed down to mono and
+  // resampled to 16 kHz (the analysis rate): a 16-bit WAV takes 32 kB/s instead of
+  // ~190 kB/s for 48 kHz stereo, and the server skips resampling. When the browser
+  // supports it the WAV is also gzipped (lossless; the silence between repetitions
+  // compresses well). With data-client-encode="false" on the form, or if anything
+  // fails, the original file is uploaded.
+  const UPLOAD_SR = 16000;
+  const UPLOAD_MAX_DECODE_BYTES = 200 * 1024 * 1024;  // larger: decoding it all in memory is not worth it
+
+  async function prepareUpload(file) {
+    const OfflineCtx = window.OfflineAudioContext || window.webkitOfflineAudioContext;
+    if (elements.analyzeForm.dataset.clientEncode === 'false' || !OfflineCtx || file.size > UPLOAD_MAX_DECODE_BYTES) {
+      return file;
+    }
+    try {
+      const t0 = performance.now();
+      // decodeAudioData resamples to the context rate; rendering to one channel
+      // mixes the channels down to mono
+      const decoded = await new OfflineCtx(1, 1, UPLOAD_SR).decodeAudioData(await file.arrayBuffer());
+      const ctx = new OfflineCtx(1, Math.max(1, Math.ceil(decoded.duration * UPLOAD_SR)), UPLOAD_SR);
+      const source = ctx.createBufferSource();
+      source.buffer = decoded;
+      source.connect(ctx.destination);
+      source.start();
+      const rendered = await ctx.startRendering();
+
+      let blob = encodeWav(rendered.getChannelData(0), UPLOAD_SR);
+      let name = file.name.replace(/\.[^.]*$/, '') + '.wav';
+      if (window.CompressionStream) {
+        const compressed = await new Response(blob.stream().pipeThrough(new CompressionStream('gzip'))).blob();
+        if (compressed.size < blob.size) {
+          blob = compressed;
+          name += '.gz';
+        }
+      }
+      console.log(`Audio prepared in ${Math.round(performance.now() - t0)} ms: ${file.size} -> ${blob.size} bytes`);
+      return blob.size < file.size ? new File([blob], name, { type: blob.type || 'application/gzip' }) : file;
+    } catch (error) {
+      console.warn('Could not prepare the audio in the browser; uploading the original:', error);
+      return file;
+    }
+  }
+
+  // 16-bit PCM WAV, mono
+  function encodeWav(samples, sampleRate) {
+    const view = new DataView(new ArrayBuffer(44 + samples.length * 2));
+    const writeString = (offset, text) => {
+      for (let i = 0; i < text.length; i++) view.setUint8(offset + i, text.charCodeAt(i));
+    };
+    writeString(0, 'RIFF');
+    view.setUint32(4, 36 + samples.length * 2, true);
+    writeString(8, 'WAVE');
+    writeString(12, 'fmt ');
+    view.setUint32(16, 16, true);              // fmt chunk size
+    view.setUint16(20, 1, true);               // PCM
+    view.setUint16(22, 1, true);               // mono
+    view.setUint32(24, sampleRate, true);
+    view.setUint32(28, sampleRate * 2, true);  // bytes per second
+    view.setUint16(32, 2, true);               // bytes per sample
+    view.setUint16(34, 16, true);              // bits per sample
+    writeString(36, 'data');
+    view.setUint32(40, samples.length * 2, true);
+    for (let i = 0; i < samples.length; i++) {
+      const s = Math.max(-1, Math.min(1, samples[i]));
+      view.setInt16(44 + i * 2, s < 0 ? s * 0x8000 : s * 0x7fff, true);
+    }
+    return new Blob([view.buffer], { type: 'audio/wav' });
+  }
+
+  // Sends the form to /analyze. With data-async="true" on the form it uses the
+  // async mode: gets a jobId back and polls /jobs/<id>, showing per-segment progress.
+  async function postAnalysis(formData) {
+    const useAsync = elements.analyzeForm.dataset.async === 'true';
+    const response = await fetch(useAsync ? '/analyze?async=1' : '/analyze', {
+      method: 'POST',
+      body: formData
+    });
+    
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(errorText);
+    }
+    
+    const data = await response.json();
+    return useAsync ? waitForJob(data.jobId) : data;
+  }
+
+  async function waitForJob(jobId) {
+    const subtitle = elements.loading.querySelector('.loading-subtitle');
+    const defaultSubtitle = subtitle ? subtitle.textContent : '';
+    try {
+      while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const response = await fetch(`/jobs/${jobId}`);
+        if (!response.ok) {
+          throw new Error(await response.text());
+        }
+        const job = await response.json();
+        const progress = job.progress || {};
+        if (subtitle && progress.segmentsTotal !== undefined) {
+          subtitle.textContent = `Segmentos transcritos: ${progress.segmentsTranscribed || 0}/${progress.segmentsTotal} · analizados: ${progress.segmentsAnalyzed || 0}/${progress.segmentsTotal}`;
+        }
+        if (job.status === 'done') return job.result;
+        if (job.status === 'failed') throw new Error(JSON.stringify(job.result));
+      }
+    } finally {
+      if (subtitle) subtitle.textContent = defaultSubtitle;
+    }
+  }
+
   async function downloadReport() {
     if (!reportId) {
       showAlert('No hay reporte para descargar');
@@ -473,6 +575,16 @@
       elements.finishBtn.disabled = true;
       elements.finishBtn.textContent = '📥 Descargando...';
       
+      // Mark the report as completed (GET /report only reads it)
+      const finalized = await fetch(`/finalize/${reportId}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: '{}'
+      });
+      if (!finalized.ok) {
+        throw new Error('Error al finalizar el reporte');
+      }
+      
       const response = await fetch(`/report/${reportId}`);
       if (!response.ok) {
         throw new Error('Error al obtener el reporte');
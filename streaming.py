@@ -0,0 +1,302 @@
+"""Decodificación y segmentación por bloques para subidas largas.
+
+En lugar de cargar toda la grabación en memoria, `stream_segments` la lee por
+bloques con soundfile, la pasa a mono y la remuestrea a 16 kHz en streaming
+(soxr), calcula la energía por trama en línea (`FrameEnergy`) y la segmenta con
+`OnlineSegmenter`. Las muestras a 16 kHz se vuelcan a un fichero temporal, así
+que la memoria máxima depende del bloque y del segmento más largo, no de la
+duración del fichero.
+
+`librosa.effects.split` usa como referencia el máximo RMS de toda la señal, que
+no se conoce hasta el final. Por eso se hacen dos pasadas: la primera decodifica
+y mide la energía, y la segunda recorre la energía ya medida y entrega cada
+segmento (leído del fichero temporal) en cuanto se cierra. Los límites coinciden
+con `split(top_db, frame_length, hop_length)` sobre la misma señal.
+
+`LiveSegmenter` segmenta un flujo en vivo (el micrófono del navegador), en el que
+no hay segunda pasada: ver su docstring.
+"""
+import os
+import tempfile
+from collections import deque
+
+import numpy as np
+import soundfile as sf
+import soxr
+import librosa
+
+from features import noise_floor, speech_frames
+
+
+class FrameEnergy:
+    """RMS por trama calculado en línea, como `librosa.feature.rms(y, center=True)`.
+
+    Se alimenta con bloques consecutivos (`push`) y devuelve el RMS de las tramas
+    que ya están completas; `finish` añade el relleno final y devuelve el resto.
+    """
+
+    def __init__(self, frame_length=2048, hop_length=512):
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self._buffer = np.zeros(frame_length // 2, dtype=np.float32)  # relleno inicial (center=True)
+
+    def _drain(self):
+        n = 0 if len(self._buffer) < self.frame_length else 1 + (len(self._buffer) - self.frame_length) // self.hop_length
+        if n == 0:
+            return np.zeros(0, dtype=np.float32)
+        frames = librosa.util.frame(self._buffer, frame_length=self.frame_length, hop_length=self.hop_length, axis=0)
+        rms = np.sqrt(np.mean(np.abs(frames[:n]) ** 2, axis=1))
+        self._buffer = self._buffer[n * self.hop_length:]
+        return rms
+
+    def push(self, block):
+        self._buffer = np.concatenate([self._buffer, np.asarray(block, dtype=np.float32)])
+        return self._drain()
+
+    def finish(self):
+        return self.push(np.zeros(self.frame_length // 2, dtype=np.float32))
+
+
+class OnlineSegmenter:
+    """Convierte un flujo de RMS por trama en intervalos de voz, como `librosa.effects.split`.
+
+    `ref` es el RMS de referencia (0 dB): una trama es voz si está a menos de
+    `top_db` dB de él. `push` devuelve los intervalos (en muestras) que se cierran
+    con esas tramas; `finish(n_samples)` cierra el que quede abierto.
+    """
+
+    def __init__(self, ref, top_db=20, hop_length=512):
+        self.threshold = ref * 10.0 ** (-top_db / 20.0)
+        self.ref = ref
+        self.top_db = top_db
+        self.hop_length = hop_length
+        self.frame = 0
+        self.start = None
+
+    def _is_voice(self, rms):
+        db = librosa.amplitude_to_db(rms, ref=self.ref, top_db=None)
+        return db > -self.top_db
+
+    def push(self, rms):
+        closed = []
+        for voiced in self._is_voice(np.asarray(rms)):
+            if voiced and self.start is None:
+                self.start = self.frame
+            elif not voiced and self.start is not None:
+                closed.append((self.start * self.hop_length, self.frame * self.hop_length))
+                self.start = None
+            self.frame += 1
+        return closed
+
+    def finish(self, n_samples):
+        closed = []
+        if self.start is not None:
+            closed.append((self.start * self.hop_length, min(self.frame * self.hop_length, n_samples)))
+            self.start = None
+        return [(start, min(end, n_samples)) for start, end in closed]
+
+
+class LiveSegmenter:
+    """Segmentación en vivo de un flujo de audio mono a `sr`, sin conocer su final.
+
+    Sin segunda pasada no hay máximo global: la referencia es el máximo RMS visto
+    hasta el momento (nunca menor que `min_ref`, para que el ruido del principio no
+    cuente como voz). Un intervalo se cierra tras `min_silence` segundos seguidos de
+    silencio, no en la primera trama silenciosa, para no partir una repetición en
+    una pausa breve; y como mucho dura `max_seconds`. Sólo se guarda el audio desde
+    el inicio del intervalo abierto. Si el audio llega a otra frecuencia
+    (`input_sr`), se remuestrea en streaming a `sr`.
+
+    `push(bloque)` devuelve los segmentos que se cierran, como `(start, end, y_seg,
+    ruido)` igual que `stream_segments`; `finish()` cierra el que quede
+    abierto. El ruido de fondo se estima sobre las tramas sin voz de los últimos
+    `noise_seconds` segundos (None mientras no haya ninguna).
+    """
+
+    def __init__(self, sr=16000, top_db=20, frame_length=2048, hop_length=512,
+                 min_ref=0.01, min_silence=0.3, max_seconds=10.0, input_sr=None, noise_seconds=30.0):
+        self.sr = sr
+        self.resampler = None
+        if input_sr and input_sr != sr:
+            self.resampler = soxr.ResampleStream(input_sr, sr, 1, dtype='float32', quality='HQ')
+        self.top_db = top_db
+        self.hop_length = hop_length
+        self.energy = FrameEnergy(frame_length, hop_length)
+        self.min_silence_frames = max(1, int(round(min_silence * sr / hop_length)))
+        self.max_frames = max(1, int(max_seconds * sr / hop_length))
+        self.ref = min_ref
+        self.frame = 0          # siguiente trama de energía
+        self.start = None       # primera trama del intervalo abierto
+        self.last_voice = None  # última trama con voz del intervalo abierto
+        self.n_samples = 0
+        self._audio = np.zeros(0, dtype=np.float32)  # muestras desde _audio_offset
+        self._audio_offset = 0
+        self._rms = np.zeros(0, dtype=np.float32)    # tramas desde _rms_offset
+        self._rms_offset = 0
+        self._history = deque(maxlen=max(1, int(noise_seconds * sr / hop_length)))
+
+    def _segment(self, end_frame):
+        # Si la referencia subió después de abrirse el intervalo (p. ej. ruido de fondo
+        # antes de la primera repetición), se recortan las tramas iniciales que ya no
+        # superan el umbral
+        threshold = self.ref * 10.0 ** (-self.top_db / 20.0)
+        while self.start < self.last_voice and self._rms[self.start - self._rms_offset] <= threshold:
+            self.start += 1
+        start = self.start * self.hop_length
+        end = min(end_frame * self.hop_length, self.n_samples)
+        y_seg = self._audio[start - self._audio_offset:end - self._audio_offset].copy()
+        self.start = self.last_voice = None
+        return start, end, y_seg, noise_floor(np.fromiter(self._history, dtype=np.float32))
+
+    def _process(self, rms):
+        self._rms = np.concatenate([self._rms, rms])
+        closed = []
+        ratio = 10.0 ** (-self.top_db / 20.0)
+        for value in rms:
+            self.ref = max(self.ref, float(value))
+            if value > self.ref * ratio:
+                if self.start is None:
+                    self.start = self.frame
+                self.last_voice = self.frame
+            else:
+                self._history.append(value)
+            if self.start is not None:
+                if self.frame - self.last_voice >= self.min_silence_frames:
+                    closed.append(self._segment(self.last_voice + 1))
+                elif self.frame - self.start >= self.max_frames:
+                    closed.append(self._segment(self.frame))
+            self.frame += 1
+        return closed
+
+    def _trim(self):
+        keep = self.start if self.start is not None else self.frame
+        drop = keep * self.hop_length - self._audio_offset
+        if drop > 0:
+            self._audio = self._audio[drop:]
+            self._audio_offset += drop
+        drop = keep - self._rms_offset
+        if drop > 0:
+            self._rms = self._rms[drop:]
+            self._rms_offset += drop
+
+    def push(self, block, last=False):
+        block = np.asarray(block, dtype=np.float32)
+        if self.resampler is not None:
+            block = self.resampler.resample_chunk(block, last=last)
+        self._audio = np.concatenate([self._audio, block])
+        self.n_samples += len(block)
+        closed = self._process(self.energy.push(block))
+        self._trim()
+        return closed
+
+    def finish(self):
+        closed = self.push(np.zeros(0, dtype=np.float32), last=True) if self.resampler is not None else []
+        closed += self._process(self.energy.finish())
+        if self.start is not None:
+            closed.append(self._segment(self.frame))
+        self._trim()
+        return closed
+
+
+def is_canonical(path, sr=16000):
+    """True si el fichero ya es mono a `sr` (p. ej. el WAV que prepara el navegador)."""
+    try:
+        info = sf.info(path)
+    except Exception:
+        return False
+    return info.samplerate == sr and info.channels == 1
+
+
+def audio_duration(path):
+    """Duración en segundos según la cabecera, sin decodificar.
+
+    Si soundfile no lee el formato (m4a, webm...) se pregunta a audioread, que es lo
+    que usará `librosa.load` para decodificarlo. None si ninguno de los dos lo lee.
+    """
+    try:
+        return sf.info(path).duration
+    except Exception:
+        pass
+    try:
+        return librosa.get_duration(path=path)
+    except Exception:
+        return None
+
+
+def decode_file(path, sr=16000, canonical=None):
+    """Señal mono float32 a `sr` del fichero completo, como `librosa.load(path, sr=sr)`.
+
+    Si ya está en el formato canónico se lee tal cual con soundfile, sin pasar por
+    el remuestreo ni la mezcla de canales de librosa.
+    """
+    if canonical is None:
+        canonical = is_canonical(path, sr)
+    if canonical:
+        y, _ = sf.read(path, dtype='float32')
+        return y, sr
+    return librosa.load(path, sr=sr)
+
+
+def stream_decode(path, sr=16000, block_seconds=10.0):
+    """Bloques mono float32 remuestreados a `sr`, leyendo el fichero poco a poco.
+
+    Lanza `soundfile.LibsndfileError`/`RuntimeError` si soundfile no puede abrirlo.
+    """
+    info = sf.info(path)
+    blocksize = max(1, int(block_seconds * info.samplerate))
+    resampler = None
+    if info.samplerate != sr:
+        resampler = soxr.ResampleStream(info.samplerate, sr, 1, dtype='float32', quality='HQ')
+
+    blocks = sf.blocks(path, blocksize=blocksize, dtype='float32', always_2d=True)
+    block = next(blocks, None)
+    while block is not None:
+        following = next(blocks, None)
+        mono = block.mean(axis=1, dtype=np.float32) if block.shape[1] > 1 else block[:, 0]
+        if resampler is not None:
+            mono = resampler.resample_chunk(mono, last=following is None)
+        yield mono
+        block = following
+
+
+def stream_segments(path, sr=16000, top_db=20, frame_length=2048, hop_length=512, spool_dir=None,
+                    block_seconds=10.0):
+    """Genera `(start, end, y_seg, ruido)` por cada intervalo de voz, en orden.
+
+    `start`/`end` son muestras a `sr`; `y_seg` es una copia del segmento y `ruido` el
+    ruido de fondo de la grabación fuera de los segmentos (`features.noise_floor`;
+    None si no queda nada fuera). Las tramas de cada segmento se calculan aparte
+    (`FeatureFrames(y_seg)`), como en `FeatureFrames.segment`. El audio se decodifica
+    en bloques de `block_seconds` segundos.
+    """
+    energy = FrameEnergy(frame_length, hop_length)
+    rms_parts = []
+    n_samples = 0
+    fd, spool = tempfile.mkstemp(dir=spool_dir, prefix='stream_', suffix='.f32')
+    try:
+        # 1ª pasada: decodificar, volcar a disco y medir la energía
+        with os.fdopen(fd, 'wb') as out:
+            for block in stream_decode(path, sr, block_seconds):
+                block.astype(np.float32, copy=False).tofile(out)
+                n_samples += len(block)
+                rms_parts.append(energy.push(block))
+        rms_parts.append(energy.finish())
+        rms = np.concatenate(rms_parts)
+        if n_samples == 0 or not len(rms):
+            return
+        floor = noise_floor(rms, speech_frames(rms, top_db))
+
+        # 2ª pasada: segmentar con la referencia global y entregar cada segmento al cerrarse
+        segmenter = OnlineSegmenter(ref=rms.max(), top_db=top_db, hop_length=hop_length)
+        chunk = 256
+        with open(spool, 'rb') as f:
+            for i in range(0, len(rms), chunk):
+                closed = segmenter.push(rms[i:i + chunk])
+                if i + chunk >= len(rms):
+                    closed += segmenter.finish(n_samples)
+                for start, end in closed:
+                    end = min(end, n_samples)
+                    y_seg = np.fromfile(f, dtype=np.float32, count=end - start, offset=start * 4 - f.tell())
+                    yield start, end, y_seg, floor
+    finally:
+        os.remove(spool)
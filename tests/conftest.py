@@ -0,0 +1,29 @@
+"""Fixtures comunes: la app importada en una carpeta temporal, con un Wit.ai falso."""
+import os
+
+import pytest
+
+from benchmarks.fake_wit import FakeWitServer
+from benchmarks.synth import import_app
+
+
+@pytest.fixture(scope='session')
+def wit_server():
+    with FakeWitServer(delay=0.0) as wit:
+        yield wit
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory, wit_server):
+    """El módulo app, importado una vez por sesión con results/ y uploads/ temporales."""
+    os.environ['WIT_API_URL'] = wit_server.url
+    os.environ['WARMUP_ON_START'] = '0'
+    cwd = os.getcwd()
+    module = import_app(str(tmp_path_factory.mktemp('app')))
+    yield module
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,42 @@
+"""Autorización de las rutas de administración (/admin, /reports/export, /reports/rescore)."""
+import pytest
+
+
+@pytest.mark.parametrize('path', ['/admin/profiles', '/reports/export'])
+def test_denied_without_token(client, path):
+    assert client.get(path).status_code == 403
+
+
+@pytest.mark.parametrize('path', ['/admin/profiles', '/reports/export'])
+def test_localhost_only_with_explicit_opt_in(app_module, client, monkeypatch, path):
+    monkeypatch.setattr(app_module, 'ADMIN_ALLOW_LOCALHOST', True)
+    assert client.get(path).status_code == 200
+    assert client.get(path, environ_base={'REMOTE_ADDR': '10.0.0.7'}).status_code == 403
+
+
+def test_rescore_needs_authorization(app_module, client, monkeypatch):
+    assert client.post('/reports/rescore?dryRun=1').status_code == 403
+    monkeypatch.setattr(app_module, 'ADMIN_ALLOW_LOCALHOST', True)
+    assert client.post('/reports/rescore?dryRun=1').status_code == 200
+    assert client.post('/reports/rescore?dryRun=1', environ_base={'REMOTE_ADDR': '10.0.0.7'}).status_code == 403
+
+
+def test_token_is_required_when_set(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'secreto')
+    monkeypatch.setattr(app_module, 'ADMIN_ALLOW_LOCALHOST', True)
+    assert client.get('/admin/profiles').status_code == 403
+    assert client.get('/admin/profiles', headers={'X-Admin-Token': 'otro'}).status_code == 403
+    assert client.get('/admin/profiles', headers={'X-Admin-Token': 'secreto'}).status_code == 200
+
+
+def test_profile_header_needs_authorization(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'PROFILING_ENABLED', True)
+
+    def requested():
+        with app_module.app.test_request_context('/report/x', headers={'X-Profile': '1'},
+                                                 environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            return app_module.profile_requested()
+
+    assert not requested()
+    monkeypatch.setattr(app_module, 'ADMIN_ALLOW_LOCALHOST', True)
+    assert requested()
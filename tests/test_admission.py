@@ -0,0 +1,45 @@
+"""/analyze con el control de admisión saturado y con subidas que no se pueden medir."""
+import io
+
+from benchmarks.synth import make_repetitions, wav_bytes
+
+SR = 16000
+FIELDS = {'level': 'Level 1', 'sublevel': 'Vocales', 'sessionNumber': '1', 'word': 'a'}
+
+
+def new_report(client):
+    return client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+
+
+def post(client, rid, data, name='a.wav', query=''):
+    form = dict(FIELDS, reportId=rid, audio=(io.BytesIO(data), name))
+    return client.post(f'/analyze{query}', data=form, content_type='multipart/form-data')
+
+
+def test_saturated_accepts_async_from_the_form(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.admission, 'saturated', lambda: True)
+    rid = new_report(client)
+    audio = wav_bytes(make_repetitions(1, SR), SR)
+    assert post(client, rid, audio).status_code == 503
+    form = dict(FIELDS, reportId=rid, audio=(io.BytesIO(audio), 'a.wav'), **{'async': '1'})
+    resp = client.post('/analyze', data=form, content_type='multipart/form-data')
+    assert resp.status_code == 202, resp.get_json()
+    assert post(client, rid, audio, query='?async=1').status_code == 202
+
+
+def test_unmeasurable_upload_is_rejected(app_module, client, monkeypatch):
+    charged = []
+    monkeypatch.setattr(app_module, 'run_admitted', lambda seconds, *a, **kw: charged.append(seconds))
+    resp = post(client, new_report(client), b'\0\0\0\x18ftypM4A ' + b'\0' * 4000, name='a.m4a')
+    assert resp.status_code == 415
+    assert charged == []
+
+
+def test_unmeasurable_item_in_batch(client):
+    rid = new_report(client)
+    resp = client.post('/analyze/batch', data={
+        'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales', 'sessionNumber': '1',
+        'items': '[{"word": "a"}]', 'audio': [(io.BytesIO(b'no es audio' * 100), 'a.webm')],
+    }, content_type='multipart/form-data')
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    assert [item['status'] for item in resp.get_json()['items']] == [415]
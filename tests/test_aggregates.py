@@ -0,0 +1,78 @@
+"""Promedios incrementales (`RunningAverages`) frente al recálculo completo.
+
+Reportes aleatorios (niveles, subniveles, sesiones saltadas, palabras repetidas,
+eventos sin repeticiones, precisiones 0/100 enteras y decimales, compactaciones a
+mitad) con semilla fija: el reporte que materializa `ReportStore.load` tiene que
+ser idéntico, promedio a promedio y tipo a tipo, al mismo reporte con todos los
+promedios recalculados desde cero (`recalculate_report_averages`).
+"""
+import copy
+import random
+from collections import OrderedDict
+
+import pytest
+
+from benchmarks.bench_aggregates import WORDS, base_report, random_accuracy
+from report_store import SUBLEVEL_NUMBERS, ReportStore, recalculate_report_averages
+
+
+def random_event(rng):
+    return OrderedDict([
+        ("level", rng.choice(["Level 1", "Level 1", "Level 2"])),
+        ("sublevel", rng.choice(list(SUBLEVEL_NUMBERS))),
+        ("sessionNumber", rng.randint(1, 4)),
+        ("word", rng.choice(WORDS)),
+        ("repetitions", [OrderedDict([
+            ("pronunciationAccuracy", random_accuracy(rng)),
+            ("containsPronunciationSound", True),
+            ("pronunciationMatchesWord", rng.random() < 0.4),
+        ]) for _ in range(rng.choice([0, 1, 1, 2, 3, 5, 8]))]),
+    ])
+
+
+def first_difference(got, want, path=''):
+    """Ruta y valores de la primera diferencia entre dos JSON (None si son iguales, tipos incluidos)."""
+    if isinstance(want, dict) and isinstance(got, dict) and list(got) == list(want):
+        for key in want:
+            diff = first_difference(got[key], want[key], f"{path}/{key}")
+            if diff:
+                return diff
+        return None
+    if isinstance(want, list) and isinstance(got, list) and len(got) == len(want):
+        for i, (g, w) in enumerate(zip(got, want)):
+            diff = first_difference(g, w, f"{path}[{i}]")
+            if diff:
+                return diff
+        return None
+    if type(got) is type(want) and got == want:
+        return None
+    return f"{path or '/'}: incremental={got!r} recálculo={want!r}"
+
+
+def check_case(store, rid, rng):
+    """Un reporte aleatorio; devuelve None o la primera diferencia encontrada."""
+    store.create(rid, base_report(rid))
+    for _ in range(rng.randint(1, 40)):
+        store.append(rid, random_event(rng))
+        if rng.random() < 0.05:
+            store.compact(rid)
+    incremental = store.load(rid)
+    reference = copy.deepcopy(incremental)
+    recalculate_report_averages(reference)
+    diff = first_difference(incremental, reference)
+    if diff:
+        return diff
+    # Y al volver a leerlo tras guardarlo, sin diario, los promedios siguen ahí
+    store.compact(rid)
+    diff = first_difference(store.load(rid), reference)
+    return diff and f"tras compactar, {diff}"
+
+
+@pytest.mark.parametrize('compact_bytes', [2048, 10 ** 9])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_incremental_matches_recalculation(tmp_path, seed, compact_bytes):
+    rng = random.Random(seed)
+    store = ReportStore(str(tmp_path), compact_bytes=compact_bytes)
+    for i in range(60):
+        diff = check_case(store, f"caso{i:06d}", rng)
+        assert diff is None, f"semilla {seed}, caso {i}: {diff}"
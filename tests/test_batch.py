@@ -0,0 +1,49 @@
+"""/analyze/batch con un zip: nombres repetidos en carpetas y límite de tamaño."""
+import io
+import json
+import zipfile
+
+import pytest
+
+from benchmarks.synth import make_repetitions, wav_bytes
+
+SR = 16000
+
+
+def make_zip(entries):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+def test_same_name_in_different_folders(app_module, tmp_path):
+    archive = make_zip({'s1/a.wav': b'uno', 's2/a.wav': b'dos', 's2/e.wav': b'tres'})
+    files, manifest = app_module.extract_batch_archive(archive, str(tmp_path))
+    assert manifest is None
+    assert open(files['s1/a.wav'], 'rb').read() == b'uno'
+    assert open(files['s2/a.wav'], 'rb').read() == b'dos'
+    assert 'a.wav' not in files  # ambiguo: hace falta la ruta completa
+    assert files['e.wav'] == files['s2/e.wav']
+
+
+def test_archive_over_the_size_limit(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'BATCH_MAX_ARCHIVE_BYTES', 1000)
+    with pytest.raises(ValueError):
+        app_module.extract_batch_archive(make_zip({'a.wav': b'\0' * 600, 'b.wav': b'\0' * 600}), str(tmp_path))
+
+
+def test_batch_zip_by_full_path(client):
+    rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+    audio = {name: wav_bytes(make_repetitions(2, SR, seed=seed), SR) for seed, name in enumerate(['s1/a.wav', 's2/a.wav'])}
+    items = [{'word': 'a', 'file': 's1/a.wav'}, {'word': 'a', 'file': 's2/a.wav'}, {'word': 'a', 'file': 'a.wav'}]
+    archive = make_zip({'manifest.json': json.dumps(items), **audio})
+    resp = client.post('/analyze/batch', data={
+        'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales', 'sessionNumber': '1',
+        'archive': (archive, 'sesion.zip'),
+    }, content_type='multipart/form-data')
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    statuses = [item['status'] for item in resp.get_json()['items']]
+    assert statuses == [200, 200, 400]
@@ -0,0 +1,107 @@
+"""Extractores de F0 (`features.F0_EXTRACTORS`) sobre tonos y vocales sintéticos."""
+import librosa
+import numpy as np
+import pytest
+
+from benchmarks.synth import make_repetitions, make_vowel
+from features import FeatureFrames, f0_piptrack, parse_f0_method, voice_metrics
+
+SR = 16000
+
+# Tolerancias entre piptrack y autocorr: F0 media dentro del 1 % (y de la F0 real),
+# jitter a menos de 0,005 de diferencia. El shimmer sale del RMS, común a los dos.
+F0_TOLERANCE = 0.01
+JITTER_TOLERANCE = 0.005
+# Tolerancia relativa entre la F0 vectorizada (y sus medidas) y el bucle por trama
+# original: sólo redondeo de coma flotante, hoy salen idénticas
+BASELINE_TOLERANCE = 1e-9
+
+
+def tone(f0):
+    """Un segundo de tono con armónicos, vibrato y algo de ruido (benchmarks.synth)."""
+    y = make_repetitions(n=1, sr=SR, tone_s=1.0, gap_s=0.0, f0=f0, noise=0.005)
+    return FeatureFrames(y, SR)
+
+
+# piptrack se queda con el armónico de mayor magnitud: por debajo de ~150 Hz (con
+# tramas de 2048 muestras) y en vocales con formantes altos da el segundo armónico,
+# así que se compara en tonos de 160 a 400 Hz.
+@pytest.mark.parametrize('f0', [160, 200, 220, 250, 300, 350, 400])
+def test_piptrack_and_autocorr_agree_on_tones(f0):
+    frames = tone(f0)
+    pip = voice_metrics(frames, 'piptrack')
+    acf = voice_metrics(frames, 'autocorr')
+
+    assert pip[0] == pytest.approx(f0, rel=F0_TOLERANCE)
+    assert acf[0] == pytest.approx(f0, rel=F0_TOLERANCE)
+    assert acf[0] == pytest.approx(pip[0], rel=F0_TOLERANCE)
+    assert abs(acf[1] - pip[1]) < JITTER_TOLERANCE
+    assert acf[2] == pip[2]
+
+
+@pytest.mark.parametrize('vowel', 'aeiou')
+@pytest.mark.parametrize('f0', [100, 180, 300])
+def test_autocorr_without_octave_errors_on_vowels(vowel, f0):
+    y = make_vowel(vowel, sr=SR, dur_s=1.0, f0=f0)
+    meanF0, jitter, _ = voice_metrics(FeatureFrames(y, SR), 'autocorr')
+    assert meanF0 == pytest.approx(f0, rel=F0_TOLERANCE)
+    assert jitter < 0.02
+
+
+def test_silence_has_no_voice_metrics():
+    frames = FeatureFrames(np.zeros(SR, dtype=np.float32), SR)
+    assert voice_metrics(frames, 'autocorr') == (None, None, None)
+
+
+def test_parse_f0_method():
+    assert parse_f0_method(' AutoCorr ') == 'autocorr'
+    with pytest.raises(ValueError):
+        parse_f0_method('pitchtrack')
+
+
+@pytest.mark.parametrize('bounds', [None, (1536, 2236), (5120, 7120), (100, 9000), (2560, -7)])
+def test_segment_matches_separate_framing(bounds):
+    """`FeatureFrames.segment` da las mismas tramas (y medidas) que enmarcar el segmento aparte."""
+    y = make_repetitions(n=6, sr=SR, tone_s=0.6, gap_s=0.05, noise=0.01)
+    frames = FeatureFrames(y, SR)
+    intervals = [tuple(interval) for interval in frames.split(top_db=20)]
+    if bounds:
+        intervals = [(bounds[0], bounds[1] % len(y))]
+    for start, end in intervals:
+        seg, alone = frames.segment(start, end), FeatureFrames(y[start:end], SR)
+        np.testing.assert_array_equal(seg.rms, alone.rms)
+        np.testing.assert_array_equal(seg.magnitude, alone.magnitude)
+        for method in ('piptrack', 'autocorr'):
+            assert voice_metrics(seg, method) == voice_metrics(alone, method)
+
+
+def baseline_voice_metrics(y, sr):
+    """La versión original: piptrack sobre la señal y un bucle por trama (F0 y medidas)."""
+    pitches, magnitudes = librosa.piptrack(y=y, sr=sr, threshold=0.1)
+    pitch_values = []
+    for t in range(pitches.shape[1]):
+        index = magnitudes[:, t].argmax()
+        pitch = pitches[index, t]
+        if pitch > 0:
+            pitch_values.append(pitch)
+    pitch_values = np.array(pitch_values)
+    periods = 1.0 / pitch_values
+    jitter = float(np.std(np.diff(periods)) / np.mean(periods))
+    rms = librosa.feature.rms(y=y, frame_length=2048, hop_length=512)[0]
+    shimmer = float(np.std(np.diff(rms)) / np.mean(rms))
+    return pitch_values, (float(np.mean(pitch_values)), jitter, shimmer)
+
+
+@pytest.mark.parametrize('kind', ['tono', *'aeiou'])
+@pytest.mark.parametrize('f0', [100, 180, 300])
+def test_piptrack_matches_per_frame_baseline(kind, f0):
+    """`f0_piptrack` y `voice_metrics` dan lo mismo que el bucle por trama de antes."""
+    if kind == 'tono':
+        y = make_repetitions(n=2, sr=SR, tone_s=0.6, gap_s=0.3, f0=f0, noise=0.005)
+    else:
+        y = make_vowel(kind, sr=SR, f0=f0)
+    frames = FeatureFrames(y, SR)
+    pitch_values, metrics = baseline_voice_metrics(y, SR)
+
+    np.testing.assert_allclose(f0_piptrack(frames), pitch_values, rtol=BASELINE_TOLERANCE)
+    assert voice_metrics(frames, 'piptrack') == pytest.approx(metrics, rel=BASELINE_TOLERANCE)
@@ -0,0 +1,60 @@
+"""Trabajos asíncronos: procesos muertos y /jobs/<id>/events."""
+import json
+import subprocess
+import sys
+import time
+
+from jobs import JobManager
+from report_store import save_json
+
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    return proc.pid
+
+
+def test_jobs_of_a_dead_process_are_marked_failed(tmp_path):
+    import socket
+
+    save_json(str(tmp_path / 'ab12.json'), {
+        "jobId": "ab12", "status": "running", "progress": {}, "created": "",
+        "owner": {"host": socket.gethostname(), "pid": dead_pid(), "process": "x"},
+    })
+    manager = JobManager(str(tmp_path), max_workers=1)
+    job = manager.get('ab12')
+    assert job["status"] == "failed" and job["httpStatus"] == 500
+
+
+def test_jobs_of_this_process_are_left_alone(tmp_path):
+    manager = JobManager(str(tmp_path), max_workers=1)
+
+    def slow(progress):
+        time.sleep(0.3)
+        return {"ok": True}, 200
+
+    job_id = manager.submit(slow)
+    assert JobManager(str(tmp_path), max_workers=1).get(job_id)["status"] in ("queued", "running")
+    manager.pool.shutdown(wait=True)
+    assert manager.get(job_id)["status"] == "done"
+
+
+def events(resp):
+    return [line for line in resp.get_data(as_text=True).split('\n\n') if line]
+
+
+def test_job_events_stream_is_capped(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'JOB_EVENTS_MAX_SECONDS', 0.5)
+    job_id = app_module.analysis_jobs.submit(lambda progress: (time.sleep(2), ({}, 200))[1])
+    t0 = time.monotonic()
+    chunks = events(client.get(f'/jobs/{job_id}/events'))
+    assert time.monotonic() - t0 < 1.5
+    assert chunks[-1] == f'retry: {app_module.JOB_EVENTS_RETRY_MS}'
+    assert json.loads(chunks[0][len('data: '):])["jobId"] == job_id
+
+
+def test_job_events_end_with_the_result(app_module, client):
+    job_id = app_module.analysis_jobs.submit(lambda progress: ({"ok": True}, 200))
+    chunks = events(client.get(f'/jobs/{job_id}/events'))
+    last = json.loads(chunks[-1][len('data: '):])
+    assert last["status"] == "done" and last["result"] == {"ok": True}
@@ -0,0 +1,41 @@
+"""/analyze/live: un cliente que deja de enviar audio no retiene el hilo."""
+import time
+
+from metrics import Trace
+
+
+class SilentSocket:
+    """WebSocket falso: cada `receive` espera y devuelve `chunk` (None: nada recibido)."""
+
+    def __init__(self, chunk=None, wait=0.01):
+        self.chunk, self.wait = chunk, wait
+
+    def receive(self, timeout=None):
+        time.sleep(self.wait)
+        return self.chunk
+
+
+def run_live(app_module, client, ws):
+    rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+    sent = []
+    trace = Trace('analyze_live', reportId=rid)
+    t0 = time.monotonic()
+    body, status = app_module.run_live_analysis(ws, sent.append, rid, 'Level 1', 'Vocales', 1, 'a', 16000, trace)
+    return body, status, sent, time.monotonic() - t0
+
+
+def test_idle_client_is_closed(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'LIVE_IDLE_SECONDS', 0.3)
+    body, status, sent, elapsed = run_live(app_module, client, SilentSocket())
+    assert elapsed < 5
+    assert {"type": "limit", "reason": "idle", "idleSeconds": 0.3} in sent
+    assert status == 400  # nada recibido: sin pronunciaciones
+
+
+def test_trickling_client_hits_the_deadline(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'LIVE_IDLE_SECONDS', 0.3)
+    monkeypatch.setattr(app_module, 'LIVE_MAX_SECONDS', 0.5)
+    # Una muestra cada 10 ms: nunca está inactivo ni llega a 0,5 s de audio
+    body, status, sent, elapsed = run_live(app_module, client, SilentSocket(b'\0\0'))
+    assert elapsed < 5
+    assert [m.get('reason') for m in sent if m.get('type') == 'limit'] == ['deadline']
@@ -0,0 +1,27 @@
+"""Caché de las métricas acústicas por segmento (`app.measure_segment`)."""
+import numpy as np
+
+from benchmarks.synth import make_repetitions
+from features import FeatureFrames
+
+SR = 16000
+
+
+def test_cached_metrics_do_not_depend_on_the_neighbours(app_module):
+    """La clave es sólo el PCM: el mismo segmento entre vecinos distintos mide lo mismo."""
+    tone = make_repetitions(n=1, sr=SR, tone_s=0.8, gap_s=0.0, seed=3)
+    measures = []
+    for neighbour in (np.zeros(SR // 2), 0.5 * np.ones(SR // 2)):
+        y = np.concatenate([neighbour, tone, neighbour]).astype(np.float32)
+        start = len(neighbour)
+        seg = FeatureFrames(y, SR).segment(start, start + len(tone))
+        measures.append(app_module.analyze_audio(seg.y, SR, 'piptrack', frames=seg))
+    assert measures[0] == measures[1]
+    assert app_module.measure_segment(FeatureFrames(tone, SR), 'piptrack') == measures[0]
+
+
+def test_failures_are_not_cached(app_module):
+    entries = app_module.analysis_cache.stats()["entries"]
+    silence = FeatureFrames(np.zeros(SR, dtype=np.float32), SR)
+    assert app_module.measure_segment(silence, 'piptrack') == (None, None, None)
+    assert app_module.analysis_cache.stats()["entries"] == entries
@@ -0,0 +1,54 @@
+"""Filtro de calidad: ruido de fondo, umbrales por defecto y un clip ya recortado."""
+import io
+
+import pytest
+
+from benchmarks.synth import make_repetitions, make_vowel, wav_bytes
+from features import FeatureFrames, noise_floor, segment_quality
+from quality import DEFAULTS, QualityGate
+
+SR = 16000
+
+
+def trimmed_vowel():
+    """Un segundo de «a» sin silencio alrededor: todas las tramas son voz."""
+    return make_vowel('a', sr=SR, dur_s=2.0)[SR // 2:SR // 2 + SR]
+
+
+def test_noise_floor_uses_only_frames_outside_speech():
+    y = make_repetitions(n=4, sr=SR, tone_s=0.5, gap_s=0.5, noise=0.001)
+    frames = FeatureFrames(y, SR)
+    floor = noise_floor(frames.rms, frames.speech(top_db=20))
+    assert floor == pytest.approx(0.001, rel=0.5)
+
+    frames = FeatureFrames(trimmed_vowel(), SR)
+    assert frames.speech(top_db=20).all()
+    assert noise_floor(frames.rms, frames.speech(top_db=20)) is None
+    assert segment_quality(frames, None)[2] is None
+
+
+def test_default_gate_only_checks_duration_and_pitch():
+    gate = QualityGate.parse('')
+    assert [k for k, v in gate.thresholds.items() if v is not None] == ['min_seconds']
+    # Largo, saturado, poco sonoro y sin SNR: sólo la F0 o la duración lo descartan
+    assert gate.reject_reason((30.0, 0.05, -3.0, 0.5), meanF0=200.0) is None
+    assert gate.reject_reason((30.0, 0.05, None, 0.5), meanF0=None) == 'no_pitch'
+    assert gate.reject_reason((0.2, 1.0, 20.0, 0.0), meanF0=200.0) == 'too_short'
+
+    strict = QualityGate.parse('min_snr_db=6,max_clipping=0.01')
+    assert strict.reject_reason((1.0, 1.0, 3.0, 0.0), meanF0=200.0) == 'low_snr'
+    assert strict.reject_reason((1.0, 1.0, None, 0.0), meanF0=200.0) is None
+    assert set(DEFAULTS) == set(strict.thresholds)
+
+
+@pytest.mark.parametrize('spec', ['', 'min_snr_db=6'])
+def test_trimmed_voiced_clip_is_scored(app_module, client, monkeypatch, spec):
+    monkeypatch.setattr(app_module, 'quality_gate_vocales', QualityGate.parse(spec))
+    rid = client.post('/start', json={'patientDetails': {}, 'medicalDetails': {}}).get_json()['reportId']
+    resp = client.post('/analyze', data={
+        'audio': (io.BytesIO(wav_bytes(trimmed_vowel(), SR)), 'a.wav'),
+        'reportId': rid, 'level': 'Level 1', 'sublevel': 'Vocales', 'sessionNumber': '1', 'word': 'a',
+    }, content_type='multipart/form-data')
+    body = resp.get_json()
+    assert resp.status_code == 200, body
+    assert not body.get('rejectedSegments')
@@ -0,0 +1,124 @@
+"""ReportStore: diario de repeticiones, compactación y recuperación tras un fallo."""
+import os
+from collections import OrderedDict
+
+import pytest
+
+from report_store import ReportStore
+
+
+def base_report(rid):
+    return OrderedDict([
+        ("reportDetails", OrderedDict([("reportId", rid), ("reportStatus", "in_progress")])),
+        ("reports", OrderedDict([("games", OrderedDict([("expresatea", OrderedDict([
+            ("levels", OrderedDict([("Level 1", OrderedDict([("sublevels", OrderedDict())]))])),
+        ]))]))])),
+    ])
+
+
+def event(word, accuracy=100):
+    return OrderedDict([
+        ("level", "Level 1"), ("sublevel", "Vocales"), ("sessionNumber", 1), ("word", word),
+        ("repetitions", [OrderedDict([
+            ("pronunciationAccuracy", accuracy),
+            ("containsPronunciationSound", True),
+            ("pronunciationMatchesWord", accuracy >= 50),
+        ])]),
+    ])
+
+
+def repetitions(report):
+    """`{palabra: número de repeticiones}` del reporte materializado."""
+    session = report["reports"]["games"]["expresatea"]["levels"]["Level 1"]["sublevels"]["Vocales"]["sessions"][0]
+    return {w["word"]: len(w["repetitions"]) for w in session["words"]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ReportStore(str(tmp_path), compact_bytes=10 ** 9)
+    store.create("r1", base_report("r1"))
+    return store
+
+
+def crash_before_removing_journal(monkeypatch, store):
+    """Hace que `save` muera justo después de escribir el base, con el diario aún en disco."""
+    remove = os.remove
+
+    def crash(path):
+        if path == store.journal_path("r1"):
+            raise KeyboardInterrupt("proceso muerto")
+        remove(path)
+    monkeypatch.setattr(os, "remove", crash)
+    with pytest.raises(KeyboardInterrupt):
+        store.compact("r1")
+    monkeypatch.undo()
+
+
+def test_compaction_crash_does_not_duplicate(monkeypatch, store):
+    store.extend("r1", [event("a"), event("e")])
+    crash_before_removing_journal(monkeypatch, store)
+    assert os.path.exists(store.journal_path("r1"))
+    assert repetitions(store.load("r1")) == {"a": 1, "e": 1}
+
+    # Lo que se anote después en el mismo diario sí se aplica, una sola vez
+    store.append("r1", event("a", 40))
+    assert repetitions(store.load("r1")) == {"a": 2, "e": 1}
+    crash_before_removing_journal(monkeypatch, store)
+    assert repetitions(store.load("r1")) == {"a": 2, "e": 1}
+    store.compact("r1")
+    assert not os.path.exists(store.journal_path("r1"))
+    assert repetitions(store.load("r1")) == {"a": 2, "e": 1}
+
+
+def test_applied_mark_is_not_part_of_the_report(store):
+    store.append("r1", event("a"))
+    store.compact("r1")
+    report = store.load("r1")
+    assert "journalApplied" not in report
+    store.append("r1", event("o"))
+    assert repetitions(store.load("r1")) == {"a": 1, "o": 1}
+
+
+def test_torn_last_line_is_dropped_before_appending(store):
+    store.append("r1", event("a"))
+    with open(store.journal_path("r1"), "ab") as f:
+        f.write(b'{"level":"Level 1","sub')  # escritura interrumpida
+    assert repetitions(store.load("r1")) == {"a": 1}
+    store.append("r1", event("e"))
+    assert repetitions(store.load("r1")) == {"a": 1, "e": 1}
+
+
+def append_many(folder, worker, count, compact_bytes):
+    store = ReportStore(folder, compact_bytes=compact_bytes)
+    for i in range(count):
+        store.append("r1", event(f"w{worker}", i), OrderedDict([("worker", worker), ("i", i)]))
+
+
+@pytest.mark.parametrize('compact_bytes', [10 ** 9, 2048])
+def test_concurrent_appends_from_several_processes(tmp_path, compact_bytes):
+    """Varios procesos anotan a la vez (con y sin compactaciones): nada se pierde ni se duplica."""
+    import multiprocessing
+
+    store = ReportStore(str(tmp_path), compact_bytes=compact_bytes)
+    store.create("r1", base_report("r1"))
+    workers, count = 4, 60
+    ctx = multiprocessing.get_context('fork')
+    processes = [ctx.Process(target=append_many, args=(str(tmp_path), w, count, compact_bytes))
+                 for w in range(workers)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(60)
+        assert p.exitcode == 0
+
+    # Todas las líneas del diario están completas y son JSON válido
+    for _ in store.events("r1"):
+        pass
+    report = store.load("r1")
+    session = report["reports"]["games"]["expresatea"]["levels"]["Level 1"]["sublevels"]["Vocales"]["sessions"][0]
+    for word_obj in session["words"]:
+        # Cada proceso anota en orden sus propias repeticiones
+        assert [r["pronunciationAccuracy"] for r in word_obj["repetitions"]] == list(range(count))
+    assert sorted(w["word"] for w in session["words"]) == [f"w{w}" for w in range(workers)]
+    assert sum(1 for _ in store.measurements("r1")) == workers * count
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.lock')]
@@ -0,0 +1,41 @@
+"""Segmentación por bloques (`streaming.stream_segments`) frente a `FeatureFrames.split`."""
+import numpy as np
+import pytest
+import soundfile as sf
+
+from benchmarks.synth import make_repetitions
+from features import FeatureFrames
+from streaming import stream_segments
+
+SR = 16000
+
+
+def write_wav(path, y, sr=SR):
+    sf.write(str(path), y, sr, subtype='FLOAT')
+    return str(path)
+
+
+@pytest.mark.parametrize('block_seconds', [0.37, 1.0, 10.0])
+def test_stream_segments_matches_split(tmp_path, block_seconds):
+    # 14 repeticiones de 0,6 s cada 1,3 s: con bloques de 10 s, la de 9,7-10,3 s cruza el borde
+    y = make_repetitions(n=14, sr=SR, tone_s=0.6, gap_s=0.7, noise=0.002, seed=1)
+    path = write_wav(tmp_path / 'rep.wav', y)
+    expected = [tuple(interval) for interval in FeatureFrames(y, SR).split(top_db=20)]
+    boundary = int(10.0 * SR)
+    assert any(start < boundary < end for start, end in expected)
+
+    segments = [(start, end, y_seg) for start, end, y_seg, _ in
+                stream_segments(path, SR, top_db=20, spool_dir=str(tmp_path), block_seconds=block_seconds)]
+    assert [(start, end) for start, end, _ in segments] == expected
+    for start, end, y_seg in segments:
+        np.testing.assert_array_equal(y_seg, y[start:end])
+
+
+def test_stream_segments_with_a_segment_at_the_end(tmp_path):
+    """Un segmento que llega al final del fichero (sin silencio detrás) se cierra igual."""
+    y = make_repetitions(n=3, sr=SR, tone_s=0.5, gap_s=0.4)[:-int(0.4 * SR) - 1000]
+    path = write_wav(tmp_path / 'cut.wav', y)
+    expected = [tuple(interval) for interval in FeatureFrames(y, SR).split(top_db=20)]
+    got = [(start, end) for start, end, _, _ in
+           stream_segments(path, SR, top_db=20, spool_dir=str(tmp_path), block_seconds=0.25)]
+    assert got == expected and got[-1][1] == len(y)
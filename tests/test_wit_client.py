@@ -0,0 +1,59 @@
+"""Circuit breaker del cliente de Wit.ai: una sola prueba en half_open."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.fake_wit import FakeWitServer
+from wit_client import CircuitOpenError, TranscriptionError, WitClient
+
+
+def half_open_client(url):
+    client = WitClient(url, max_retries=0, breaker_threshold=1, breaker_reset=30.0)
+    client.breaker.failures = 1
+    client.breaker.opened_at = time.monotonic() - 31.0
+    assert client.breaker.state == "half_open"
+    return client
+
+
+def call_concurrently(client, n=8):
+    def call(_):
+        try:
+            return client.speech(b'RIFF', 'key')
+        except TranscriptionError as e:
+            return e
+    with ThreadPoolExecutor(n) as pool:
+        return list(pool.map(call, range(n)))
+
+
+def test_half_open_lets_a_single_probe_through():
+    with FakeWitServer(delay=0.3) as wit:
+        client = half_open_client(wit.url)
+        results = call_concurrently(client)
+        assert wit.calls == 1
+        assert sum(isinstance(r, dict) for r in results) == 1
+        assert sum(isinstance(r, CircuitOpenError) for r in results) == len(results) - 1
+        assert client.breaker.state == "closed"
+        client.speech(b'RIFF', 'key')
+        assert wit.calls == 2
+
+
+def test_failed_probe_reopens_the_circuit():
+    with FakeWitServer(delay=0.1, fail_first=1) as wit:
+        client = half_open_client(wit.url)
+        results = call_concurrently(client)
+        assert wit.calls == 1
+        assert sum(type(r) is TranscriptionError for r in results) == 1
+        assert client.breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            client.speech(b'RIFF', 'key')
+
+
+def test_probe_is_released_after_a_client_error():
+    with FakeWitServer(delay=0.0, fail_first=1, fail_status=400) as wit:
+        client = half_open_client(wit.url)
+        with pytest.raises(TranscriptionError):
+            client.speech(b'RIFF', 'key')
+        assert client.breaker.state == "half_open" and not client.breaker.probing
+        client.speech(b'RIFF', 'key')
+        assert client.breaker.state == "closed"
@@ -0,0 +1,249 @@
+"""Cliente HTTP para Wit.ai con conexiones persistentes, reintentos y circuit breaker.
+
+- Una `requests.Session` por API key, con su pool de conexiones keep-alive.
+- Reintentos con backoff exponencial y jitter ante 429, 5xx y errores de red
+  (respetando `Retry-After` si el servidor lo envía).
+- Límite de peticiones por minuto para cada API key (token bucket).
+- Circuit breaker: tras varios fallos seguidos deja de llamar durante un tiempo y
+  falla inmediatamente con `CircuitOpenError`.
+- Contadores de peticiones, reintentos, errores y latencia en `stats()`.
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TranscriptionError(Exception):
+    """El backend de reconocimiento no devolvió una transcripción válida."""
+
+
+class CircuitOpenError(TranscriptionError):
+    """El circuit breaker está abierto: el backend se considera caído."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Wit.ai no disponible, reintentar en {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token bucket: como mucho `per_minute` peticiones por minuto, con ráfagas de hasta `burst`."""
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or max(1, per_minute // 6))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Espera hasta tener un token; devuelve los segundos esperados."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class CircuitBreaker:
+    """Se abre tras `threshold` fallos seguidos; pasados `reset_timeout` s deja pasar una prueba.
+
+    En half_open sólo pasa una llamada (la prueba); las demás fallan con
+    `CircuitOpenError` hasta que la prueba termina: si sale bien se cierra, si
+    falla se vuelve a abrir.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        """Lanza CircuitOpenError si no se puede llamar; devuelve True si la llamada es la prueba.
+
+        Quien recibe True debe llamar a `end_probe()` al terminar, acabe como acabe.
+        """
+        with self.lock:
+            state = self.state
+            if state == "open":
+                raise CircuitOpenError(self.reset_timeout - (time.monotonic() - self.opened_at))
+            if state == "half_open":
+                if self.probing:
+                    raise CircuitOpenError(self.reset_timeout)
+                self.probing = True
+                return True
+            return False
+
+    def end_probe(self):
+        """Libera la prueba aunque no haya terminado en éxito ni en fallo del backend."""
+        with self.lock:
+            self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.probing = False
+            self.failures += 1
+            if self.failures >= self.threshold or self.opened_at is not None:
+                # Abre (o reabre tras una prueba fallida en half_open)
+                self.opened_at = time.monotonic()
+
+
+class WitClient:
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, url, timeout=30, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 rate_per_minute=240, breaker_threshold=5, breaker_reset=30.0, pool_size=8):
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_per_minute = rate_per_minute
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self._sessions = {}
+        self._limiters = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.counters = {
+            "requests": 0,           # intentos HTTP enviados
+            "successes": 0,
+            "retries": 0,
+            "errors_http": 0,        # respuestas != 200
+            "errors_network": 0,     # timeouts y errores de conexión
+            "failures": 0,           # transcripciones fallidas tras los reintentos
+            "circuit_rejections": 0,
+            "rate_limit_waits": 0,
+            "rate_limit_wait_seconds": 0.0,
+        }
+        self.latency = {"count": 0, "sum": 0.0, "buckets": [0] * len(self.LATENCY_BUCKETS)}
+
+    def _count(self, name, value=1):
+        with self._stats_lock:
+            self.counters[name] += value
+
+    def _observe_latency(self, seconds):
+        with self._stats_lock:
+            self.latency["count"] += 1
+            self.latency["sum"] += seconds
+            for i, bound in enumerate(self.LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self.latency["buckets"][i] += 1
+
+    def _session_for(self, api_key):
+        with self._lock:
+            if api_key not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['Authorization'] = f'Bearer {api_key}'
+                self._sessions[api_key] = session
+                self._limiters[api_key] = RateLimiter(self.rate_per_minute)
+            return self._sessions[api_key], self._limiters[api_key]
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def speech(self, wav, api_key):
+        """POST del WAV a /speech. Devuelve el JSON de la respuesta o lanza TranscriptionError."""
+        try:
+            probe = self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("circuit_rejections")
+            raise
+        try:
+            return self._speech(wav, api_key)
+        finally:
+            if probe:
+                self.breaker.end_probe()
+
+    def _speech(self, wav, api_key):
+        session, limiter = self._session_for(api_key)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            waited = limiter.acquire()
+            if waited:
+                self._count("rate_limit_waits")
+                self._count("rate_limit_wait_seconds", waited)
+
+            retry_after = None
+            self._count("requests")
+            t0 = time.perf_counter()
+            try:
+                response = session.post(self.url, headers={'Content-Type': 'audio/wav'},
+                                        data=wav, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._count("errors_network")
+                last_error = f"error de red: {e}"
+            else:
+                self._observe_latency(time.perf_counter() - t0)
+                if response.status_code == 200:
+                    try:
+                        data = response.json()
+                    except ValueError:
+                        self._count("failures")
+                        raise TranscriptionError("respuesta de Wit.ai no es JSON") from None
+                    self._count("successes")
+                    self.breaker.record_success()
+                    return data
+
+                self._count("errors_http")
+                last_error = f"HTTP {response.status_code}"
+                if response.status_code not in self.RETRY_STATUS:
+                    # Error del cliente (clave inválida, audio no aceptado...): no se reintenta
+                    self._count("failures")
+                    raise TranscriptionError(f"Wit.ai respondió {last_error}")
+                try:
+                    retry_after = float(response.headers.get('Retry-After'))
+                except (TypeError, ValueError):
+                    retry_after = None
+
+            if attempt < self.max_retries:
+                self._count("retries")
+                time.sleep(self._backoff(attempt, retry_after))
+
+        self._count("failures")
+        self.breaker.record_failure()
+        raise TranscriptionError(f"Wit.ai falló tras {self.max_retries + 1} intentos ({last_error})")
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                **self.counters,
+                "latency_seconds": {
+                    "count": self.latency["count"],
+                    "sum": round(self.latency["sum"], 6),
+                    "buckets": dict(zip(self.LATENCY_BUCKETS, self.latency["buckets"])),
+                },
+                "circuit_state": self.breaker.state,
+            }